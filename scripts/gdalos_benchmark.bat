@@ -0,0 +1 @@
+@python "%~dp0\%~n0.py" %*
\ No newline at end of file
@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+
+import sys
+from gdalos.gdalos_benchmark import main
+
+sys.exit(main(sys.argv))
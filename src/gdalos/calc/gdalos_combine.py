@@ -1,4 +1,10 @@
+from typing import Callable, Optional, Tuple, Union
+
 import numpy as np
+from osgeo import gdal, gdal_array
+from osgeo_utils.auxiliary.extent_util import Extent
+
+from gdalos.rectangle import GeoRectangle
 from gdalos.viewshed.viewshed_params import viewshed_thresh, viewshed_ndv, viewshed_comb_ndv, viewshed_comb_multi_val
 from gdalos.calc.gdal_calc import AlphaList
 
@@ -98,4 +104,354 @@ def make_calc_with_func(filenames, alpha_pattern, func_name, **kwargs):
     alpha1 = alpha_pattern.format('x')
     calc = '{}({} for x in a)'.format(func_name, alpha1)
     kwargs[all_vals] = filenames
-    return calc, kwargs
\ No newline at end of file
+    return calc, kwargs
+
+
+def copy_overlap(old: np.ndarray, new: np.ndarray, yoff: int, xoff: int):
+    """ copies the part of old that overlaps new, where old starts at the given (possibly negative) offset of new """
+    y0, x0 = max(0, yoff), max(0, xoff)
+    y1, x1 = min(new.shape[0], yoff + old.shape[0]), min(new.shape[1], xoff + old.shape[1])
+    if y1 > y0 and x1 > x0:
+        new[y0:y1, x0:x1] = old[y0 - yoff:y1 - yoff, x0 - xoff:x1 - xoff]
+
+
+def get_dtype_limits(dtype) -> Tuple:
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return info.min, info.max
+    return -np.inf, np.inf
+
+
+class CombineAccumulator(object):
+    """
+    folds arrays, one at a time, into running buffers (instead of stacking all the arrays).
+    an array may cover only a window of the buffers,
+    the rest of the buffers is considered as covered by the fill value (as a vrt of the array would be).
+    """
+    __slots__ = ['dtype', 'fill', 'count', 'index', 'cover']
+
+    def __init__(self, shape: Tuple[int, int], dtype, fill=viewshed_ndv):
+        self.dtype = np.dtype(dtype)
+        self.fill = fill
+        self.count = 0  # arrays that were added
+        self.index = 0  # the index of the array that is being folded
+        self.cover = np.zeros(shape, dtype=np.uint16)  # arrays that covered each pixel
+        for name, (value, dtype) in self.get_buffers().items():
+            setattr(self, name, np.full(shape, value, dtype=dtype))
+
+    def get_buffers(self) -> dict:
+        """ returns the buffers as name: (initial value, dtype) """
+        return {}
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.cover.shape
+
+    def resize(self, shape: Tuple[int, int], yoff: int, xoff: int):
+        """ moves the buffers into the given shape, in which the current buffers start at the given offset """
+        buffers = dict(cover=(0, np.uint16), **self.get_buffers())
+        for name, (value, dtype) in buffers.items():
+            new = np.full(shape, value, dtype=dtype)
+            copy_overlap(getattr(self, name), new, yoff, xoff)
+            setattr(self, name, new)
+
+    def add(self, arr: Optional[np.ndarray] = None, yoff: int = 0, xoff: int = 0, index: Optional[int] = None):
+        """
+        folds an array which starts at the given offset of the buffers (None for an array out of the buffers).
+        the index of the array is the order in which it was added, unless given (i.e. arrays that come out of order)
+        """
+        self.index = self.count if index is None else index
+        if arr is not None:
+            w = np.s_[yoff:yoff + arr.shape[0], xoff:xoff + arr.shape[1]]
+            self.cover[w] += 1
+            self.fold(arr, w)
+        self.count += 1
+
+    def get_uncovered(self) -> np.ndarray:
+        """ the number of arrays that didn't cover each pixel """
+        return self.count - self.cover.astype(np.int32)
+
+    def fold(self, arr: np.ndarray, w):
+        raise NotImplementedError()
+
+    def result(self) -> np.ndarray:
+        raise NotImplementedError()
+
+
+class IndexAccumulator(CombineAccumulator):
+    """ the value of the array of the given index (like get_by_index) """
+    __slots__ = ['selected', 'values']
+
+    def __init__(self, shape, dtype, fill=viewshed_ndv, index=0):
+        self.selected = index
+        super().__init__(shape, dtype, fill)
+
+    def get_buffers(self):
+        return dict(values=(self.fill, self.dtype))
+
+    def fold(self, arr, w):
+        if self.index == self.selected:
+            self.values[w] = arr
+
+    def result(self):
+        return self.values.copy()
+
+
+class MaxAccumulator(CombineAccumulator):
+    """ max value of each pixel (like vs_max) """
+    __slots__ = ['values']
+
+    def get_buffers(self):
+        return dict(values=(get_dtype_limits(self.dtype)[0], self.dtype))
+
+    def fold(self, arr, w):
+        v = self.values[w]
+        np.maximum(v, arr, out=v)
+
+    def result(self):
+        ret = self.values.copy()
+        uncovered = self.cover < self.count
+        ret[uncovered] = np.maximum(ret[uncovered], self.fill)
+        return ret
+
+
+class MinAccumulator(CombineAccumulator):
+    """ min value of each pixel (like vs_min) """
+    __slots__ = ['values']
+
+    def get_buffers(self):
+        return dict(values=(get_dtype_limits(self.dtype)[1], self.dtype))
+
+    def fold(self, arr, w):
+        v = self.values[w]
+        np.minimum(v, arr, out=v)
+
+    def result(self):
+        ret = self.values.copy()
+        uncovered = self.cover < self.count
+        ret[uncovered] = np.minimum(ret[uncovered], self.fill)
+        return ret
+
+
+class CountAccumulator(CombineAccumulator):
+    """ count values above the threshold (like vs_count) """
+    __slots__ = ['threshold', 'counts']
+
+    def __init__(self, shape, dtype, fill=viewshed_ndv, threshold=viewshed_thresh):
+        self.threshold = threshold
+        super().__init__(shape, dtype, fill)
+
+    def get_buffers(self):
+        return dict(counts=(0, np.uint16))
+
+    def fold(self, arr, w):
+        self.counts[w] += arr > self.threshold
+
+    def get_counts(self) -> np.ndarray:
+        counts = self.counts.astype(np.int32)
+        if self.fill > self.threshold:
+            counts += self.get_uncovered()
+        return counts
+
+    def result(self):
+        return self.get_counts().astype(np.uint8)
+
+
+class CountZAccumulator(CountAccumulator):
+    """ count values above the threshold considering ndv values (like vs_count_z) """
+    __slots__ = ['in_ndv', 'out_ndv', 'non_ndv']
+
+    def __init__(self, shape, dtype, fill=viewshed_ndv, threshold=viewshed_thresh,
+                 in_ndv=None, out_ndv=viewshed_comb_ndv):
+        self.in_ndv = fill if in_ndv is None else in_ndv
+        self.out_ndv = out_ndv
+        super().__init__(shape, dtype, fill, threshold)
+
+    def get_buffers(self):
+        return dict(counts=(0, np.uint16), non_ndv=(0, np.uint16))
+
+    def fold(self, arr, w):
+        super().fold(arr, w)
+        self.non_ndv[w] += arr != self.in_ndv
+
+    def result(self):
+        ret = super().result()
+        non_ndv = self.non_ndv.astype(np.int32)
+        if self.fill != self.in_ndv:
+            non_ndv += self.get_uncovered()
+        ret[non_ndv == 0] = self.out_ndv
+        return ret
+
+
+class UniqueAccumulator(CountAccumulator):
+    """ the index of the single array which is above the threshold (like vs_unique) """
+    __slots__ = ['multiple_nz', 'all_zero', 'indices']
+
+    def __init__(self, shape, dtype, fill=viewshed_ndv, threshold=viewshed_thresh,
+                 multiple_nz=viewshed_comb_multi_val, all_zero=viewshed_comb_ndv):
+        self.multiple_nz = multiple_nz
+        self.all_zero = all_zero
+        super().__init__(shape, dtype, fill, threshold)
+
+    def get_buffers(self):
+        return dict(counts=(0, np.uint16), indices=(0, np.int32))
+
+    def fold(self, arr, w):
+        above = arr > self.threshold
+        self.counts[w] += above
+        self.indices[w][above] = self.index
+
+    def result(self):
+        counts = self.get_counts()
+        ret = np.full(self.shape, self.all_zero, dtype=self.dtype)
+        ret[counts > 1] = self.multiple_nz
+        # a pixel which is above the threshold only in the fill of an array has no index
+        singular = (counts == 1) & (self.counts == 1)
+        ret[singular] = self.indices[singular]
+        return ret
+
+
+class NdvAccumulator(CombineAccumulator):
+    """ the pixels that are ndv (the fill) in any of the arrays """
+    __slots__ = ['mask']
+
+    def get_buffers(self):
+        return dict(mask=(False, bool))
+
+    def fold(self, arr, w):
+        self.mask[w] |= arr == self.fill
+
+    def result(self):
+        return self.mask | (self.cover < self.count)
+
+
+AccumulatorFactory = Callable[..., CombineAccumulator]  # (shape, dtype, fill) -> CombineAccumulator
+PixelWindow = Tuple[int, int, int, int]  # x0, y0, x1, y1 (exclusive), in pixels of the grid
+
+
+class RasterCombiner(object):
+    """
+    folds datasets, one at a time, into an accumulator over their union (or intersection, or a given) extent,
+    like gdal_calc does with a vrt of each dataset, but with a memory of a single output raster.
+    only the window that each dataset covers is read.
+    datasets which don't share the grid (pixel size and alignment) of the first dataset are resampled into it.
+    """
+    __slots__ = ['accumulator_factory', 'extent', 'hide_ndv', 'gt', 'projection', 'window', 'dtype',
+                 'accumulator', 'ndv_accumulator']
+
+    def __init__(self, accumulator_factory: AccumulatorFactory,
+                 extent: Union[Extent, GeoRectangle] = Extent.UNION, hide_ndv: bool = True):
+        self.accumulator_factory = accumulator_factory
+        self.extent = extent
+        self.hide_ndv = hide_ndv  # if False, pixels that are ndv in any of the datasets would be ndv
+        self.gt = None
+        self.projection = None
+        self.window: Optional[PixelWindow] = None
+        self.dtype = None
+        self.accumulator: Optional[CombineAccumulator] = None
+        self.ndv_accumulator: Optional[NdvAccumulator] = None
+
+    def get_ds_window(self, ds: gdal.Dataset) -> Tuple[PixelWindow, bool]:
+        """ returns the window of the dataset in the grid and whether it's aligned with the grid """
+        gt = self.gt
+        ds_gt = ds.GetGeoTransform()
+        fx0 = (ds_gt[0] - gt[0]) / gt[1]
+        fy0 = (ds_gt[3] - gt[3]) / gt[5]
+        fx1 = fx0 + ds.RasterXSize * ds_gt[1] / gt[1]
+        fy1 = fy0 + ds.RasterYSize * ds_gt[5] / gt[5]
+        window = round(fx0), round(fy0), round(fx1), round(fy1)
+        aligned = np.isclose(ds_gt[1], gt[1]) and np.isclose(ds_gt[5], gt[5]) and \
+            abs(fx0 - window[0]) < 1e-3 and abs(fy0 - window[1]) < 1e-3
+        return window, aligned
+
+    def init_grid(self, ds: gdal.Dataset):
+        gt = ds.GetGeoTransform()
+        bnd = ds.GetRasterBand(1)
+        self.projection = ds.GetProjection()
+        self.dtype = gdal_array.GDALTypeCodeToNumericTypeCode(bnd.DataType)
+        ndv = bnd.GetNoDataValue()
+        fill = 0 if ndv is None else ndv
+        if isinstance(self.extent, GeoRectangle):
+            self.gt = (self.extent.min_x, gt[1], 0, self.extent.max_y, 0, gt[5])
+            self.window = 0, 0, round(self.extent.w / abs(gt[1])), round(self.extent.h / abs(gt[5]))
+        else:
+            self.gt = gt
+            self.window = 0, 0, ds.RasterXSize, ds.RasterYSize
+        shape = self.window[3] - self.window[1], self.window[2] - self.window[0]
+        self.accumulator = self.accumulator_factory(shape, self.dtype, fill)
+        if not self.hide_ndv and ndv is not None:
+            self.ndv_accumulator = NdvAccumulator(shape, self.dtype, fill)
+
+    def set_window(self, window: PixelWindow):
+        if window[2] <= window[0] or window[3] <= window[1]:
+            raise Exception('Error! The requested extent is empty. Cannot proceed')
+        if window != self.window:
+            shape = window[3] - window[1], window[2] - window[0]
+            for accumulator in (self.accumulator, self.ndv_accumulator):
+                if accumulator is not None:
+                    accumulator.resize(shape, self.window[1] - window[1], self.window[0] - window[0])
+            self.window = window
+
+    def read_window(self, ds: gdal.Dataset, ds_window: PixelWindow, aligned: bool, window: PixelWindow) \
+            -> np.ndarray:
+        x0, y0, x1, y1 = window
+        if aligned:
+            return ds.GetRasterBand(1).ReadAsArray(x0 - ds_window[0], y0 - ds_window[1], x1 - x0, y1 - y0)
+        gt = self.gt
+        proj_win = [gt[0] + x0 * gt[1], gt[3] + y0 * gt[5], gt[0] + x1 * gt[1], gt[3] + y1 * gt[5]]
+        resampled = gdal.Translate('', ds, format='MEM', projWin=proj_win, width=x1 - x0, height=y1 - y0)
+        return resampled.GetRasterBand(1).ReadAsArray()
+
+    def add(self, ds: gdal.Dataset, index: Optional[int] = None):
+        """
+        folds the window that the dataset covers into the accumulator,
+        the index of the dataset is the order in which it was added, unless given
+        """
+        if self.accumulator is None:
+            self.init_grid(ds)
+        ds_window, aligned = self.get_ds_window(ds)
+        window = self.window
+        if self.extent == Extent.UNION:
+            self.set_window((min(window[0], ds_window[0]), min(window[1], ds_window[1]),
+                             max(window[2], ds_window[2]), max(window[3], ds_window[3])))
+        elif self.extent == Extent.INTERSECT:
+            self.set_window((max(window[0], ds_window[0]), max(window[1], ds_window[1]),
+                             min(window[2], ds_window[2]), min(window[3], ds_window[3])))
+        elif self.extent == Extent.FAIL and (ds_window != window or not aligned):
+            raise Exception('Error! Geotransform of the datasets are different. Cannot proceed')
+        window = self.window
+        overlap = max(window[0], ds_window[0]), max(window[1], ds_window[1]), \
+            min(window[2], ds_window[2]), min(window[3], ds_window[3])
+        if overlap[2] <= overlap[0] or overlap[3] <= overlap[1]:
+            arr = None
+        else:
+            arr = self.read_window(ds, ds_window, aligned, overlap)
+        offset = overlap[1] - window[1], overlap[0] - window[0]
+        for accumulator in (self.accumulator, self.ndv_accumulator):
+            if accumulator is not None:
+                accumulator.add(arr, *offset, index=index)
+
+    def get_ds(self, filename='', of: str = 'MEM', no_data_value=None, color_table=None) -> gdal.Dataset:
+        """ returns the combined dataset """
+        if self.accumulator is None:
+            raise Exception('no datasets were combined')
+        ret = self.accumulator.result()
+        if self.ndv_accumulator is not None and no_data_value is not None:
+            ret[self.ndv_accumulator.result()] = no_data_value
+        x0, y0, x1, y1 = self.window
+        gt = self.gt
+        ds = gdal.GetDriverByName(of).Create(
+            str(filename), x1 - x0, y1 - y0, 1, gdal_array.NumericTypeCodeToGDALTypeCode(self.dtype))
+        if ds is None:
+            raise Exception('Error! Could not create output file {}'.format(filename))
+        ds.SetGeoTransform((gt[0] + x0 * gt[1], gt[1], 0, gt[3] + y0 * gt[5], 0, gt[5]))
+        ds.SetProjection(self.projection)
+        bnd = ds.GetRasterBand(1)
+        if no_data_value is not None:
+            bnd.SetNoDataValue(no_data_value)
+        if color_table:
+            bnd.SetRasterColorTable(color_table)
+        bnd.WriteArray(ret.astype(self.dtype))
+        bnd = None
+        return ds
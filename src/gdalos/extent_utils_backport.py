@@ -1,6 +1,7 @@
 import math
-from typing import Tuple
+from typing import List, Sequence, Tuple
 
+import numpy as np
 from osgeo import osr, gdal
 
 from osgeo_utils.auxiliary.extent_util import GeoTransform
@@ -18,33 +19,87 @@ def calc_dx_dy_from_extent_and_count(extent: GeoRectangle, sample_count: int) ->
     return pix_len, pix_len
 
 
+def accumulate_range(start: float, stop: float, step: float, inclusive: bool = True) -> np.ndarray:
+    """
+    returns the values of `x = start; while x <= stop: x += step` (x < stop if not inclusive),
+    accumulated like in such a loop, so the values are the same up to the last bit
+    """
+    start = float(start)
+    if not step > 0:
+        return np.array([start] if start <= stop else [])
+    count = max(0, int(math.floor((stop - start) / step))) + 2
+    values = np.add.accumulate(np.concatenate(([start], np.full(count, float(step)))))
+    return values[values <= stop] if inclusive else values[values < stop]
+
+
+def get_sample_grid(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ returns the flattened grid of the given x and y values """
+    xx, yy = np.meshgrid(x, y)
+    return xx.ravel(), yy.ravel()
+
+
+def transform_points_array(transform: osr.CoordinateTransformation,
+                           x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ transforms all the points with a single call, returns the transformed x, y, z arrays """
+    if not len(x):
+        return np.empty(0), np.empty(0), np.empty(0)
+    points = np.array(transform.TransformPoints(list(zip(x.tolist(), y.tolist()))), dtype=float)
+    z = points[:, 2] if points.shape[1] > 2 else np.zeros(len(points))
+    return points[:, 0], points[:, 1], z
+
+
+def get_extent_samples(extent: GeoRectangle, sample_count: int = 1000) -> Tuple[np.ndarray, np.ndarray]:
+    """ returns the points along the extent which are used to transform it, None if the extent is empty """
+    dx, dy = calc_dx_dy_from_extent_and_count(extent, sample_count)
+    if dx == 0:
+        return None
+    x = accumulate_range(extent.min_x, extent.max_x + dx, dx)
+    y = accumulate_range(extent.min_y, extent.max_y + dy, dy)
+    return get_sample_grid(x, y)
+
+
+def get_points_min_max(x: np.ndarray, y: np.ndarray, z: np.ndarray) -> GeoRectangle:
+    """ returns the extent of the points, ignoring the points that failed to transform """
+    valid = np.isfinite(z)
+    if not valid.any():
+        maxf = float("inf")
+        return GeoRectangle.from_min_max(maxf, -maxf, maxf, -maxf)
+    x = x[valid]
+    y = y[valid]
+    return GeoRectangle.from_min_max(float(x.min()), float(x.max()), float(y.min()), float(y.max()))
+
+
 def transform_extent(extent: GeoRectangle,
                      transform: osr.CoordinateTransformation, sample_count: int = 1000) -> GeoRectangle:
     """ returns a transformed extent by transforming sample_count points along a given extent """
     if transform is None:
         return extent
-    maxf = float("inf")
-    (out_min_x, out_max_x, out_min_y, out_max_y) = (maxf, -maxf, maxf, -maxf)
-
-    dx, dy = calc_dx_dy_from_extent_and_count(extent, sample_count)
-    if dx == 0:
+    samples = get_extent_samples(extent, sample_count)
+    if samples is None:
         return GeoRectangle.empty()
+    return get_points_min_max(*transform_points_array(transform, *samples))
 
-    y = float(extent.min_y)
-    while y <= extent.max_y + dy:
-        x = float(extent.min_x)
-        while x <= extent.max_x + dx:
-            tx, ty, tz = transform.TransformPoint(x, y)
-            x += dx
-            if not math.isfinite(tz):
-                continue
-            out_min_x = min(out_min_x, tx)
-            out_max_x = max(out_max_x, tx)
-            out_min_y = min(out_min_y, ty)
-            out_max_y = max(out_max_y, ty)
-        y += dy
-
-    return GeoRectangle.from_min_max(out_min_x, out_max_x, out_min_y, out_max_y)
+
+def transform_extents(extents: Sequence[GeoRectangle],
+                      transform: osr.CoordinateTransformation, sample_count: int = 1000) -> List[GeoRectangle]:
+    """ returns the transformed extents (as of transform_extent), the points of all the extents are transformed at once """
+    if transform is None:
+        return list(extents)
+    samples = [get_extent_samples(extent, sample_count) for extent in extents]
+    x = [s[0] for s in samples if s is not None]
+    y = [s[1] for s in samples if s is not None]
+    if x:
+        tx, ty, tz = transform_points_array(transform, np.concatenate(x), np.concatenate(y))
+    result = []
+    start = 0
+    for s in samples:
+        if s is None:
+            result.append(GeoRectangle.empty())
+            continue
+        end = start + len(s[0])
+        result.append(get_points_min_max(tx[start:end], ty[start:end], tz[start:end]))
+        start = end
+    return result
 
 
 def get_geotransform_and_size(ds: gdal.Dataset) -> Tuple[GeoTransform, Tuple[int, int]]:
@@ -0,0 +1,253 @@
+import ast
+import itertools
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from osgeo import gdal
+
+from gdalos import gdalos_version
+from gdalos.gdalos_report import RunReport, get_peak_rss
+from gdalos.gdalos_trans import gdalos_trans
+from gdalos.test_data_generator import make_synthetic_dtm, make_synthetic_rgb
+from osgeo_utils.auxiliary.util import PathLikeOrStr
+
+# every param is benchmarked with each of its values, the first value of each param makes the base case
+default_matrix = dict(
+    of=['gtiff', 'cog'],
+    lossy=[False, True],
+    warp_srs=[None, 4326],
+    ovr_type=['auto_select', 'existing_reuse', 'create_internal', 'no_overviews'],
+    partition=[1, 4],
+    multi_thread=[True, False],
+    warp_error_threshold=[None, ..., 0.125],
+    ovr_workers=[None, 0],
+    pyramid=[None, True],
+)
+
+# params which matter only together with other params, these are set in the cases of the param (if not full)
+default_case_requires = dict(warp_error_threshold=dict(warp_srs=4326), pyramid=dict(ovr_type='auto_select'))
+
+synthetic_generators = dict(dtm=make_synthetic_dtm, rgb=make_synthetic_rgb)
+
+
+def value_to_str(value) -> str:
+    return 'gdal' if value is ... else str(value)
+
+
+def get_case_name(params: dict) -> str:
+    return ','.join('{}={}'.format(k, value_to_str(v)) for k, v in params.items()) or 'base'
+
+
+def make_cases(matrix: Dict[str, Sequence], full: bool = False,
+               requires: Optional[Dict[str, dict]] = None) -> List[dict]:
+    """
+    returns the param sets to benchmark: if full, all the combinations of the matrix,
+    otherwise the base case (the first value of each param), and the base case with each other value of each param
+    """
+    if requires is None:
+        requires = default_case_requires
+    keys = list(matrix)
+    if full:
+        return [dict(zip(keys, values)) for values in itertools.product(*(matrix[k] for k in keys))]
+    base = {k: matrix[k][0] for k in keys}
+    cases = [base]
+    for k in keys:
+        for v in matrix[k][1:]:
+            case = dict(base)
+            case.update({rk: rv for rk, rv in requires.get(k, {}).items() if rk in case})
+            case[k] = v
+            cases.append(case)
+    return cases
+
+
+def is_case_supported(params: dict, ds: gdal.Dataset) -> bool:
+    # jpeg compression applies to rgb(a) rasters
+    return not params.get('lossy') or ds.RasterCount in (3, 4)
+
+
+def get_case_kwargs(params: dict) -> dict:
+    kwargs = dict(params)
+    partition = kwargs.get('partition')
+    if partition is not None:
+        kwargs['partition_mosaic'] = partition > 1
+    return kwargs
+
+
+def run_case(filename: PathLikeOrStr, out_dir: PathLikeOrStr, params: dict, repeat: int = 1,
+             keep_outputs: bool = False) -> dict:
+    """ runs gdalos_trans with the given params (repeat times), returns the timing of the fastest run """
+    case_dir = Path(out_dir) / Path(filename).stem / get_case_name(params).replace('=', '_').replace(',', '.')
+    out_filename = case_dir / 'out.tif'
+    best = None
+    for _ in range(repeat):
+        if case_dir.exists():
+            shutil.rmtree(case_dir)
+        report = RunReport()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        ret_code = gdalos_trans(
+            str(filename), out_filename=str(out_filename), overwrite=True, quiet=True,
+            write_info=False, write_spec=False, report=report, **get_case_kwargs(params))
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        if best is None or wall < best['wall']:
+            report = report.to_dict()
+            best = dict(
+                wall=wall, cpu=cpu, ok=bool(ret_code),
+                read=report['read'], write=report['write'],
+                output_size=sum(report['files'].values()),
+                phases={phase['name']: dict(wall=phase['wall'], cpu=phase['cpu']) for phase in report['phases']},
+            )
+    if not keep_outputs and case_dir.exists():
+        shutil.rmtree(case_dir)
+    best.update(
+        input=Path(filename).name, case=get_case_name(params),
+        params={k: value_to_str(v) for k, v in params.items()}, repeat=repeat)
+    return best
+
+
+def get_environment() -> dict:
+    return dict(
+        gdal=gdal.__version__,
+        gdalos='.'.join(str(v) for v in gdalos_version),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        cpu_count=os.cpu_count(),
+        cache_max=gdal.GetCacheMax(),
+        time=time.strftime('%Y-%m-%d %H:%M:%S'),
+    )
+
+
+def run_benchmark(filenames: Sequence[PathLikeOrStr], out_dir: PathLikeOrStr,
+                  matrix: Optional[Dict[str, Sequence]] = None, full: bool = False, repeat: int = 1,
+                  baseline_filename: Optional[PathLikeOrStr] = None, keep_outputs: bool = False) -> dict:
+    """ runs all the cases of the matrix on all the inputs, and saves the results as a baseline (json) """
+    if matrix is None:
+        matrix = default_matrix
+    cases = make_cases(matrix, full)
+    results = []
+    for filename in filenames:
+        ds = gdal.Open(str(filename))
+        if ds is None:
+            raise Exception('cannot open input file: {}'.format(filename))
+        supported = [params for params in cases if is_case_supported(params, ds)]
+        ds = None
+        for idx, params in enumerate(supported):
+            print('{} ({}/{}) {}'.format(Path(filename).name, idx + 1, len(supported), get_case_name(params)))
+            result = run_case(filename, out_dir, params, repeat=repeat, keep_outputs=keep_outputs)
+            print('    wall: {:.3f}s cpu: {:.3f}s size: {:,}{}'.format(
+                result['wall'], result['cpu'], result['output_size'], '' if result['ok'] else ' (failed)'))
+            results.append(result)
+    baseline = dict(environment=get_environment(), peak_rss=get_peak_rss(), results=results)
+    if baseline_filename is not None:
+        with open(baseline_filename, 'w') as f:
+            json.dump(baseline, f, indent=1)
+    return baseline
+
+
+def load_baseline(filename: PathLikeOrStr) -> dict:
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare_baselines(base: dict, new: dict, threshold: float = 0.1) -> List[dict]:
+    """
+    returns the wall time ratio (new / base) of each case that is in both baselines,
+    a case is regressed if it is slower by more than threshold (i.e. 0.1 -> 10%)
+    """
+    base_results = {(r['input'], r['case']): r for r in base['results']}
+    rows = []
+    for r in new['results']:
+        b = base_results.get((r['input'], r['case']))
+        if b is None or not b['wall']:
+            continue
+        ratio = r['wall'] / b['wall']
+        rows.append(dict(input=r['input'], case=r['case'], base=b['wall'], new=r['wall'], ratio=ratio,
+                         regressed=ratio > 1 + threshold, improved=ratio < 1 - threshold))
+    return rows
+
+
+def print_comparison(rows: List[dict]):
+    for row in rows:
+        mark = ' (regressed)' if row['regressed'] else ' (improved)' if row['improved'] else ''
+        print('{} {}: {:.3f}s -> {:.3f}s x{:.2f}{}'.format(
+            row['input'], row['case'], row['base'], row['new'], row['ratio'], mark))
+    regressed = sum(row['regressed'] for row in rows)
+    improved = sum(row['improved'] for row in rows)
+    print('{} cases compared, {} regressed, {} improved'.format(len(rows), regressed, improved))
+
+
+def parse_value(s: str):
+    try:
+        return ast.literal_eval(s)
+    except (ValueError, SyntaxError):
+        return s
+
+
+def parse_matrix(items: Optional[Sequence[str]]) -> Dict[str, Sequence]:
+    """ parses 'key=v1,v2' items into a matrix, the given keys replace their default values """
+    matrix = dict(default_matrix)
+    for item in items or []:
+        key, values = item.split('=', 1)
+        matrix[key] = [parse_value(v) for v in values.split(',')]
+    return matrix
+
+
+def main(argv):
+    parser = ArgumentParser(fromfile_prefix_chars='@')
+    subparsers = parser.add_subparsers(dest="command")
+
+    generate = subparsers.add_parser("generate", help="generate synthetic inputs")
+    generate.add_argument("out_dir", help="output dir for the inputs")
+    generate.add_argument("-kind", dest="kinds", nargs='+', choices=list(synthetic_generators),
+                          default=list(synthetic_generators), help="kinds of inputs to generate")
+    generate.add_argument("-size", dest="size", type=int, default=4096, help="width and height in pixels")
+    generate.add_argument("-seed", dest="seed", type=int, default=0)
+
+    run = subparsers.add_parser("run", help="run the benchmark and save a baseline")
+    run.add_argument("filename", nargs='+', help="input files")
+    run.add_argument("-o", dest="baseline_filename", required=True, help="baseline (json) file to save")
+    run.add_argument("-out_dir", dest="out_dir", help="dir for the outputs (default: a dir next to the baseline)")
+    run.add_argument("-m", dest="matrix", nargs='*', metavar="key=v1,v2",
+                     help="params to benchmark (replace the default values)")
+    run.add_argument("-full", dest="full", action="store_true", help="run all the combinations of the matrix")
+    run.add_argument("-repeat", dest="repeat", type=int, default=1, help="take the fastest of this many runs")
+    run.add_argument("-keep", dest="keep_outputs", action="store_true", help="keep the outputs")
+
+    compare = subparsers.add_parser("compare", help="compare two baselines")
+    compare.add_argument("base", help="base baseline file")
+    compare.add_argument("new", help="new baseline file")
+    compare.add_argument("-threshold", dest="threshold", type=float, default=0.1,
+                         help="relative slowdown that is reported as a regression")
+
+    args = parser.parse_args(argv[1:])
+    if args.command == "generate":
+        os.makedirs(args.out_dir, exist_ok=True)
+        for kind in args.kinds:
+            filename = os.path.join(args.out_dir, 'synthetic_{}_{}.tif'.format(kind, args.size))
+            print('generating {}'.format(filename))
+            synthetic_generators[kind](filename, size=args.size, seed=args.seed)
+        return 0
+    elif args.command == "run":
+        out_dir = args.out_dir or str(Path(args.baseline_filename).with_suffix('')) + '_outputs'
+        baseline = run_benchmark(args.filename, out_dir, matrix=parse_matrix(args.matrix), full=args.full,
+                                 repeat=args.repeat, baseline_filename=args.baseline_filename,
+                                 keep_outputs=args.keep_outputs)
+        return 0 if all(r['ok'] for r in baseline['results']) else 1
+    elif args.command == "compare":
+        rows = compare_baselines(load_baseline(args.base), load_baseline(args.new), args.threshold)
+        print_comparison(rows)
+        return 1 if any(row['regressed'] for row in rows) else 0
+    parser.print_help()
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from enum import Enum
+from numbers import Real
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from osgeo import gdal
+
+from osgeo_utils.auxiliary.util import PathLikeOrStr
+
+# the files of an entry are stored under these names, followed by their suffix relative to the final file
+cache_data_name = 'data'
+cache_meta_name = 'meta.json'
+
+
+def file_identity(filename: PathLikeOrStr, checksum: bool = False) -> list:
+    """ returns the identity of a file: its path, size and mtime, or its sha256 if checksum is True """
+    filename = os.path.abspath(str(filename))
+    if checksum:
+        sha = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 ** 2), b''):
+                sha.update(chunk)
+        return [sha.hexdigest()]
+    stat = os.stat(filename)
+    return [filename, stat.st_size, stat.st_mtime_ns]
+
+
+def raster_identity(filename: PathLikeOrStr, checksum: bool = False) -> Optional[list]:
+    """
+    returns the identity of all the files that make a raster (i.e. its external overviews and aux files)
+    or None if the raster is not made of local files (i.e. /vsimem/, urls)
+    """
+    ds = gdal.OpenEx(str(filename))
+    if ds is None:
+        return None
+    file_list = ds.GetFileList()
+    ds = None
+    if not file_list:
+        return None
+    identity = []
+    for f in sorted(file_list):
+        if not os.path.isfile(f):
+            return None
+        identity.append(file_identity(f, checksum))
+    return identity
+
+
+def normalize_for_key(value, out_prefix: Optional[str] = None, temp_prefixes: Sequence[str] = ()):
+    """
+    returns a json serializable representation of the value, with the output path prefix replaced,
+    and with the temp paths (which are named randomly) replaced by their index in temp_prefixes
+    """
+    if isinstance(value, dict):
+        return [[str(k), normalize_for_key(v, out_prefix, temp_prefixes)]
+                for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))]
+    if isinstance(value, (list, tuple)):
+        return [normalize_for_key(v, out_prefix, temp_prefixes) for v in value]
+    if isinstance(value, Enum):
+        return value.name
+    if value is None or value is ... or isinstance(value, (bool, Real)):
+        return value if value is not ... else '...'
+    if callable(value):
+        return getattr(value, '__name__', str(value))
+    if isinstance(value, (str, Path)):
+        value = str(value)
+        for i, temp_prefix in enumerate(temp_prefixes):
+            if value.startswith(temp_prefix):
+                return '<temp{}>'.format(i) + value[len(temp_prefix):]
+        if out_prefix and value.startswith(out_prefix):
+            value = '<out>' + value[len(out_prefix):]
+        return value
+    return str(value)
+
+
+def make_key(parts, out_prefix: Optional[str] = None, temp_prefixes: Sequence[PathLikeOrStr] = ()) -> str:
+    """ returns the sha256 of the normalized parts """
+    text = json.dumps(normalize_for_key(parts, out_prefix, [str(f) for f in temp_prefixes]))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class GdalosCache(object):
+    """
+    a content addressed cache of gdalos outputs.
+    each entry is a directory named by its key, holding the output files (final, overviews, info)
+    and a meta file. entries are evicted by least recent use, once the total size exceeds max_size.
+    the files are copied into and out of the cache. when link is True, they are hardlinked (if possible) instead,
+    which saves the copy time and the disk space, but then an entry shares its data with the outputs it was
+    stored from or restored to, thus modifying such an output in place (i.e. by gdalos_update) corrupts the entry.
+    """
+    __slots__ = ['path', 'max_size', 'link', 'checksum']
+
+    def __init__(self, path: PathLikeOrStr, max_size: Optional[int] = None, link: bool = False, checksum: bool = False):
+        self.path = Path(path)
+        self.max_size = max_size  # in bytes, None for unlimited
+        self.link = link
+        self.checksum = checksum  # identify the inputs by their content rather than by their path, size and mtime
+        os.makedirs(self.path, exist_ok=True)
+
+    def entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / key
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.isfile(self.entry_path(key) / cache_meta_name)
+
+    def __len__(self) -> int:
+        return len(self.entries())
+
+    def get_meta(self, key: str) -> Optional[dict]:
+        try:
+            with open(self.entry_path(key) / cache_meta_name) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set_meta(self, key: str, meta: dict):
+        with open(self.entry_path(key) / cache_meta_name, 'w') as f:
+            json.dump(meta, f, indent=1)
+
+    def entries(self) -> List[dict]:
+        """ returns the meta of all the entries, least recently used first """
+        entries = []
+        for meta_filename in self.path.glob('*/*/' + cache_meta_name):
+            meta = self.get_meta(meta_filename.parent.name)
+            if meta is not None:
+                entries.append(meta)
+        return sorted(entries, key=lambda meta: meta['last_access'])
+
+    def total_size(self) -> int:
+        return sum(meta['size'] for meta in self.entries())
+
+    def print(self):
+        for meta in self.entries():
+            print('{} size: {} last access: {} files: {} [{}]'.format(
+                meta['key'], meta['size'], time.ctime(meta['last_access']),
+                len(meta['files']), meta.get('description', '')))
+
+    def _put_file(self, src: PathLikeOrStr, dst: PathLikeOrStr):
+        if self.link:
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass  # i.e. different file systems
+        shutil.copy2(src, dst)
+
+    def store(self, key: str, final_filename: PathLikeOrStr, files: Dict[str, Sequence[PathLikeOrStr]],
+              description: str = '') -> bool:
+        """
+        stores the given files (by category, i.e. final_files, ovr_files, aux_files) under the key.
+        only files whose name starts with the final filename are stored, as they are restored relative to it.
+        """
+        final_filename = str(final_filename)
+        entry_path = self.entry_path(key)
+        self.remove(key)
+        os.makedirs(entry_path)
+        stored = []
+        size = 0
+        for category, filenames in files.items():
+            for f in filenames:
+                f = str(f)
+                if not f.startswith(final_filename) or not os.path.isfile(f):
+                    continue
+                suffix = f[len(final_filename):]
+                self._put_file(f, entry_path / (cache_data_name + suffix))
+                stored.append([category, suffix])
+                size += os.path.getsize(f)
+        if not stored:
+            self.remove(key)
+            return False
+        now = time.time()
+        self.set_meta(key, dict(key=key, files=stored, size=size, created=now, last_access=now,
+                                description=description))
+        self.evict()
+        return True
+
+    def restore(self, key: str, final_filename: PathLikeOrStr, files: Optional[Dict[str, list]] = None,
+                overwrite: bool = False) -> bool:
+        """
+        restores the files of the entry relative to the given final filename,
+        appends the restored files to the lists of their categories in `files`.
+        returns False if the key is not in the cache, or if the files could not be restored,
+        in which case no file is left partially restored.
+        """
+        meta = self.get_meta(key)
+        if meta is None:
+            return False
+        final_filename = str(final_filename)
+        entry_path = self.entry_path(key)
+        targets = [(category, entry_path / (cache_data_name + suffix), final_filename + suffix)
+                   for category, suffix in meta['files']]
+        if not overwrite and any(os.path.exists(dst) for _, _, dst in targets):
+            return False
+        os.makedirs(os.path.dirname(final_filename) or '.', exist_ok=True)
+        restored = []
+        try:
+            for category, src, dst in targets:
+                if os.path.exists(dst):
+                    os.remove(dst)
+                restored.append(dst)
+                self._put_file(src, dst)
+        except OSError:
+            for dst in restored:
+                if os.path.exists(dst):
+                    os.remove(dst)
+            if not all(os.path.isfile(src) for _, src, _ in targets):
+                self.remove(key)  # a damaged entry
+            return False
+        if files is not None:
+            for category, _, dst in targets:
+                files.setdefault(category, []).append(Path(dst))
+        meta['last_access'] = time.time()
+        self.set_meta(key, meta)
+        return True
+
+    def remove(self, key: str):
+        entry_path = self.entry_path(key)
+        if os.path.isdir(entry_path):
+            shutil.rmtree(entry_path)
+
+    def clear(self):
+        for meta in self.entries():
+            self.remove(meta['key'])
+
+    def evict(self, max_size: Optional[int] = None) -> List[str]:
+        """ removes the least recently used entries until the total size is within max_size """
+        if max_size is None:
+            max_size = self.max_size
+        if max_size is None:
+            return []
+        entries = self.entries()
+        total_size = sum(meta['size'] for meta in entries)
+        removed = []
+        for meta in entries:
+            if total_size <= max_size:
+                break
+            self.remove(meta['key'])
+            total_size -= meta['size']
+            removed.append(meta['key'])
+        return removed
@@ -0,0 +1,174 @@
+import hashlib
+import math
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from osgeo import gdal
+
+from gdalos import projdef
+from gdalos.gdalos_base import PathLikeOrStr
+from gdalos.gdalos_selector import get_projected_pj
+from gdalos.gdalos_temp import TempWorkspace
+from gdalos.gdalos_trans import gdalos_trans
+from gdalos.gdalos_types import OvrType
+from gdalos.rectangle import GeoRectangle
+
+default_max_items = 16
+default_bucket_size = 0.05  # degrees, observers in a bucket share the local projection of its center
+default_radius_step = 1000  # meters, the radius of a window is rounded up to a step, so it could serve more observers
+default_margin_pixels = 2  # source pixels around a window, for the resampling
+
+
+class ProjectedDtm(object):
+    """ a window of a dtm which was warped into a local projection """
+    __slots__ = ['filename', 'ds', 'pj', 'radius', 'persistent']
+
+    def __init__(self, filename: str, ds: gdal.Dataset, pj: str, radius: float, persistent: bool = False):
+        self.filename = filename
+        self.ds = ds
+        self.pj = pj  # the local projection, centered on the center of the window
+        self.radius = radius  # meters
+        self.persistent = persistent  # a file in the cache dir, which is not deleted on eviction
+
+    def __repr__(self):
+        return '<{}: {} radius: {}>'.format(self.__class__.__name__, self.filename, self.radius)
+
+    def get_convergence(self, geo_x: float, geo_y: float, d: float = 1e-4) -> float:
+        """ returns the angle (in degrees) from the true north to the grid north at the given point """
+        transform = projdef.get_transform(4326, self.pj)
+        x0, y0, _ = transform.TransformPoint(geo_x, geo_y)
+        x1, y1, _ = transform.TransformPoint(geo_x, geo_y + d)
+        return -math.degrees(math.atan2(x1 - x0, y1 - y0))
+
+
+class ProjectedDtmCache(object):
+    """
+    a cache of windows of a geographic dtm which were warped into a local (aeqd) projection around observers,
+    so nearby observers would share a single warp, instead of warping a window around each of them.
+    the observers are bucketed by their position, and the observers of a bucket share the projection of its center.
+    a window serves any observer of its bucket whose radius fits in it, the least recently used windows are evicted.
+    if a cache dir is given, the windows are kept in it, to be used by other processes and later runs.
+    """
+    __slots__ = ['max_items', 'bucket_size', 'radius_step', 'cache_dir', 'in_memory', 'workspace', 'items']
+
+    def __init__(self, max_items: int = default_max_items, bucket_size: float = default_bucket_size,
+                 radius_step: float = default_radius_step, cache_dir: Optional[PathLikeOrStr] = None,
+                 in_memory: Optional[bool] = None, workspace: Optional[TempWorkspace] = None):
+        self.max_items = max(1, max_items)
+        self.bucket_size = bucket_size
+        self.radius_step = radius_step
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.in_memory = in_memory  # False, i.e. for talos, which opens the windows by itself
+        self.workspace = workspace if workspace is not None else TempWorkspace()
+        self.items: OrderedDict = OrderedDict()  # key -> ProjectedDtm
+
+    def __getstate__(self):
+        # the datasets can't be pickled, so a cache that is sent to another process starts empty
+        return self.max_items, self.bucket_size, self.radius_step, self.cache_dir, self.in_memory
+
+    def __setstate__(self, state):
+        self.max_items, self.bucket_size, self.radius_step, self.cache_dir, self.in_memory = state
+        self.workspace = TempWorkspace()
+        self.items = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.clear()
+
+    def get_center(self, geo_x: float, geo_y: float) -> Tuple[float, float]:
+        b = self.bucket_size
+        return round((math.floor(geo_x / b) + 0.5) * b, 9), round((math.floor(geo_y / b) + 0.5) * b, 9)
+
+    @staticmethod
+    def get_source_name(ds: gdal.Dataset) -> str:
+        description = ds.GetDescription()
+        digest = hashlib.md5('{} {} {} {}'.format(
+            description, ds.RasterXSize, ds.RasterYSize, ds.GetGeoTransform()).encode()).hexdigest()[:12]
+        return '{}_{}'.format(Path(description).stem or 'dtm', digest)
+
+    def get_persistent_prefix(self, source: str, center: Tuple[float, float]) -> str:
+        return '{}_{:.6f}_{:.6f}_r'.format(source, *center)
+
+    def find_persistent(self, source: str, center: Tuple[float, float], radius: float) -> Optional[ProjectedDtm]:
+        """ returns the smallest window in the cache dir that covers the given radius """
+        if self.cache_dir is None or not self.cache_dir.is_dir():
+            return None
+        prefix = self.get_persistent_prefix(source, center)
+        best = None
+        for filename in self.cache_dir.glob(prefix + '*.tif'):
+            try:
+                r = float(filename.stem[len(prefix):])
+            except ValueError:
+                continue
+            if r >= radius and (best is None or r < best[0]):
+                best = r, filename
+        if best is None:
+            return None
+        ds = gdal.Open(str(best[1]))
+        if ds is None:
+            return None
+        return ProjectedDtm(str(best[1]), ds, get_projected_pj(*center), best[0], persistent=True)
+
+    def warp(self, ds: gdal.Dataset, source: str, center: Tuple[float, float], radius: float) -> ProjectedDtm:
+        pj = get_projected_pj(*center)
+        persistent = self.cache_dir is not None
+        if persistent:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            filename = str(self.cache_dir / '{}{:.0f}.tif'.format(self.get_persistent_prefix(source, center), radius))
+            # written under a temp name, so other processes would never open a partial window
+            out_filename = '{}.{}.tmp.tif'.format(filename, os.getpid())
+        else:
+            filename = out_filename = self.workspace.path(suffix='.tif', in_memory=self.in_memory)
+        extent = GeoRectangle.from_center_and_radius(0, 0, radius, radius)
+        projected_ds = gdalos_trans(
+            ds, out_filename=out_filename, warp_srs=pj, extent=extent, extent_in_4326=False,
+            ovr_type=OvrType.no_overviews, return_ds=True, write_info=False, write_spec=False,
+            workspace=self.workspace)
+        if not projected_ds:
+            raise Exception('input raster projection failed')
+        if persistent:
+            projected_ds = None
+            os.replace(out_filename, filename)
+            projected_ds = gdal.Open(filename)
+        return ProjectedDtm(filename, projected_ds, pj, radius, persistent)
+
+    def get(self, ds: gdal.Dataset, geo_x: float, geo_y: float, radius: float) -> ProjectedDtm:
+        """ returns a window of the given geographic dtm, in a local projection, which covers the given radius """
+        source = self.get_source_name(ds)
+        center = self.get_center(geo_x, geo_y)
+        pj = get_projected_pj(*center)
+        x, y, _ = projdef.get_transform(4326, pj).TransformPoint(geo_x, geo_y)
+        gt = ds.GetGeoTransform()
+        margin = default_margin_pixels * max(abs(gt[1]), abs(gt[5])) * 111320
+        needed = radius + math.hypot(x, y) + margin
+
+        key = source, center
+        item: Optional[ProjectedDtm] = self.items.get(key)
+        if item is not None and item.radius >= needed:
+            self.items.move_to_end(key)
+            return item
+        if item is not None:
+            self.evict(key)
+        item = self.find_persistent(source, center, needed)
+        if item is None:
+            radius = (math.floor(needed / self.radius_step) + 1) * self.radius_step
+            item = self.warp(ds, source, center, radius)
+        self.items[key] = item
+        while len(self.items) > self.max_items:
+            self.evict(next(iter(self.items)))
+        return item
+
+    def evict(self, key):
+        item = self.items.pop(key)
+        item.ds = None
+        if not item.persistent:
+            self.workspace.remove(item.filename)
+
+    def clear(self):
+        for key in list(self.items):
+            self.evict(key)
+        self.workspace.cleanup()
@@ -1,5 +1,7 @@
 from numbers import Real
 
+import numpy as np
+
 from gdalos import gdalos_util
 from osgeo_utils.auxiliary.base import Real2D
 from osgeo_utils.auxiliary.rectangle import get_points_extent
@@ -70,24 +72,26 @@ def transform_resolution(
     dx, dy = calc_dx_dy_from_extent_and_count(extent, sample_count)
 
     calc_only_res_y = equal_res is ...
-    out_x = []
-    out_y = []
-    y = float(extent.min_y)
-    while y <= extent.max_y:
-        x = float(extent.min_x)
-        while x < extent.max_x:
-            out_y.append(transform_resolution_p(transform, 0, input_res[1], x, y))
-            if not calc_only_res_y:
-                out_x.append(transform_resolution_p(transform, input_res[0], 0, x, y))
-            x += dx
-        y += dy
-
+    x, y = get_sample_grid(
+        accumulate_range(extent.min_x, extent.max_x, dx, inclusive=False),
+        accumulate_range(extent.min_y, extent.max_y, dy))
+    # the same as transform_resolution_p for each sample, with all the points transformed at once:
+    # y resolution: the distance between (x, y) and (x, y + res_y), x resolution: between (x, y + res_x) and (x, y)
+    count = len(x)
+    sample_x = [x, x] if calc_only_res_y else [x, x, x]
+    sample_y = [y, y + input_res[1]] if calc_only_res_y else [y, y + input_res[1], y + input_res[0]]
+    tx, ty, _ = transform_points_array(transform, np.concatenate(sample_x), np.concatenate(sample_y))
+    tx = tx.reshape(-1, count)
+    ty = ty.reshape(-1, count)
+
+    out_y = np.sqrt((ty[1] - ty[0]) ** 2 + (tx[1] - tx[0]) ** 2)
     if calc_only_res_y:
         out_y.sort()
         out_x = out_y
+    else:
+        out_x = np.sqrt((ty[0] - ty[2]) ** 2 + (tx[0] - tx[2]) ** 2)
     if equal_res:
-        out_y.extend(out_x)
-        out_y.sort()
+        out_y = np.sort(np.concatenate([out_y, out_x]))
         out_x = out_y
     else:
         out_x.sort()
@@ -95,7 +99,7 @@ def transform_resolution(
     out_r = [out_x, out_y]
 
     # choose the median resolution
-    out_res = [round_to_sig(r[round(len(r) / 2)], -1) for r in out_r]
+    out_res = [round_to_sig(float(r[round(len(r) / 2)]), -1) for r in out_r]
     out_res[1] = -out_res[1]
     return out_res
 
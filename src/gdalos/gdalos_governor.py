@@ -0,0 +1,127 @@
+import os
+import threading
+from typing import Optional
+
+from osgeo import gdal
+
+default_memory_fraction = 0.5  # of the usable physical memory, as the host might be shared
+default_cache_fraction = 0.25  # of the memory budget, for the gdal block cache (which is per process)
+min_job_warp_memory = 64 * 1024 ** 2  # gdal's default warpMemoryLimit
+
+
+class JobResources(object):
+    """ the resources that were assigned to a single job """
+    __slots__ = ['threads', 'warp_memory', 'cache']
+
+    def __init__(self, threads: int, warp_memory: int, cache: int):
+        self.threads = threads  # NUM_THREADS of the job
+        self.warp_memory = warp_memory  # warpMemoryLimit of the job, in bytes
+        self.cache = cache  # gdal block cache of the process (shared by the jobs of the process), in bytes
+
+    def __repr__(self):
+        return '<{}: threads: {} warp memory: {:,} cache: {:,}>'.format(
+            self.__class__.__name__, self.threads, self.warp_memory, self.cache)
+
+
+class ResourceGovernor(object):
+    """
+    divides a memory and cpu budget between concurrent jobs:
+    a part of the memory is given to the gdal block cache (which is shared by the jobs of a process),
+    the rest of the memory and the cpus are divided equally between the jobs that may run at once,
+    and at most that many jobs are admitted at once (the rest wait for a running job to end).
+    a governor is shared by the threads of a process. for a pool of processes, each worker gets a split of it.
+    """
+    __slots__ = ['memory', 'cpus', 'max_jobs', 'cache_fraction', 'running', 'condition']
+
+    def __init__(self, memory: Optional[int] = None, cpus: Optional[int] = None, max_jobs: Optional[int] = None,
+                 cache_fraction: float = default_cache_fraction):
+        if memory is None:
+            memory = int(gdal.GetUsablePhysicalRAM() * default_memory_fraction)
+        if cpus is None:
+            cpus = os.cpu_count() or 1
+        self.memory = int(memory)  # bytes
+        self.cpus = max(1, int(cpus))
+        self.cache_fraction = cache_fraction
+        if max_jobs is None:
+            max_jobs = self.cpus
+        # each job needs at least a single cpu and the minimal warp memory
+        self.max_jobs = max(1, min(int(max_jobs), self.cpus, int(self.get_jobs_memory() // min_job_warp_memory)))
+        self.running = 0
+        self.condition = threading.Condition()
+
+    def __getstate__(self):
+        # the lock can't be pickled, so a governor that is sent to another process starts with no running jobs
+        return self.memory, self.cpus, self.max_jobs, self.cache_fraction
+
+    def __setstate__(self, state):
+        self.memory, self.cpus, self.max_jobs, self.cache_fraction = state
+        self.running = 0
+        self.condition = threading.Condition()
+
+    def __repr__(self):
+        return '<{}: memory: {:,} cpus: {} max jobs: {}>'.format(
+            self.__class__.__name__, self.memory, self.cpus, self.max_jobs)
+
+    def get_cache_memory(self) -> int:
+        return int(self.memory * self.cache_fraction)
+
+    def get_jobs_memory(self) -> int:
+        return self.memory - self.get_cache_memory()
+
+    def get_concurrency(self, job_count: Optional[int] = None) -> int:
+        """ returns how many jobs may run at once (out of the given number of jobs) """
+        if job_count is None:
+            return self.max_jobs
+        return max(1, min(self.max_jobs, job_count))
+
+    def get_job_resources(self, concurrency: Optional[int] = None) -> JobResources:
+        if concurrency is None:
+            concurrency = self.max_jobs
+        return JobResources(
+            threads=max(1, self.cpus // concurrency),
+            warp_memory=max(min_job_warp_memory, self.get_jobs_memory() // concurrency),
+            cache=self.get_cache_memory())
+
+    def split(self, parts: int) -> 'ResourceGovernor':
+        """
+        returns a governor with a part of the budget,
+        for each of the given number of worker processes (each of which runs a single job at a time)
+        """
+        parts = max(1, parts)
+        return ResourceGovernor(memory=self.memory // parts, cpus=max(1, self.cpus // parts), max_jobs=1,
+                                cache_fraction=self.cache_fraction)
+
+    def acquire(self) -> JobResources:
+        """ waits until a job could be admitted, then returns its resources and applies the cache size """
+        with self.condition:
+            while self.running >= self.max_jobs:
+                self.condition.wait()
+            self.running += 1
+        cache = self.get_cache_memory()
+        if gdal.GetCacheMax() != cache:
+            gdal.SetCacheMax(cache)
+        return self.get_job_resources()
+
+    def release(self):
+        with self.condition:
+            self.running -= 1
+            self.condition.notify()
+
+    def admit(self) -> 'GovernorScope':
+        """ returns a context manager that holds a job slot, and gives the resources of the job """
+        return GovernorScope(self)
+
+
+class GovernorScope(object):
+    __slots__ = ['governor', 'resources']
+
+    def __init__(self, governor: ResourceGovernor):
+        self.governor = governor
+        self.resources = None
+
+    def __enter__(self) -> JobResources:
+        self.resources = self.governor.acquire()
+        return self.resources
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.governor.release()
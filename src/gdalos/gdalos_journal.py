@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Sequence
+
+from osgeo_utils.auxiliary.util import PathLikeOrStr
+from gdalos.gdalos_cache import file_identity, normalize_for_key
+from gdalos.gdalos_plan import JobState
+from gdalos.gdalos_temp import delete_file
+
+# the files of a job by category, as collected by gdalos_trans
+journal_file_categories = ['final_files', 'ovr_files', 'aux_files', 'temp_files']
+
+journal_schema = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    description TEXT,
+    params TEXT,
+    files TEXT,
+    outputs TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started REAL,
+    finished REAL
+)
+'''
+
+
+class JobJournal(object):
+    """
+    an on-disk (sqlite) journal of batch jobs: for each job it records its params, state,
+    the files it is expected to make, and (once done) the identity of its outputs (size and mtime, or sha256).
+    a job which is journaled as done, and whose outputs are intact, is not run again.
+    the expected files of a job that didn't finish (i.e. the process was killed) are deleted before it is rerun.
+    the journal holds only its path (a connection is made per operation), so it could be passed to worker processes.
+    """
+    __slots__ = ['path', 'checksum']
+
+    def __init__(self, path: PathLikeOrStr, checksum: bool = False):
+        self.path = str(path)
+        self.checksum = checksum  # identify the outputs by their sha256 rather than by their size and mtime
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.execute(journal_schema)
+
+    def execute(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        con = sqlite3.connect(self.path, timeout=60)
+        try:
+            con.row_factory = sqlite3.Row
+            with con:  # commits (or rolls back)
+                return con.execute(sql, params).fetchall()
+        finally:
+            con.close()
+
+    @staticmethod
+    def row_to_entry(row: sqlite3.Row) -> dict:
+        entry = dict(row)
+        for k in ['params', 'files', 'outputs']:
+            entry[k] = json.loads(entry[k]) if entry[k] else None
+        return entry
+
+    def get(self, key: str) -> Optional[dict]:
+        rows = self.execute('SELECT * FROM jobs WHERE key = ?', (key,))
+        return self.row_to_entry(rows[0]) if rows else None
+
+    def entries(self, state: Optional[JobState] = None) -> List[dict]:
+        if state is None:
+            rows = self.execute('SELECT * FROM jobs ORDER BY started')
+        else:
+            rows = self.execute('SELECT * FROM jobs WHERE state = ? ORDER BY started', (state.name,))
+        return [self.row_to_entry(row) for row in rows]
+
+    def begin(self, key: str, params: dict, files: Dict[str, Sequence[PathLikeOrStr]], description: str = ''):
+        """ journals the job as running, with the files that it is expected to make """
+        files = {k: [str(f) for f in v] for k, v in files.items()}
+        self.execute(
+            'INSERT INTO jobs (key, state, description, params, files, attempts, started) '
+            'VALUES (?, ?, ?, ?, ?, 1, ?) '
+            'ON CONFLICT(key) DO UPDATE SET state = excluded.state, description = excluded.description, '
+            'params = excluded.params, files = excluded.files, outputs = NULL, error = NULL, '
+            'attempts = attempts + 1, started = excluded.started, finished = NULL',
+            (key, JobState.running.name, description, json.dumps(normalize_for_key(params)),
+             json.dumps(files), time.time()))
+
+    def finish(self, key: str, files: Optional[Dict[str, Sequence[PathLikeOrStr]]] = None,
+               error: Optional[str] = None):
+        """ journals the job as done (with the identity of its output files) or as failed (if an error is given) """
+        outputs = None
+        if error is None and files is not None:
+            outputs = {str(f): file_identity(f, self.checksum)
+                       for category in ['final_files', 'ovr_files', 'aux_files']
+                       for f in files.get(category, []) if os.path.isfile(f)}
+        state = JobState.failed if error is not None else JobState.done
+        self.execute('UPDATE jobs SET state = ?, outputs = ?, error = ?, finished = ? WHERE key = ?',
+                     (state.name, json.dumps(outputs) if outputs is not None else None, error, time.time(), key))
+
+    def verify(self, entry: dict) -> bool:
+        """ returns True if the job is done and its outputs were not changed or removed since """
+        if entry['state'] != JobState.done.name or not entry['outputs']:
+            return False
+        for f, identity in entry['outputs'].items():
+            if not os.path.isfile(f) or file_identity(f, self.checksum) != identity:
+                return False
+        return True
+
+    def cleanup(self, entry: dict) -> List[str]:
+        """ deletes the (possibly partial) files of the job, returns the deleted files """
+        deleted = []
+        for category in journal_file_categories:
+            for f in (entry['files'] or {}).get(category, []):
+                try:
+                    if delete_file(f):
+                        deleted.append(f)
+                except OSError:
+                    pass
+        return deleted
+
+    def cleanup_orphans(self) -> List[str]:
+        """
+        deletes the files of all the jobs that are not done (i.e. of a killed run) and removes them from the journal.
+        should not be called while another run uses this journal.
+        """
+        deleted = []
+        for entry in self.entries():
+            if entry['state'] != JobState.done.name:
+                deleted.extend(self.cleanup(entry))
+                self.remove(entry['key'])
+        return deleted
+
+    def remove(self, key: str):
+        self.execute('DELETE FROM jobs WHERE key = ?', (key,))
+
+    def print(self):
+        for entry in self.entries():
+            print('{} {} attempts: {} [{}]{}'.format(
+                entry['key'], entry['state'], entry['attempts'], entry['description'],
+                ' error: {}'.format(entry['error']) if entry['error'] else ''))
@@ -1,6 +1,17 @@
 import logging
 
 
+def get_call_logger(name: str) -> logging.Logger:
+    """
+    returns a new logger for a single call, so its handlers are not shared with concurrent calls.
+    it is not registered in the logging manager (so it is freed after the call),
+    and its records are propagated to the (shared) logger of the given name.
+    """
+    logger = logging.Logger(name)
+    logger.parent = logging.getLogger(name)
+    return logger
+
+
 def set_logger_console(logger, level=logging.INFO):
     logger.setLevel(logging.DEBUG)
     # create console handler with a higher log level
@@ -16,9 +27,9 @@ def set_logger_console(logger, level=logging.INFO):
     return ch
 
 
-def set_file_logger(logger, log_filename, level=logging.DEBUG):
+def set_file_logger(logger, log_filename, level=logging.DEBUG, mode="w"):
     # create file handler which logs even debug messages
-    fh = logging.FileHandler(log_filename, mode="w")
+    fh = logging.FileHandler(log_filename, mode=mode)
     fh.setLevel(level)
 
     # create formatter and add it to the handlers
@@ -0,0 +1,289 @@
+import os
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from enum import Enum, auto
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from osgeo import gdal
+
+
+class JobKind(Enum):
+    # translate or warp of the base raster (or of a single overview level)
+    trans = auto()
+    # create overviews (internal or external) for a raster
+    ovr = auto()
+    # cog 2nd step: copy a raster and its overviews into the final cog
+    cog = auto()
+    # write the .info file
+    info = auto()
+    # delete the temp files of the run
+    cleanup = auto()
+    # start the .spec file, to which the other jobs of the run write their logs
+    spec = auto()
+
+
+class JobState(Enum):
+    pending = auto()
+    running = auto()
+    done = auto()
+    failed = auto()
+    # a job that was not executed because one of its dependencies failed
+    skipped = auto()
+
+
+class GdalosJob(object):
+    __slots__ = ['kind', 'func', 'kwargs', 'deps', 'est_size', 'est_pixels', 'out_filename',
+                 'check_result', 'state', 'result', 'error']
+
+    def __init__(self, kind: JobKind, func: Callable, kwargs: dict,
+                 deps: Sequence['GdalosJob'] = (), est_size: int = 0, est_pixels: int = 0,
+                 out_filename=None, check_result: bool = True):
+        self.kind = kind
+        self.func = func
+        self.kwargs = kwargs
+        self.deps = list(deps)
+        self.est_size = est_size  # expected (uncompressed) output size in bytes
+        self.est_pixels = est_pixels  # expected output pixel count (per band)
+        self.out_filename = out_filename
+        self.check_result = check_result  # if True, a falsy return value marks the job as failed
+
+        self.state = JobState.pending
+        self.result = None
+        self.error = None
+
+    def is_ready(self) -> bool:
+        return all(dep.state == JobState.done for dep in self.deps)
+
+    def is_blocked(self) -> bool:
+        return any(dep.state in (JobState.failed, JobState.skipped) for dep in self.deps)
+
+    def set_result(self, result=None, error: Optional[BaseException] = None):
+        self.result = result
+        self.error = error
+        failed = error is not None or (self.check_result and not result)
+        self.state = JobState.failed if failed else JobState.done
+
+    def run(self):
+        self.state = JobState.running
+        try:
+            result = run_job(self.func, self.kwargs)
+        except Exception as e:
+            self.set_result(error=e)
+        else:
+            self.set_result(result)
+        return self.result
+
+    def __repr__(self):
+        return '<{}: {} "{}" size: {} deps: {}>'.format(
+            self.__class__.__name__, self.kind.name, self.out_filename, self.est_size, len(self.deps))
+
+
+GdalosPlan = List[GdalosJob]
+
+
+def run_job(func: Callable, kwargs: dict):
+    # a module level function, so that the job could be pickled to a process pool
+    return func(**kwargs)
+
+
+def estimate_raster_bytes(width: int, height: int, bands: int, data_type: int) -> int:
+    """ returns the uncompressed size of a raster in bytes """
+    return int(width) * int(height) * int(bands) * (gdal.GetDataTypeSize(data_type) // 8)
+
+
+def sort_plan(plan: GdalosPlan) -> GdalosPlan:
+    """ returns the jobs sorted by expected size then by dependency """
+    result = []
+    done = set()
+    pending = sorted(plan, key=lambda job: job.est_size, reverse=True)
+    while pending:
+        for job in pending:
+            if all(id(dep) in done for dep in job.deps):
+                break
+        else:
+            raise Exception('circular dependency in plan: {}'.format(pending))
+        pending.remove(job)
+        done.add(id(job))
+        result.append(job)
+    return result
+
+
+def print_plan(plan: GdalosPlan):
+    index = {id(job): idx for idx, job in enumerate(plan)}
+    for idx, job in enumerate(plan):
+        deps = [index.get(id(dep)) for dep in job.deps]
+        print('{}: {} "{}" size: {} deps: {} [{}]'.format(
+            idx, job.kind.name, job.out_filename, job.est_size, deps, job.state.name))
+
+
+def get_job_gdal_calls(job: GdalosJob) -> List[str]:
+    """ returns a description of the gdal calls that the job would make """
+    kwargs = job.kwargs
+    if job.kind == JobKind.trans:
+        calls = []
+        if kwargs.get("do_warp"):
+            calls.append('gdal.Warp({}, {})'.format(kwargs.get("common_options"), kwargs.get("warp_options")))
+        elif kwargs.get("trans_or_warp_is_needed") or kwargs.get("value_scale") is None:
+            calls.append('gdal.Translate({}, {})'.format(kwargs.get("common_options"), kwargs.get("translate_options")))
+        if kwargs.get("value_scale") is not None:
+            calls.append('scale_raster(scale={})'.format(kwargs.get("value_scale")))
+        return calls
+    elif job.kind == JobKind.ovr:
+        return ['gdal.BuildOverviews(ovr_type={}, count={})'.format(
+            getattr(kwargs.get("ovr_type"), 'name', None), kwargs.get("dst_ovr_count"))]
+    elif job.kind == JobKind.cog:
+        return ['gdal.Translate(COG, overviews=existing_reuse)']
+    elif job.kind == JobKind.info:
+        return ['gdal.Info']
+    return []
+
+
+def get_plan_report(plan: GdalosPlan, temp_files: Sequence = ()) -> dict:
+    """
+    returns the expected work of the plan: the gdal calls, pixels and (uncompressed) bytes per output file,
+    and the peak of disk usage (total and of temp files) when the jobs are run one after another
+    """
+    temp_files = set(str(f) for f in temp_files)
+    index = {id(job): idx for idx, job in enumerate(plan)}
+    jobs = []
+    sizes = dict()
+    disk = disk_peak = temp = temp_peak = 0
+    for job in sort_plan(plan):
+        if job.kind == JobKind.cleanup:
+            for f in job.kwargs.get("files", []):
+                size = sizes.pop(str(f), 0)
+                disk -= size
+                temp -= size
+        elif job.out_filename is not None and job.est_size:
+            f = str(job.out_filename)
+            sizes[f] = job.est_size
+            disk += job.est_size
+            disk_peak = max(disk_peak, disk)
+            if f in temp_files:
+                temp += job.est_size
+                temp_peak = max(temp_peak, temp)
+        jobs.append(dict(
+            idx=index[id(job)], kind=job.kind.name, out_filename=str(job.out_filename),
+            pixels=job.est_pixels, bytes=job.est_size, temp=str(job.out_filename) in temp_files,
+            deps=[index.get(id(dep)) for dep in job.deps], gdal_calls=get_job_gdal_calls(job)))
+    return dict(
+        jobs=jobs,
+        pixels=sum(job.est_pixels for job in plan if job.kind == JobKind.trans),
+        bytes=sum(job.est_size for job in plan if job.kind != JobKind.cleanup),
+        disk_peak=disk_peak,
+        temp_peak=temp_peak,
+    )
+
+
+def print_plan_report(report: dict):
+    for job in report['jobs']:
+        print('{}: {} "{}" pixels: {:,} bytes: {:,}{} deps: {}'.format(
+            job['idx'], job['kind'], job['out_filename'], job['pixels'], job['bytes'],
+            ' (temp)' if job['temp'] else '', job['deps']))
+        for call in job['gdal_calls']:
+            print('    ' + call)
+    print('total pixels: {:,} bytes: {:,} disk peak: {:,} temp peak: {:,}'.format(
+        report['pixels'], report['bytes'], report['disk_peak'], report['temp_peak']))
+
+
+def gdalos_execute_plan(plan: GdalosPlan, executor: Optional[Executor] = None, logger=None) -> GdalosPlan:
+    """
+    runs the jobs of the plan, a job is run only after all of its dependencies were done.
+    if an executor is given, independent jobs are submitted to it concurrently (biggest jobs first),
+    otherwise the jobs are run one after another.
+    jobs which hold open datasets (i.e. in memory inputs) cannot be pickled, thus require a thread executor.
+    returns the jobs in their execution order, each holding its state and result.
+    """
+    verbose = logger is not None and logger is not ...
+    pending = sort_plan(plan)
+    executed = []
+    running = dict()
+    while pending or running:
+        for job in list(pending):
+            if job.is_blocked():
+                pending.remove(job)
+                job.state = JobState.skipped
+                executed.append(job)
+                if verbose:
+                    logger.warning('skipping job due to a failed dependency: {}'.format(job))
+        ready = [job for job in pending if job.is_ready()]
+        if executor is None:
+            if not ready:
+                break
+            job = ready[0]
+            pending.remove(job)
+            job.run()
+            executed.append(job)
+            if verbose and job.state == JobState.failed:
+                logger.error('job failed: {} ({})'.format(job, job.error))
+            continue
+        for job in ready:
+            pending.remove(job)
+            job.state = JobState.running
+            running[executor.submit(run_job, job.func, job.kwargs)] = job
+        if not running:
+            break
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            job = running.pop(future)
+            error = future.exception()
+            job.set_result(None if error else future.result(), error)
+            executed.append(job)
+            if verbose and job.state == JobState.failed:
+                logger.error('job failed: {} ({})'.format(job, job.error))
+    return executed
+
+
+default_warp_memory = 64 * 1024 ** 2  # gdal's default warpMemoryLimit
+
+
+def get_workers_count(workers: Optional[int] = None, job_memory: Optional[int] = None) -> int:
+    """
+    returns how many jobs could run concurrently: the requested number of workers (None -> number of cpus),
+    bounded by the usable physical memory divided by the expected memory of a single job
+    (by default: gdal block cache + warp memory, as each process has its own block cache)
+    """
+    if workers is None or workers is ... or workers is True or workers <= 0:
+        workers = os.cpu_count() or 1
+    if job_memory is None:
+        job_memory = gdal.GetCacheMax() + default_warp_memory
+    ram = gdal.GetUsablePhysicalRAM()
+    if ram > 0 and job_memory > 0:
+        workers = min(workers, max(1, ram // job_memory))
+    return int(workers)
+
+
+def execute_bounded_iter(executor: Executor, func: Callable, kwargs_list: Sequence[dict],
+                         max_pending: int, logger=None) -> Iterator[Tuple[int, Any]]:
+    """
+    submits func(**kwargs) for each of the kwargs to the executor, with at most max_pending jobs in flight.
+    yields (index, result) of each job as it completes, a job that raised an exception has a None result.
+    """
+    verbose = logger is not None and logger is not ...
+    running = dict()
+    next_idx = 0
+    while next_idx < len(kwargs_list) or running:
+        while next_idx < len(kwargs_list) and len(running) < max_pending:
+            running[executor.submit(run_job, func, kwargs_list[next_idx])] = next_idx
+            next_idx += 1
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            idx = running.pop(future)
+            error = future.exception()
+            if error is None:
+                yield idx, future.result()
+            else:
+                if verbose:
+                    logger.error('job {} failed: {}'.format(idx, error))
+                yield idx, None
+
+
+def execute_bounded(executor: Executor, func: Callable, kwargs_list: Sequence[dict],
+                    max_pending: int, logger=None) -> list:
+    """
+    submits func(**kwargs) for each of the kwargs to the executor, with at most max_pending jobs in flight.
+    returns the results in the order of kwargs_list, a job that raised an exception has a None result.
+    """
+    results = [None] * len(kwargs_list)
+    for idx, result in execute_bounded_iter(executor, func, kwargs_list, max_pending, logger):
+        results[idx] = result
+    return results
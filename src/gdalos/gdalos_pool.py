@@ -0,0 +1,128 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from osgeo import gdal
+
+from osgeo_utils.auxiliary.util import OpenDS as _OpenDS, PathLikeOrStr, is_path_like
+
+default_max_open = 64
+
+
+def make_pool_key(filename: PathLikeOrStr, access_mode=gdal.OF_READONLY | gdal.OF_RASTER, ovr_idx=None,
+                  ovr_only: bool = False, open_options=None, logger=None) -> tuple:
+    # the arguments are the same as of OpenDS._open_ds
+    if open_options:
+        if isinstance(open_options, dict):
+            open_options = ['{}={}'.format(k, v) for k, v in open_options.items()]
+        open_options = tuple(sorted(open_options))
+    else:
+        open_options = ()
+    # gdal datasets should not be shared between threads
+    return os.path.abspath(str(filename)), access_mode, ovr_idx, ovr_only, open_options, threading.get_ident()
+
+
+def is_update_mode(access_mode) -> bool:
+    return access_mode == gdal.GA_Update or bool(access_mode & gdal.OF_UPDATE)
+
+
+class DatasetPool(object):
+    """
+    an LRU pool of read only gdal datasets, keyed by path, access mode, ovr_idx, open options and thread.
+    datasets that are opened for update are never pooled.
+    a file that is about to be written or deleted should be invalidated first,
+    so its stale (and on windows, locking) handles are closed.
+    """
+    __slots__ = ['max_open', 'items', 'lock', 'hits', 'misses']
+
+    def __init__(self, max_open: int = default_max_open):
+        self.max_open = max_open
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def open(self, filename: PathLikeOrStr, *args, **kwargs) -> Optional[gdal.Dataset]:
+        key = make_pool_key(filename, *args, **kwargs)
+        if is_update_mode(key[1]):
+            return _OpenDS._open_ds(filename, *args, **kwargs)
+        with self.lock:
+            ds = self.items.get(key)
+            if ds is not None:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return ds
+            self.misses += 1
+        ds = _OpenDS._open_ds(filename, *args, **kwargs)
+        if ds is not None:
+            with self.lock:
+                self.items[key] = ds
+                while len(self.items) > self.max_open:
+                    self.items.popitem(last=False)
+        return ds
+
+    def invalidate(self, filename: Optional[PathLikeOrStr] = None):
+        """
+        closes the pooled datasets of the given file, or of all the files if None is given.
+        as overviews and aux files extend the name of their raster (i.e. a.tif.ovr, a.tif.aux.xml),
+        a raster is invalidated also when a file with its name as a prefix is written (and vice versa)
+        """
+        with self.lock:
+            if filename is None:
+                self.items.clear()
+                return
+            filename = os.path.abspath(str(filename))
+            for key in list(self.items):
+                path = key[0]
+                if path.startswith(filename) or filename.startswith(path):
+                    del self.items[key]
+
+    def clear(self):
+        self.invalidate()
+
+
+dataset_pool: Optional[DatasetPool] = None
+
+
+def get_dataset_pool() -> Optional[DatasetPool]:
+    return dataset_pool
+
+
+def set_dataset_pool(pool: Optional[DatasetPool]) -> Optional[DatasetPool]:
+    """ sets the process wide pool (None to disable pooling), returns the previous one """
+    global dataset_pool
+    prev, dataset_pool = dataset_pool, pool
+    if prev is not None and prev is not pool:
+        prev.clear()
+    return prev
+
+
+def enable_dataset_pool(max_open: int = default_max_open) -> DatasetPool:
+    pool = DatasetPool(max_open)
+    set_dataset_pool(pool)
+    return pool
+
+
+def invalidate_dataset(filename: PathLikeOrStr):
+    """ should be called before a file is written or deleted """
+    if dataset_pool is not None and is_path_like(filename):
+        dataset_pool.invalidate(filename)
+
+
+class OpenDS(_OpenDS):
+    # opens the dataset through the pool (if enabled)
+    __slots__ = ()
+
+    def __enter__(self) -> gdal.Dataset:
+        if self.ds is None and dataset_pool is not None:
+            ds = dataset_pool.open(self.filename, *self.args, **self.kwargs)
+            if ds is None and not self.silent_fail:
+                raise IOError(f'Could not open file "{self.filename}"')
+            self.ds = ds
+            self.own = True
+            return ds
+        return super().__enter__()
@@ -0,0 +1,367 @@
+import math
+import os
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from osgeo import gdal
+
+from gdalos import gdalos_util
+from gdalos.gdalos_types import OvrType
+
+default_strip_memory = 256 * 1024 ** 2  # bytes, of the intermediate arrays of a strip of the base raster
+
+
+def gdal_array_type(data_type: int) -> np.dtype:
+    from osgeo import gdal_array
+    return np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(data_type))
+
+
+def get_cubic_weights() -> List[float]:
+    # the cubic convolution kernel (a=-0.5), stretched by a factor of 2, at the centers of the 8 contributing pixels
+    def w(x):
+        x = abs(x)
+        if x < 1:
+            return 1.5 * x ** 3 - 2.5 * x ** 2 + 1
+        if x < 2:
+            return -0.5 * x ** 3 + 2.5 * x ** 2 - 4 * x + 2
+        return 0
+
+    return [w((o + 0.5 - 1) / 2) for o in range(-3, 5)]
+
+
+# resampling -> (the offsets of the contributing pixels from 2*dst_pixel, their weights)
+pyramid_kernels = {
+    'nearest': ([1], None),
+    'mode': ([0, 1], None),
+    'average': ([0, 1], [1, 1]),
+    'bilinear': ([-1, 0, 1, 2], [1, 3, 3, 1]),
+    'cubic': (list(range(-3, 5)), get_cubic_weights()),
+}
+
+
+def get_pyramid_resampling(resampling_alg) -> Optional[str]:
+    """ returns the name of the given resampling if the pyramid builder supports it, otherwise None """
+    if resampling_alg in [None, ...]:
+        return None
+    name = resampling_alg.name if hasattr(resampling_alg, 'name') else str(resampling_alg).lower()
+    if name == 'near':
+        name = 'nearest'
+    return name if name in pyramid_kernels else None
+
+
+def get_level_sizes(width: int, height: int, count: int) -> List[Tuple[int, int]]:
+    sizes = []
+    for _ in range(count):
+        width, height = (width + 1) // 2, (height + 1) // 2
+        sizes.append((width, height))
+    return sizes
+
+
+def gather(arr: np.ndarray, axis: int, start: int, count: int, offset: int, size: int, base: int = 0):
+    """
+    returns the values at the indexes 2*j+offset (j in range(start, start+count)) along the axis,
+    (clamped to [0, size)) and a mask of the indexes which are inside the raster.
+    base is the index of the first item of arr along the axis
+    """
+    idx = 2 * np.arange(start, start + count) + offset
+    inside = (idx >= 0) & (idx < size)
+    idx = np.clip(idx, 0, size - 1) - base
+    shape = [1] * arr.ndim
+    shape[axis] = count
+    return np.take(arr, idx, axis=axis), inside.reshape(shape)
+
+
+class PyramidReducer(object):
+    """ reduces a raster by a factor of 2, with nodata handling, by numpy """
+    __slots__ = ['resampling', 'offsets', 'weights', 'nodata', 'dtype']
+
+    def __init__(self, resampling: str, nodata: Sequence[Optional[float]], dtype: np.dtype):
+        self.resampling = resampling
+        self.offsets, self.weights = pyramid_kernels[resampling]
+        self.nodata = list(nodata)
+        self.dtype = np.dtype(dtype)
+
+    def get_valid(self, arr: np.ndarray) -> np.ndarray:
+        valid = np.ones(arr.shape, dtype=bool)
+        for b, nodata in enumerate(self.nodata):
+            if nodata is not None and not math.isnan(nodata):
+                valid[b] = arr[b] != nodata
+        if self.dtype.kind == 'f':
+            valid &= ~np.isnan(arr)
+        return valid
+
+    def finalize(self, values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        if self.dtype.kind in 'iu':
+            info = np.iinfo(self.dtype)
+            values = np.clip(np.floor(values + 0.5), info.min, info.max)
+        out = values.astype(self.dtype)
+        for b, nodata in enumerate(self.nodata):
+            out[b][~valid[b]] = nodata if nodata is not None else 0
+        return out
+
+    def reduce(self, arr: np.ndarray, base_row: int, size: Tuple[int, int], start: int, count: int,
+               base_col: int = 0, col_start: int = 0, col_count: Optional[int] = None) -> np.ndarray:
+        """
+        returns the rows [start, start+count) of the reduced raster, from arr (bands, rows, cols),
+        which holds the rows [base_row, ...) of a raster of the given size (width, height).
+        the columns are [col_start, col_start+col_count) (by default all), arr holds the columns [base_col, ...)
+        """
+        width, height = size
+        if col_count is None:
+            col_count = (width + 1) // 2 - col_start
+        if self.resampling == 'nearest':
+            offset = self.offsets[0]
+            rows, _ = gather(arr, 1, start, count, offset, height, base_row)
+            out, _ = gather(rows, 2, col_start, col_count, offset, width, base_col)
+            return out
+        if self.resampling == 'mode':
+            return self.reduce_mode(arr, base_row, size, start, count, base_col, col_start, col_count)
+
+        # a separable convolution, of which the weights of the invalid pixels are dropped
+        valid = self.get_valid(arr)
+        values = np.where(valid, arr, 0).astype(np.float64)
+        num_rows = den_rows = 0
+        for offset, weight in zip(self.offsets, self.weights):
+            v, inside = gather(values, 1, start, count, offset, height, base_row)
+            m, _ = gather(valid, 1, start, count, offset, height, base_row)
+            m = m & inside
+            num_rows = num_rows + weight * v * m
+            den_rows = den_rows + weight * m
+        num = den = 0
+        for offset, weight in zip(self.offsets, self.weights):
+            v, inside = gather(num_rows, 2, col_start, col_count, offset, width, base_col)
+            d, _ = gather(den_rows, 2, col_start, col_count, offset, width, base_col)
+            num = num + weight * v * inside
+            den = den + weight * d * inside
+        # the center pixels decide if the result is valid, where the weights of the valid pixels are too small
+        # (i.e. by the negative lobes of the cubic kernel) the average of the center pixels is used
+        center_num = center_den = 0
+        for row_offset in (0, 1):
+            v, row_inside = gather(values, 1, start, count, row_offset, height, base_row)
+            m, _ = gather(valid, 1, start, count, row_offset, height, base_row)
+            for col_offset in (0, 1):
+                vc, col_inside = gather(v, 2, col_start, col_count, col_offset, width, base_col)
+                mc, _ = gather(m, 2, col_start, col_count, col_offset, width, base_col)
+                mc = mc & row_inside & col_inside
+                center_num = center_num + vc * mc
+                center_den = center_den + mc
+        out_valid = center_den > 0
+        total_weight = sum(self.weights) ** 2
+        use_kernel = den > total_weight * 0.25
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = np.where(use_kernel, num / np.where(use_kernel, den, 1),
+                              center_num / np.maximum(center_den, 1))
+        return self.finalize(result, out_valid)
+
+    def reduce_mode(self, arr: np.ndarray, base_row: int, size: Tuple[int, int], start: int, count: int,
+                    base_col: int, col_start: int, col_count: int) -> np.ndarray:
+        width, height = size
+        valid = self.get_valid(arr)
+        candidates = []
+        for row_offset in (0, 1):
+            v, row_inside = gather(arr, 1, start, count, row_offset, height, base_row)
+            m, _ = gather(valid, 1, start, count, row_offset, height, base_row)
+            for col_offset in (0, 1):
+                vc, col_inside = gather(v, 2, col_start, col_count, col_offset, width, base_col)
+                mc, _ = gather(m, 2, col_start, col_count, col_offset, width, base_col)
+                candidates.append((vc, mc & row_inside & col_inside))
+        # the value which appears most often (the first of the ties) of the 4 contributing pixels
+        best, best_count = candidates[0][0], np.zeros(candidates[0][0].shape, dtype=np.int8) - 1
+        for v, m in candidates:
+            n = sum(((v == v2) & m2).astype(np.int8) for v2, m2 in candidates)
+            n = np.where(m, n, -1)
+            better = n > best_count
+            best = np.where(better, v, best)
+            best_count = np.where(better, n, best_count)
+        return self.finalize(best, best_count > 0)
+
+
+class PyramidLevel(object):
+    # the pending input rows of a level, which are reduced into its rows once all their contributing rows are read
+    __slots__ = ['bands', 'in_size', 'size', 'buffer', 'buffer_start', 'rows_done']
+
+    def __init__(self, bands: Sequence[gdal.Band], in_size: Tuple[int, int], size: Tuple[int, int]):
+        self.bands = bands
+        self.in_size = in_size
+        self.size = size
+        self.buffer = None
+        self.buffer_start = 0
+        self.rows_done = 0
+
+
+class PyramidBuilder(object):
+    """
+    builds all the overview levels of a raster from a single read of it:
+    the base raster is read in strips of rows, each strip is reduced into the rows of the first level,
+    which are reduced into the rows of the next level and so on.
+    each level keeps only the rows that are still needed, so the memory is bounded by the strip size.
+    """
+    __slots__ = ['levels', 'reducer', 'max_offset', 'min_offset']
+
+    def __init__(self, levels_bands: Sequence[Sequence[gdal.Band]], size: Tuple[int, int], reducer: PyramidReducer):
+        self.reducer = reducer
+        self.max_offset = max(reducer.offsets)
+        self.min_offset = min(reducer.offsets + [0])
+        self.levels = []
+        in_size = size
+        for bands in levels_bands:
+            level_size = ((in_size[0] + 1) // 2, (in_size[1] + 1) // 2)
+            if (bands[0].XSize, bands[0].YSize) != level_size:
+                raise Exception('unexpected overview size: {} instead of {}'.format(
+                    (bands[0].XSize, bands[0].YSize), level_size))
+            self.levels.append(PyramidLevel(bands, in_size, level_size))
+            in_size = level_size
+
+    def add_rows(self, level_idx: int, rows: np.ndarray, start: int):
+        """ adds the rows [start, start+len(rows)) of the input of the level, and reduces the rows that are ready """
+        if level_idx >= len(self.levels):
+            return
+        level = self.levels[level_idx]
+        if level.buffer is None:
+            level.buffer = rows
+            level.buffer_start = start
+        else:
+            level.buffer = np.concatenate([level.buffer, rows], axis=1)
+        in_height = level.in_size[1]
+        available = level.buffer_start + level.buffer.shape[1]
+        if available >= in_height:
+            ready = level.size[1]
+        else:
+            ready = min(level.size[1], (available - 1 - self.max_offset) // 2 + 1)
+        if ready <= level.rows_done:
+            return
+        count = ready - level.rows_done
+        out = self.reducer.reduce(level.buffer, level.buffer_start, level.in_size, level.rows_done, count)
+        for band, band_rows in zip(level.bands, out):
+            band.WriteArray(band_rows, 0, level.rows_done)
+        out_start = level.rows_done
+        level.rows_done = ready
+        # keep only the rows that are needed by the next rows
+        keep_from = max(level.buffer_start, min(in_height, 2 * ready + self.min_offset))
+        level.buffer = level.buffer[:, keep_from - level.buffer_start:]
+        level.buffer_start = keep_from
+        self.add_rows(level_idx + 1, out, out_start)
+
+    def build(self, ds: gdal.Dataset, strip_rows: int, callback: Optional[Callable] = None):
+        height = ds.RasterYSize
+        for start in range(0, height, strip_rows):
+            count = min(strip_rows, height - start)
+            rows = ds.ReadAsArray(0, start, ds.RasterXSize, count)
+            if rows.ndim == 2:
+                rows = rows[np.newaxis]
+            self.add_rows(0, rows, start)
+            if callback is not None:
+                callback((start + count) / height)
+
+
+def get_strip_rows(ds: gdal.Dataset, strip_memory: int = default_strip_memory) -> int:
+    """ returns how many rows to read at once, a multiple of the block height """
+    # the float64 temporaries of the reducer take about this many times the pixels of a strip
+    bytes_per_row = ds.RasterXSize * ds.RasterCount * 8 * 8
+    block_height = ds.GetRasterBand(1).GetBlockSize()[1]
+    rows = max(1, strip_memory // bytes_per_row // block_height) * block_height
+    return max(rows, 16)
+
+
+def is_pyramid_supported(ds: gdal.Dataset) -> bool:
+    # alpha and mask bands affect the resampling of the other bands, which is done by gdal
+    for i in range(ds.RasterCount):
+        band = ds.GetRasterBand(i + 1)
+        if band.GetColorInterpretation() == gdal.GCI_AlphaBand or band.GetMaskFlags() & gdal.GMF_PER_DATASET:
+            return False
+        if band.DataType in (gdal.GDT_CInt16, gdal.GDT_CInt32, gdal.GDT_CFloat32, gdal.GDT_CFloat64):
+            return False
+    return len(set(ds.GetRasterBand(i + 1).DataType for i in range(ds.RasterCount))) == 1
+
+
+def get_pyramid_filenames(filename, ovr_type: OvrType, count: int) -> List[Path]:
+    out_filename = gdalos_util.concat_paths(filename, ".ovr")
+    if ovr_type == OvrType.create_external_single:
+        return [out_filename]
+    filenames = []
+    for _ in range(count):
+        filenames.append(out_filename)
+        out_filename = gdalos_util.concat_paths(out_filename, ".ovr")
+    return filenames
+
+
+def gdalos_pyramid(filename, ovr_type: OvrType, dst_ovr_count: int, resampling_alg,
+                   ovr_files: Optional[list] = None, strip_memory: int = default_strip_memory,
+                   callback: Optional[Callable] = None, logger=None) -> Optional[bool]:
+    """
+    creates external overviews (a single .ovr file or a chain of .ovr files) of a raster,
+    from a single read of it, by numpy reducers (nearest, average, bilinear, cubic, mode).
+    the overview files are created by gdal (with the current *_OVERVIEW config options) without data,
+    then all the levels are written at once while the base raster is read in strips.
+    returns None (and creates nothing) if the raster or the resampling is not supported,
+    then gdal should build the overviews.
+    the output files should not exist.
+    """
+    verbose = logger is not None and logger is not ...
+    resampling = get_pyramid_resampling(resampling_alg)
+    if resampling is None or ovr_type not in [OvrType.create_external_single, OvrType.create_external_multi]:
+        return None
+    filename = Path(filename)
+    ds = gdal.Open(str(filename))
+    if ds is None or not is_pyramid_supported(ds):
+        return None
+    width, height = ds.RasterXSize, ds.RasterYSize
+    filenames = get_pyramid_filenames(filename, ovr_type, dst_ovr_count)
+    if any(os.path.exists(f) for f in filenames):
+        return None
+    if verbose:
+        logger.info('building {} overviews of "{}" ({}) in a single read'.format(dst_ovr_count, filename, resampling))
+
+    level_datasets = []
+    try:
+        # the overview files are made without computing their pixels
+        if ovr_type == OvrType.create_external_single:
+            overview_list = [2 ** (i + 1) for i in range(dst_ovr_count)]
+            if ds.BuildOverviews('NONE', overview_list) != 0:
+                raise Exception('failed to create the overview file of {}'.format(filename))
+            ovr_ds = gdal.Open(str(filenames[0]), gdal.GA_Update)
+            level_datasets.append(ovr_ds)
+            bands = [ovr_ds.GetRasterBand(i + 1) for i in range(ovr_ds.RasterCount)]
+            levels_bands = [bands] + [[band.GetOverview(i) for band in bands]
+                                      for i in range(bands[0].GetOverviewCount())]
+        else:
+            src_filename = filename
+            for f in filenames:
+                src_ds = gdal.Open(str(src_filename))
+                if src_ds is None or src_ds.BuildOverviews('NONE', [2]) != 0:
+                    raise Exception('failed to create the overview file of {}'.format(src_filename))
+                src_ds = None
+                src_filename = f
+            levels_bands = []
+            for f in filenames:
+                level_ds = gdal.Open(str(f), gdal.GA_Update)
+                level_datasets.append(level_ds)
+                levels_bands.append([level_ds.GetRasterBand(i + 1) for i in range(level_ds.RasterCount)])
+        if len(levels_bands) != dst_ovr_count:
+            raise Exception('expected {} overviews, got {}'.format(dst_ovr_count, len(levels_bands)))
+
+        band = ds.GetRasterBand(1)
+        nodata = [ds.GetRasterBand(i + 1).GetNoDataValue() for i in range(ds.RasterCount)]
+        dtype = gdal_array_type(band.DataType)
+        reducer = PyramidReducer(resampling, nodata, dtype)
+        builder = PyramidBuilder(levels_bands, (width, height), reducer)
+        builder.build(ds, get_strip_rows(ds, strip_memory), callback)
+        levels_bands = builder = None
+        for level_ds in level_datasets:
+            level_ds.FlushCache()
+        level_datasets = None
+    except Exception as e:
+        if verbose:
+            logger.warning('failed to build the overviews in a single read: {}'.format(e))
+        levels_bands = builder = level_datasets = None
+        ds = None
+        for f in filenames:
+            gdalos_util.invalidate_dataset(f)
+            if os.path.exists(f):
+                os.remove(f)
+        return None
+    ds = None
+    if ovr_files is not None:
+        ovr_files.extend(filenames)
+    return True
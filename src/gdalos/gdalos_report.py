@@ -0,0 +1,159 @@
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from osgeo import gdal
+
+from osgeo_utils.auxiliary.util import PathLikeOrStr
+
+try:
+    import resource
+except ImportError:
+    resource = None  # i.e. on windows
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+ReportCallback = Callable[[dict], None]
+
+
+def get_io_counters() -> Optional[Dict[str, int]]:
+    """ returns the bytes that this process has read from and written to the storage, None if unknown """
+    if psutil is not None:
+        counters = psutil.Process().io_counters()
+        return dict(read=counters.read_bytes, write=counters.write_bytes)
+    try:
+        with open('/proc/self/io') as f:
+            values = dict(line.split(':', 1) for line in f if ':' in line)
+        return dict(read=int(values['read_bytes']), write=int(values['write_bytes']))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def get_peak_rss() -> Optional[int]:
+    """ returns the peak resident memory of this process in bytes, None if unknown """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if psutil is not None:
+        memory_info = psutil.Process().memory_info()
+        return getattr(memory_info, 'peak_wset', memory_info.rss)
+    return None
+
+
+class ReportPhase(object):
+    __slots__ = ['name', 'wall', 'cpu', 'read', 'write', 'cache_used', 'start']
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = 0.0  # seconds
+        self.cpu = 0.0  # seconds, of all the threads of the process
+        self.read = None  # bytes read from storage, None if unknown
+        self.write = None  # bytes written to storage, None if unknown
+        self.cache_used = None  # gdal block cache usage at the end of the phase
+        self.start = None
+
+    def to_dict(self) -> dict:
+        return dict(name=self.name, wall=self.wall, cpu=self.cpu, read=self.read, write=self.write,
+                    cache_used=self.cache_used)
+
+
+class RunReport(object):
+    """
+    collects the wall and cpu time of the phases of a run (open, resolve, warp/translate, scale, overviews, cog, info),
+    the bytes that were read and written during each phase, the gdal block cache usage and the peak memory.
+    a phase that runs more than once (i.e. per file of a list) is accumulated.
+    the cpu time and i/o counters are of the whole process, thus include the work of concurrent runs (if any).
+    gdal doesn't expose block cache hit statistics, so the cache usage is reported instead.
+    """
+    __slots__ = ['phases', 'start_wall', 'start_cpu', 'files', 'callback']
+
+    def __init__(self, callback: Optional[ReportCallback] = None):
+        self.phases: Dict[str, ReportPhase] = dict()
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.files: Dict[str, int] = dict()  # output filename -> size
+        self.callback = callback  # called with the report dict of each phase that ends
+
+    def start(self, name: str) -> ReportPhase:
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = ReportPhase(name)
+        phase.start = (time.perf_counter(), time.process_time(), get_io_counters())
+        return phase
+
+    def stop(self, name: str) -> Optional[ReportPhase]:
+        phase = self.phases.get(name)
+        if phase is None or phase.start is None:
+            return None
+        wall, cpu, io = phase.start
+        phase.start = None
+        phase.wall += time.perf_counter() - wall
+        phase.cpu += time.process_time() - cpu
+        io_end = get_io_counters()
+        if io is not None and io_end is not None:
+            phase.read = (phase.read or 0) + io_end['read'] - io['read']
+            phase.write = (phase.write or 0) + io_end['write'] - io['write']
+        phase.cache_used = gdal.GetCacheUsed()
+        if self.callback is not None:
+            self.callback(phase.to_dict())
+        return phase
+
+    def add_files(self, filenames):
+        for f in filenames:
+            stat = gdal.VSIStatL(str(f))
+            if stat is not None:
+                self.files[str(f)] = stat.size
+
+    def to_dict(self) -> dict:
+        phases: List[dict] = [phase.to_dict() for phase in self.phases.values()]
+        return dict(
+            wall=time.perf_counter() - self.start_wall,
+            cpu=time.process_time() - self.start_cpu,
+            read=sum(p['read'] or 0 for p in phases),
+            write=sum(p['write'] or 0 for p in phases),
+            peak_rss=get_peak_rss(),
+            cache_max=gdal.GetCacheMax(),
+            cache_used=gdal.GetCacheUsed(),
+            files=self.files,
+            phases=phases,
+        )
+
+    def write(self, filename: PathLikeOrStr):
+        os.makedirs(os.path.dirname(str(filename)) or '.', exist_ok=True)
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    def print(self):
+        report = self.to_dict()
+        for phase in report['phases']:
+            print('{}: wall: {:.3f}s cpu: {:.3f}s read: {} write: {} cache used: {}'.format(
+                phase['name'], phase['wall'], phase['cpu'], phase['read'], phase['write'], phase['cache_used']))
+        print('total wall: {:.3f}s cpu: {:.3f}s read: {} write: {} peak rss: {}'.format(
+            report['wall'], report['cpu'], report['read'], report['write'], report['peak_rss']))
+
+
+class ReportPhaseScope(object):
+    # times the phase of a with block, a None report does nothing
+    __slots__ = ['report', 'name']
+
+    def __init__(self, report: Optional[RunReport], name: str):
+        self.report = report
+        self.name = name
+
+    def __enter__(self):
+        if self.report is not None:
+            self.report.start(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.report is not None:
+            self.report.stop(self.name)
+
+
+def report_phase(report: Optional[RunReport], name: str) -> ReportPhaseScope:
+    """ returns a context manager that times the phase, if a report is given """
+    return ReportPhaseScope(report, name)
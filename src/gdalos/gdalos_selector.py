@@ -41,25 +41,28 @@ class DataSetSelector:
     def get_item_geo(self, x, y):
         return None
 
-    def get_item_projected(self, x, y):
+    def select_item_projected(self, x, y) -> OpenDS:
+        """ returns the item of the given geographic point, without opening it """
         # todo: improve this naive selection that assuming the zone number is in the filename.
         if len(self.ds_list) == 1:
-            best = self.ds_list[0]
-        else:
-            if x < -180 or x > 180:
-                raise Exception(f'x: {x} outside range')
-            best = None
-            best_dist = math.inf
-            best_center = None
-            for i, item in enumerate(self.ds_list):
-                center = self.centers[i]
-                dist = abs(x - center)
-                if dist < best_dist:
-                    best = item
-                    best_dist = dist
-                    best_center = center
-            if best is None:
-                raise Exception(f'could not find appropriate input file for x: {x}')
+            return self.ds_list[0]
+        if x < -180 or x > 180:
+            raise Exception(f'x: {x} outside range')
+        best = None
+        best_dist = math.inf
+        for i, item in enumerate(self.ds_list):
+            dist = abs(x - self.centers[i])
+            if dist < best_dist:
+                best = item
+                best_dist = dist
+        if best is None:
+            raise Exception(f'could not find appropriate input file for x: {x}')
+        return best
+
+    def get_item_projected(self, x, y):
+        best = self.select_item_projected(x, y)
+        if len(self.ds_list) > 1:
+            best_center = self.centers[self.ds_list.index(best)]
             print(
                 f'x: {x} selected center: {best_center} best_zone: {projdef.get_utm_zone_by_lon(x, True)} filename: {best.filename}')
         return best.filename, best.__enter__()
@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Dict, Optional
+
+from osgeo import gdal
+
+from osgeo_utils.auxiliary.util import PathLikeOrStr
+from gdalos.gdalos_pool import invalidate_dataset
+
+default_ram_budget = 256 * 1024 ** 2
+unknown_size_estimate = 64 * 1024 ** 2  # reserved from the ram budget for temp files of unknown size
+
+
+def is_vsimem(filename: PathLikeOrStr) -> bool:
+    return str(filename).startswith('/vsimem/')
+
+
+def get_file_size(filename: PathLikeOrStr) -> int:
+    # works for /vsimem/ files as well as for regular files
+    stat = gdal.VSIStatL(str(filename))
+    return stat.size if stat is not None else 0
+
+
+def delete_file(filename: PathLikeOrStr) -> bool:
+    filename = str(filename)
+    invalidate_dataset(filename)
+    if is_vsimem(filename):
+        return gdal.Unlink(filename) == 0
+    if os.path.isfile(filename):
+        os.remove(filename)
+        return True
+    return False
+
+
+class TempWorkspace(object):
+    """
+    a workspace for intermediate files: a new temp file is placed in /vsimem/ if its expected size fits
+    the remaining ram budget, otherwise it is spilled to the scratch dir.
+    every temp file is tracked, and all the remaining files are deleted on cleanup (or when leaving a with block),
+    also when the calculation has failed.
+    the peak usage (in ram and on disk) is measured whenever files are added or removed.
+    """
+    __slots__ = ['ram_budget', 'scratch_dir', 'files', 'dirs', 'reserved', 'peak_ram', 'peak_disk', 'count']
+
+    def __init__(self, ram_budget: Optional[int] = None, scratch_dir: Optional[PathLikeOrStr] = None):
+        self.ram_budget = default_ram_budget if ram_budget is None else ram_budget  # in bytes, 0 for disk only
+        self.scratch_dir = str(scratch_dir) if scratch_dir is not None else None
+        self.files: Dict[str, int] = dict()  # filename -> reserved ram
+        self.dirs = []  # scratch dirs that were made for the temp files
+        self.reserved = 0
+        self.peak_ram = 0
+        self.peak_disk = 0
+        self.count = 0  # number of temp files that were made in this workspace
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.cleanup()
+
+    def __contains__(self, filename: PathLikeOrStr) -> bool:
+        return str(filename) in self.files
+
+    def path(self, suffix: str = '.tif', est_size: Optional[int] = None, in_memory: Optional[bool] = None,
+             name: Optional[str] = None) -> str:
+        """
+        returns a new temp filename, in memory or on disk, and tracks it.
+        in_memory=True/False forces the location (i.e. files which are written by non gdal libraries need a disk)
+        """
+        if est_size is None:
+            est_size = unknown_size_estimate
+        if in_memory is None:
+            in_memory = self.reserved + est_size <= self.ram_budget
+        if name is None:
+            name = 'gdalos_{}{}'.format(uuid.uuid4(), suffix)
+        else:
+            name = '{}{}'.format(name, suffix)
+        if in_memory:
+            dir_name = '/vsimem/gdalos_temp_{}'.format(uuid.uuid4())
+            self.dirs.append(dir_name)
+            filename = '{}/{}'.format(dir_name, name)
+        else:
+            scratch_dir = self.scratch_dir or tempfile.gettempdir()
+            dir_name = os.path.join(scratch_dir, 'gdalos_temp_{}'.format(uuid.uuid4()))
+            os.makedirs(dir_name, exist_ok=True)
+            self.dirs.append(dir_name)
+            filename = os.path.join(dir_name, name)
+        self.add(filename, est_size if in_memory else 0)
+        self.count += 1
+        return filename
+
+    def add(self, filename: PathLikeOrStr, reserve: int = 0):
+        """ tracks an existing temp file (i.e. made by a function that chose its own temp name) """
+        self.measure()
+        filename = str(filename)
+        if filename not in self.files:
+            self.files[filename] = reserve
+            self.reserved += reserve
+
+    def remove(self, filename: PathLikeOrStr) -> bool:
+        """ deletes a temp file and stops tracking it """
+        self.measure()
+        filename = str(filename)
+        self.reserved -= self.files.pop(filename, 0)
+        try:
+            deleted = delete_file(filename)
+        except OSError:
+            # i.e. on windows a file that is still open can't be deleted
+            self.files[filename] = 0
+            return False
+        return deleted
+
+    def measure(self):
+        """ updates the peak usage by the current sizes of the tracked files """
+        ram = disk = 0
+        for f in self.files:
+            size = get_file_size(f)
+            if is_vsimem(f):
+                ram += size
+            else:
+                disk += size
+        self.peak_ram = max(self.peak_ram, ram)
+        self.peak_disk = max(self.peak_disk, disk)
+
+    def cleanup(self):
+        for f in list(self.files):
+            self.remove(f)
+        # the dirs may hold files that were derived from the temp files (i.e. .ovr, .aux.xml)
+        for dir_name in self.dirs:
+            if is_vsimem(dir_name):
+                gdal.RmdirRecursive(dir_name)
+            else:
+                shutil.rmtree(dir_name, ignore_errors=True)
+        self.dirs.clear()
+
+    def report(self) -> dict:
+        return dict(count=self.count, files=len(self.files), peak_ram=self.peak_ram, peak_disk=self.peak_disk)
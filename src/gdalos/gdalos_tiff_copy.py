@@ -0,0 +1,428 @@
+import math
+import os
+import struct
+from typing import List, Optional, Sequence, Tuple
+
+from osgeo import gdal
+
+from osgeo_utils.auxiliary.util import PathLikeOrStr
+
+# the compressions of which each tile is self contained (i.e. JPEG tiles share the JPEGTables tag, LERC has its own tag)
+tile_copy_compressions = {
+    1: 'NONE',
+    5: 'LZW',
+    8: 'DEFLATE',
+    32946: 'DEFLATE',
+    32773: 'PACKBITS',
+    34925: 'LZMA',
+    50000: 'ZSTD',
+    50001: 'WEBP',
+}
+
+tile_copy_photometrics = {0: 'MINISWHITE', 1: 'MINISBLACK', 2: 'RGB', 3: None, 5: 'CMYK', 8: 'CIELAB'}
+
+tiff_tag_new_subfile_type = 254
+tiff_tag_image_width = 256
+tiff_tag_image_length = 257
+tiff_tag_bits_per_sample = 258
+tiff_tag_compression = 259
+tiff_tag_photometric = 262
+tiff_tag_samples_per_pixel = 277
+tiff_tag_planar_config = 284
+tiff_tag_predictor = 317
+tiff_tag_tile_width = 322
+tiff_tag_tile_length = 323
+tiff_tag_tile_offsets = 324
+tiff_tag_tile_byte_counts = 325
+tiff_tag_extra_samples = 338
+
+# tiff type -> (struct format, size)
+tiff_types = {1: ('B', 1), 3: ('H', 2), 4: ('I', 4), 16: ('Q', 8), 7: ('B', 1), 6: ('b', 1), 8: ('h', 2), 9: ('i', 4)}
+
+classic_tiff_max_size = 0xFFFFFFFF
+# tiles that are not farther apart than this are read by a single read
+max_read_gap = 1024
+max_read_size = 16 * 1024 ** 2
+
+
+class TiffTag(object):
+    __slots__ = ['code', 'type', 'count', 'entry_offset', 'value_offset', 'values']
+
+    def __init__(self, code: int, type: int, count: int, entry_offset: int, value_offset: int,
+                 values: Optional[list]):
+        self.code = code
+        self.type = type
+        self.count = count
+        self.entry_offset = entry_offset  # the file offset of the ifd entry
+        self.value_offset = value_offset  # the file offset of the values (which may be inside the ifd entry)
+        self.values = values
+
+
+class TiffIfd(object):
+    """ the (tiling related) tags of a tiff image file directory """
+    __slots__ = ['tags']
+
+    def __init__(self, tags: dict):
+        self.tags = tags
+
+    def get(self, code: int, default=None):
+        tag = self.tags.get(code)
+        return default if tag is None or not tag.values else tag.values[0]
+
+    def get_values(self, code: int) -> Optional[list]:
+        tag = self.tags.get(code)
+        return None if tag is None else tag.values
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.get(tiff_tag_image_width), self.get(tiff_tag_image_length)
+
+    @property
+    def tile_size(self) -> Tuple[Optional[int], Optional[int]]:
+        return self.get(tiff_tag_tile_width), self.get(tiff_tag_tile_length)
+
+    @property
+    def is_mask(self) -> bool:
+        return bool(self.get(tiff_tag_new_subfile_type, 0) & 4)
+
+    @property
+    def is_tiled(self) -> bool:
+        return tiff_tag_tile_offsets in self.tags and tiff_tag_tile_byte_counts in self.tags
+
+    def get_tiles_across_down(self) -> Tuple[int, int]:
+        (w, h), (tw, th) = self.size, self.tile_size
+        return math.ceil(w / tw), math.ceil(h / th)
+
+
+class TiffFile(object):
+    """ a minimal (classic and big) tiff reader, that reads the tags that are needed for copying tiles """
+    __slots__ = ['filename', 'endian', 'big_tiff', 'ifds']
+
+    def __init__(self, filename: PathLikeOrStr):
+        self.filename = str(filename)
+        self.ifds: List[TiffIfd] = []
+        with open(self.filename, 'rb') as f:
+            header = f.read(16)
+            if len(header) < 8 or header[:2] not in (b'II', b'MM'):
+                raise Exception('not a tiff file: {}'.format(filename))
+            self.endian = '<' if header[:2] == b'II' else '>'
+            version = struct.unpack(self.endian + 'H', header[2:4])[0]
+            if version == 42:
+                self.big_tiff = False
+                ifd_offset = struct.unpack(self.endian + 'I', header[4:8])[0]
+            elif version == 43:
+                self.big_tiff = True
+                ifd_offset = struct.unpack(self.endian + 'Q', header[8:16])[0]
+            else:
+                raise Exception('not a tiff file: {}'.format(filename))
+            visited = set()
+            while ifd_offset and ifd_offset not in visited:
+                visited.add(ifd_offset)
+                ifd, ifd_offset = self.read_ifd(f, ifd_offset)
+                self.ifds.append(ifd)
+
+    def read_ifd(self, f, offset: int) -> Tuple[TiffIfd, int]:
+        e = self.endian
+        if self.big_tiff:
+            count_format, entry_format, entry_size, inline_size, next_format = 'Q', 'HHQ', 20, 8, 'Q'
+        else:
+            count_format, entry_format, entry_size, inline_size, next_format = 'H', 'HHI', 12, 4, 'I'
+        f.seek(offset)
+        count_size = struct.calcsize(count_format)
+        entry_count = struct.unpack(e + count_format, f.read(count_size))[0]
+        entries = f.read(entry_count * entry_size)
+        next_offset = struct.unpack(e + next_format, f.read(struct.calcsize(next_format)))[0]
+        tags = dict()
+        for i in range(entry_count):
+            entry = entries[i * entry_size:(i + 1) * entry_size]
+            code, typ, count = struct.unpack(e + entry_format, entry[:entry_size - inline_size])
+            if typ not in tiff_types:
+                continue  # i.e. ascii and rational tags are not needed
+            value_format, value_size = tiff_types[typ]
+            entry_offset = offset + count_size + i * entry_size
+            if count * value_size <= inline_size:
+                value_offset = entry_offset + entry_size - inline_size
+                data = entry[entry_size - inline_size:entry_size - inline_size + count * value_size]
+            else:
+                value_offset = struct.unpack(e + next_format, entry[entry_size - inline_size:])[0]
+                pos = f.tell()
+                f.seek(value_offset)
+                data = f.read(count * value_size)
+                f.seek(pos)
+            values = list(struct.unpack('{}{}{}'.format(e, count, value_format), data))
+            tags[code] = TiffTag(code, typ, count, entry_offset, value_offset, values)
+        return TiffIfd(tags), next_offset
+
+    def find_ifd(self, size: Tuple[int, int]) -> Optional[TiffIfd]:
+        """ returns the (non mask) image of the given size """
+        for ifd in self.ifds:
+            if not ifd.is_mask and ifd.size == tuple(size):
+                return ifd
+        return None
+
+
+def find_tiff_image(ds: gdal.Dataset) -> Optional[Tuple[str, TiffIfd]]:
+    """ returns the tiff file and the image (the base raster or an overview) that hold the pixels of the given ds """
+    if ds.GetDriver() is None or ds.GetDriver().ShortName != 'GTiff':
+        return None
+    filenames = ds.GetFileList() or [ds.GetDescription()]
+    size = (ds.RasterXSize, ds.RasterYSize)
+    for filename in filenames:
+        if not os.path.isfile(filename):
+            continue
+        try:
+            ifd = TiffFile(filename).find_ifd(size)
+        except Exception:
+            continue
+        if ifd is not None:
+            return filename, ifd
+    return None
+
+
+def get_tile_copy_window(ds: gdal.Dataset, proj_win: Optional[Sequence[float]] = None,
+                         src_win: Optional[Sequence[int]] = None, eps: float = 1e-6) -> Optional[Tuple[int, int, int, int]]:
+    """
+    returns the pixel window (xoff, yoff, xsize, ysize) of the given projwin (ulx, uly, lrx, lry) or srcwin,
+    or None if the window is not pixel aligned or is not inside the raster
+    """
+    if src_win is not None:
+        window = [int(v) for v in src_win]
+    elif proj_win is not None:
+        gt = ds.GetGeoTransform()
+        if gt[2] or gt[4]:
+            return None
+        ulx, uly, lrx, lry = proj_win
+        pixels = ((ulx - gt[0]) / gt[1], (uly - gt[3]) / gt[5], (lrx - ulx) / gt[1], (lry - uly) / gt[5])
+        window = [round(v) for v in pixels]
+        if any(abs(v - w) > eps * max(1, abs(v)) for v, w in zip(pixels, window)):
+            return None
+    else:
+        window = [0, 0, ds.RasterXSize, ds.RasterYSize]
+    xoff, yoff, xsize, ysize = window
+    if xoff < 0 or yoff < 0 or xsize <= 0 or ysize <= 0 or \
+            xoff + xsize > ds.RasterXSize or yoff + ysize > ds.RasterYSize:
+        return None
+    return xoff, yoff, xsize, ysize
+
+
+def get_tile_copy_creation_options(ifd: TiffIfd, ds: gdal.Dataset) -> Optional[List[str]]:
+    """ returns the creation options that make tiles which are encoded as the tiles of the given image, or None """
+    comp = tile_copy_compressions.get(ifd.get(tiff_tag_compression, 1))
+    photometric = ifd.get(tiff_tag_photometric, 1)
+    if comp is None or photometric not in tile_copy_photometrics:
+        return None
+    if ifd.get(tiff_tag_samples_per_pixel, 1) != ds.RasterCount:
+        return None
+    bits = ifd.get_values(tiff_tag_bits_per_sample) or [1]
+    if any(b != gdal.GetDataTypeSize(ds.GetRasterBand(i + 1).DataType) for i, b in enumerate(bits)):
+        return None  # i.e. NBITS
+    tw, th = ifd.tile_size
+    options = [
+        'TILED=YES', 'BLOCKXSIZE={}'.format(tw), 'BLOCKYSIZE={}'.format(th),
+        'COMPRESS={}'.format(comp), 'PREDICTOR={}'.format(ifd.get(tiff_tag_predictor, 1)),
+        'INTERLEAVE={}'.format('BAND' if ifd.get(tiff_tag_planar_config, 1) == 2 else 'PIXEL'),
+        'SPARSE_OK=TRUE',
+    ]
+    if tile_copy_photometrics[photometric]:
+        options.append('PHOTOMETRIC={}'.format(tile_copy_photometrics[photometric]))
+    extra_samples = ifd.get_values(tiff_tag_extra_samples) or []
+    if extra_samples and extra_samples[-1] in (1, 2):
+        options.append('ALPHA={}'.format('PREMULTIPLIED' if extra_samples[-1] == 1 else 'UNASSOCIATED'))
+    return options
+
+
+def copy_raster_properties(src_ds: gdal.Dataset, out_ds: gdal.Dataset, xoff: int, yoff: int):
+    gt = list(src_ds.GetGeoTransform())
+    gt[0] += xoff * gt[1] + yoff * gt[2]
+    gt[3] += xoff * gt[4] + yoff * gt[5]
+    out_ds.SetGeoTransform(gt)
+    out_ds.SetProjection(src_ds.GetProjection())
+    out_ds.SetMetadata(src_ds.GetMetadata())
+    for i in range(src_ds.RasterCount):
+        src_band = src_ds.GetRasterBand(i + 1)
+        out_band = out_ds.GetRasterBand(i + 1)
+        nodata = src_band.GetNoDataValue()
+        if nodata is not None:
+            out_band.SetNoDataValue(nodata)
+        color_table = src_band.GetColorTable()
+        if color_table is not None:
+            out_band.SetColorTable(color_table)
+        out_band.SetColorInterpretation(src_band.GetColorInterpretation())
+        out_band.SetDescription(src_band.GetDescription())
+        # the statistics of the source are not of the window
+        out_band.SetMetadata({k: v for k, v in src_band.GetMetadata().items() if not k.startswith('STATISTICS_')})
+        scale, offset = src_band.GetScale(), src_band.GetOffset()
+        if scale not in (None, 1) or offset not in (None, 0):
+            out_band.SetScale(scale if scale is not None else 1)
+            out_band.SetOffset(offset if offset is not None else 0)
+
+
+def get_tile_indexes(ifd: TiffIfd, window: Tuple[int, int, int, int]) -> List[int]:
+    """ returns the indexes of the source tiles of the window, in the tile order of the output """
+    xoff, yoff, xsize, ysize = window
+    tw, th = ifd.tile_size
+    across, down = ifd.get_tiles_across_down()
+    tx0, ty0 = xoff // tw, yoff // th
+    out_across, out_down = math.ceil(xsize / tw), math.ceil(ysize / th)
+    planes = ifd.get(tiff_tag_samples_per_pixel, 1) if ifd.get(tiff_tag_planar_config, 1) == 2 else 1
+    return [plane * across * down + (ty0 + ty) * across + tx0 + tx
+            for plane in range(planes) for ty in range(out_down) for tx in range(out_across)]
+
+
+def copy_tiles(src_filename: str, offsets: Sequence[int], counts: Sequence[int], out_file) -> List[int]:
+    """ appends the given tiles to the (open) output file, reading nearby tiles at once. returns the new offsets """
+    new_offsets = []
+    with open(src_filename, 'rb') as src:
+        i = 0
+        n = len(offsets)
+        while i < n:
+            if not offsets[i] or not counts[i]:
+                new_offsets.append(0)  # a sparse tile
+                i += 1
+                continue
+            start = offsets[i]
+            end = start + counts[i]
+            j = i + 1
+            while j < n and counts[j] and end <= offsets[j] <= end + max_read_gap and \
+                    offsets[j] + counts[j] - start <= max_read_size:
+                end = offsets[j] + counts[j]
+                j += 1
+            src.seek(start)
+            data = src.read(end - start)
+            for k in range(i, j):
+                new_offsets.append(out_file.tell())
+                out_file.write(data[offsets[k] - start:offsets[k] - start + counts[k]])
+            i = j
+    return new_offsets
+
+
+def write_tag_values(f, tiff: TiffFile, tag: TiffTag, values: Sequence[int]) -> bool:
+    """
+    overwrites the values of an integer array tag (of the same count).
+    if the values don't fit the type of the tag (i.e. the tile arrays of an empty file might be written as SHORT),
+    the array is written at the end of the file with a wider type, and the ifd entry is updated
+    """
+    if len(values) != tag.count:
+        return False
+    value_format, value_size = tiff_types[tag.type]
+    value_offset = tag.value_offset
+    if values and max(values) >= 2 ** (8 * value_size):
+        typ = 16 if tiff.big_tiff else 4
+        value_format, value_size = tiff_types[typ]
+        if max(values) >= 2 ** (8 * value_size):
+            return False
+        f.seek(0, os.SEEK_END)
+        if f.tell() % 2:
+            f.write(b'\0')  # tiff offsets should be word aligned
+        value_offset = f.tell()
+        inline_size = 8 if tiff.big_tiff else 4
+        if len(values) * value_size <= inline_size:
+            value_offset = tag.entry_offset + 4 + inline_size
+        f.seek(tag.entry_offset + 2)
+        f.write(struct.pack(tiff.endian + 'H', typ))
+        if value_offset != tag.entry_offset + 4 + inline_size:
+            f.seek(tag.entry_offset + 4 + inline_size)
+            f.write(struct.pack(tiff.endian + ('Q' if tiff.big_tiff else 'I'), value_offset))
+    f.seek(value_offset)
+    f.write(struct.pack('{}{}{}'.format(tiff.endian, len(values), value_format), *values))
+    return True
+
+
+def get_tile_copy_image(ds: gdal.Dataset) -> Optional[Tuple[str, TiffIfd, List[str]]]:
+    """
+    returns the tiff file and the image that hold the pixels of the given ds and the creation options of a copy,
+    or None if its tiles can't be copied
+    """
+    if ds.GetRasterBand(1).GetMaskFlags() & gdal.GMF_PER_DATASET:
+        return None  # the mask is stored as a separate image
+    found = find_tiff_image(ds)
+    if found is None:
+        return None
+    src_filename, ifd = found
+    if not ifd.is_tiled:
+        return None
+    creation_options = get_tile_copy_creation_options(ifd, ds)
+    if creation_options is None:
+        return None
+    return src_filename, ifd, creation_options
+
+
+def get_tile_copy_source(ds: gdal.Dataset, proj_win: Optional[Sequence[float]] = None,
+                         src_win: Optional[Sequence[int]] = None) \
+        -> Optional[Tuple[str, TiffIfd, List[str], Tuple[int, int, int, int], List[int], List[int]]]:
+    """
+    returns the source image of a tile copy of the given window, its creation options, the pixel window,
+    and the offsets and the byte counts of the tiles to copy, or None if the window can't be cropped by a tile copy
+    """
+    window = get_tile_copy_window(ds, proj_win, src_win)
+    if window is None:
+        return None
+    image = get_tile_copy_image(ds)
+    if image is None:
+        return None
+    src_filename, ifd, creation_options = image
+    tw, th = ifd.tile_size
+    if window[0] % tw or window[1] % th:
+        return None
+
+    src_offsets = ifd.get_values(tiff_tag_tile_offsets)
+    src_counts = ifd.get_values(tiff_tag_tile_byte_counts)
+    indexes = get_tile_indexes(ifd, window)
+    if max(indexes) >= min(len(src_offsets), len(src_counts)):
+        return None
+    offsets = [src_offsets[i] for i in indexes]
+    counts = [src_counts[i] for i in indexes]
+    return src_filename, ifd, creation_options, window, offsets, counts
+
+
+def tiff_copy_tiles(ds: gdal.Dataset, out_filename: PathLikeOrStr,
+                    proj_win: Optional[Sequence[float]] = None, src_win: Optional[Sequence[int]] = None,
+                    big_tiff: Optional[str] = None, logger=None) -> bool:
+    """
+    crops a tiled tiff (or one of its overviews) by copying the compressed tiles of the window as they are,
+    without decoding and encoding them. the window must start on the tile grid of the source.
+    the tiles at the right and bottom edges of the output may hold some pixels beyond the window, these are not exposed.
+    returns False (and creates nothing) if the source or the window are not suitable, then a normal crop is needed.
+    """
+    source = get_tile_copy_source(ds, proj_win, src_win)
+    if source is None:
+        return False
+    src_filename, ifd, creation_options, window, offsets, counts = source
+    tw, th = ifd.tile_size
+    xoff, yoff, xsize, ysize = window
+    # the tile data, the tile arrays and the tags of the output
+    est_size = sum(counts) + len(offsets) * 16 + 1024 ** 2
+    if big_tiff is None or str(big_tiff).upper() == 'IF_SAFER':
+        big_tiff = 'YES' if est_size > classic_tiff_max_size else 'NO'
+    creation_options.append('BIGTIFF={}'.format(big_tiff))
+
+    out_filename = str(out_filename)
+    if logger is not None:
+        logger.info('copying {} tiles of "{}" to "{}"'.format(len(offsets), src_filename, out_filename))
+    band_type = ds.GetRasterBand(1).DataType
+    out_ds = gdal.GetDriverByName('GTiff').Create(
+        out_filename, xsize, ysize, ds.RasterCount, band_type, options=creation_options)
+    if out_ds is None:
+        return False
+    copy_raster_properties(ds, out_ds, xoff, yoff)
+    out_ds = None  # the tiles are not written, so all the tiles of the new file are sparse
+
+    ok = False
+    try:
+        out_tiff = TiffFile(out_filename)
+        out_ifd = out_tiff.ifds[0]
+        offsets_tag = out_ifd.tags.get(tiff_tag_tile_offsets)
+        counts_tag = out_ifd.tags.get(tiff_tag_tile_byte_counts)
+        if out_ifd.tile_size == (tw, th) and offsets_tag is not None and counts_tag is not None:
+            with open(out_filename, 'r+b') as f:
+                f.seek(0, os.SEEK_END)
+                new_offsets = copy_tiles(src_filename, offsets, counts, f)
+                counts = [c if o else 0 for o, c in zip(new_offsets, counts)]
+                ok = write_tag_values(f, out_tiff, offsets_tag, new_offsets) and \
+                    write_tag_values(f, out_tiff, counts_tag, counts)
+    except Exception as e:
+        if logger is not None:
+            logger.warning('failed to copy the tiles of "{}": {}'.format(src_filename, e))
+    if not ok:
+        gdal.GetDriverByName('GTiff').Delete(out_filename)
+    return ok
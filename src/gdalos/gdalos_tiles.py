@@ -0,0 +1,382 @@
+import math
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from osgeo import gdal
+
+from osgeo_utils.auxiliary.util import PathLikeOrStr
+from gdalos import gdalos_util, gdalos_extent, projdef
+from gdalos.gdalos_base import enum_to_str
+from gdalos.gdalos_plan import execute_bounded, get_workers_count
+from gdalos.gdalos_types import RasterKind, TileFormat
+from gdalos.rectangle import GeoRectangle
+
+default_tile_size = 256
+default_metatile = 8  # each job warps a square of metatile x metatile tiles at once, then cuts it into tiles
+web_mercator_bound = 20037508.342789244
+
+TileRange = Tuple[int, int, int, int]  # (x_start, y_start, x_end, y_end) of the tiles of a zoom, the ends are exclusive
+
+# image format -> (gdal driver, file extension, default creation options)
+tile_image_formats = {
+    'png': ('PNG', 'png', []),
+    'jpeg': ('JPEG', 'jpg', ['QUALITY=75']),
+    'webp': ('WEBP', 'webp', ['QUALITY=75']),
+}
+
+mbtiles_schema = [
+    'CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row)',
+]
+
+gpkg_schema = [
+    'PRAGMA application_id = 1196444487',  # 'GPKG'
+    'PRAGMA user_version = 10200',
+    'CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, '
+    'organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, '
+    'description TEXT)',
+    'CREATE TABLE IF NOT EXISTS gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, '
+    'identifier TEXT UNIQUE, description TEXT DEFAULT \'\', '
+    'last_change DATETIME NOT NULL DEFAULT (strftime(\'%Y-%m-%dT%H:%M:%fZ\',\'now\')), '
+    'min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER)',
+    'CREATE TABLE IF NOT EXISTS gpkg_tile_matrix_set (table_name TEXT NOT NULL PRIMARY KEY, '
+    'srs_id INTEGER NOT NULL, min_x DOUBLE NOT NULL, min_y DOUBLE NOT NULL, max_x DOUBLE NOT NULL, '
+    'max_y DOUBLE NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS gpkg_tile_matrix (table_name TEXT NOT NULL, zoom_level INTEGER NOT NULL, '
+    'matrix_width INTEGER NOT NULL, matrix_height INTEGER NOT NULL, tile_width INTEGER NOT NULL, '
+    'tile_height INTEGER NOT NULL, pixel_x_size DOUBLE NOT NULL, pixel_y_size DOUBLE NOT NULL, '
+    'CONSTRAINT pk_ttm PRIMARY KEY (table_name, zoom_level))',
+]
+
+gpkg_default_srs = [
+    ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', 'undefined cartesian coordinate reference system'),
+    ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', 'undefined geographic coordinate reference system'),
+]
+
+
+class TileGrid(object):
+    """
+    a tile matrix set: the tiles of zoom z are squares of tile_size pixels of res0 / 2**z,
+    from the top left corner of the bounds (the tile rows are counted from the top, as of xyz)
+    """
+    __slots__ = ['srs', 'bounds', 'res0', 'tile_size']
+
+    def __init__(self, srs, bounds: GeoRectangle, res0: float, tile_size: int = default_tile_size):
+        self.srs = srs
+        self.bounds = bounds
+        self.res0 = res0
+        self.tile_size = tile_size
+
+    def __repr__(self):
+        return '<{}: srs: {} bounds: {} res0: {} tile size: {}>'.format(
+            self.__class__.__name__, self.srs, self.bounds, self.res0, self.tile_size)
+
+    @classmethod
+    def web_mercator(cls, tile_size: int = default_tile_size) -> 'TileGrid':
+        b = web_mercator_bound
+        return cls(3857, GeoRectangle.from_min_max(-b, b, -b, b), 2 * b / tile_size, tile_size)
+
+    @classmethod
+    def from_extent(cls, srs, extent: GeoRectangle, tile_size: int = default_tile_size) -> 'TileGrid':
+        """ returns a grid in which the extent fits in the single tile of zoom 0 """
+        res0 = max(extent.w, extent.h) / tile_size
+        span = res0 * tile_size
+        return cls(srs, GeoRectangle.from_lrud(extent.left, extent.left + span, extent.up, extent.up - span),
+                   res0, tile_size)
+
+    def get_res(self, zoom: int) -> float:
+        return self.res0 / 2 ** zoom
+
+    def get_tile_span(self, zoom: int) -> float:
+        return self.get_res(zoom) * self.tile_size
+
+    def get_matrix_size(self, zoom: int) -> Tuple[int, int]:
+        span = self.get_tile_span(zoom)
+        return math.ceil(self.bounds.w / span - 1e-9), math.ceil(self.bounds.h / span - 1e-9)
+
+    def get_zoom(self, res: float) -> int:
+        """ returns the largest zoom of which the resolution is not finer than the given resolution """
+        return max(0, math.floor(math.log2(self.res0 / res) + 1e-9))
+
+    def get_tiles_extent(self, zoom: int, tile_range: TileRange) -> GeoRectangle:
+        x0, y0, x1, y1 = tile_range
+        span = self.get_tile_span(zoom)
+        left, up = self.bounds.left, self.bounds.up
+        return GeoRectangle.from_lrud(left + x0 * span, left + x1 * span, up - y0 * span, up - y1 * span)
+
+    def get_tile_range(self, zoom: int, extent: GeoRectangle) -> Optional[TileRange]:
+        """ returns the range of the tiles which intersect the extent """
+        span = self.get_tile_span(zoom)
+        cols, rows = self.get_matrix_size(zoom)
+        x0 = max(0, math.floor((extent.left - self.bounds.left) / span + 1e-9))
+        x1 = min(cols, math.ceil((extent.right - self.bounds.left) / span - 1e-9))
+        y0 = max(0, math.floor((self.bounds.up - extent.up) / span + 1e-9))
+        y1 = min(rows, math.ceil((self.bounds.up - extent.down) / span - 1e-9))
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+
+def split_tile_range(tile_range: TileRange, metatile: int) -> List[TileRange]:
+    x0, y0, x1, y1 = tile_range
+    return [(x, y, min(x + metatile, x1), min(y + metatile, y1))
+            for y in range(y0, y1, metatile) for x in range(x0, x1, metatile)]
+
+
+def encode_tile(arr: np.ndarray, image_format: str, creation_options: Sequence[str]) -> bytes:
+    """ returns the encoded image of the given (bands, rows, cols) byte array """
+    driver_name, ext, _ = tile_image_formats[image_format]
+    mem_ds = gdal.GetDriverByName('MEM').Create('', arr.shape[2], arr.shape[1], arr.shape[0], gdal.GDT_Byte)
+    for i, band_arr in enumerate(arr):
+        mem_ds.GetRasterBand(i + 1).WriteArray(band_arr)
+    path = '/vsimem/gdalos_tile_{}.{}'.format(uuid.uuid4().hex, ext)
+    gdal.GetDriverByName(driver_name).CreateCopy(path, mem_ds, options=list(creation_options))
+    mem_ds = None
+    f = gdal.VSIFOpenL(path, 'rb')
+    try:
+        gdal.VSIFSeekL(f, 0, 2)
+        size = gdal.VSIFTellL(f)
+        gdal.VSIFSeekL(f, 0, 0)
+        return gdal.VSIFReadL(1, size, f)
+    finally:
+        gdal.VSIFCloseL(f)
+        gdal.Unlink(path)
+
+
+def connect_tile_container(out_path: PathLikeOrStr) -> sqlite3.Connection:
+    # the workers write their tiles concurrently
+    return sqlite3.connect(str(out_path), timeout=600)
+
+
+def write_tiles(out_path: PathLikeOrStr, tile_format: TileFormat, grid: TileGrid, zoom: int,
+                tiles: Sequence[Tuple[int, int, bytes]], ext: str, table_name: str):
+    if tile_format == TileFormat.xyz:
+        for x, y, data in tiles:
+            dirname = os.path.join(str(out_path), str(zoom), str(x))
+            os.makedirs(dirname, exist_ok=True)
+            with open(os.path.join(dirname, '{}.{}'.format(y, ext)), 'wb') as f:
+                f.write(data)
+        return
+    if tile_format == TileFormat.mbtiles:
+        rows = grid.get_matrix_size(zoom)[1]
+        sql = 'INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)'
+        values = [(zoom, x, rows - 1 - y, data) for x, y, data in tiles]  # tms rows are counted from the bottom
+    else:
+        sql = 'INSERT OR REPLACE INTO "{}" (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)'.format(
+            table_name)
+        values = [(zoom, x, y, data) for x, y, data in tiles]
+    con = connect_tile_container(out_path)
+    try:
+        with con:
+            con.executemany(sql, values)
+    finally:
+        con.close()
+
+
+def render_metatile(filename: PathLikeOrStr, ovr_idx: int, grid: TileGrid, zoom: int, tile_range: TileRange,
+                    out_path: PathLikeOrStr, tile_format: TileFormat, image_format: str,
+                    creation_options: Sequence[str], resampling: Optional[str], table_name: str) -> int:
+    """ warps the tiles of the range at once, writes the tiles which aren't empty, returns how many were written """
+    ds = gdalos_util.open_ds(filename, ovr_idx=ovr_idx)
+    if ds.GetRasterBand(1).GetColorTable() is not None:
+        ds = gdal.Translate('', ds, format='VRT', rgbExpand='rgba' if ds.RasterCount == 1 else 'rgb')
+    x0, y0, x1, y1 = tile_range
+    ts = grid.tile_size
+    warp_options = dict(
+        format='MEM', outputBounds=grid.get_tiles_extent(zoom, tile_range).ldru,
+        width=(x1 - x0) * ts, height=(y1 - y0) * ts, dstSRS=projdef.get_srs_pj(grid.srs), dstAlpha=True)
+    if resampling is not None:
+        warp_options['resampleAlg'] = resampling
+    if ovr_idx:
+        warp_options['overviewLevel'] = 'None'  # the overview was opened explicitly
+    mem_ds = gdal.Warp('', ds, **warp_options)
+    if mem_ds is None:
+        raise Exception('failed to warp the tiles {} of zoom {}'.format(tile_range, zoom))
+    arr = mem_ds.ReadAsArray()
+    mem_ds = None
+    alpha = arr[-1]  # the sources' alpha or nodata are in the added alpha band
+    if not alpha.any():
+        return 0
+    if image_format == 'jpeg':
+        arr = arr[:-1]
+    ext = tile_image_formats[image_format][1]
+    tiles = []
+    for y in range(y0, y1):
+        for x in range(x0, x1):
+            window = np.s_[(y - y0) * ts:(y - y0 + 1) * ts, (x - x0) * ts:(x - x0 + 1) * ts]
+            if alpha[window].any():
+                tiles.append((x, y, encode_tile(arr[(slice(None),) + window], image_format, creation_options)))
+    write_tiles(out_path, tile_format, grid, zoom, tiles, ext, table_name)
+    return len(tiles)
+
+
+def get_gpkg_srs(srs) -> tuple:
+    """ returns a gpkg_spatial_ref_sys row of the srs """
+    osr_srs = projdef.get_srs(srs)
+    org = osr_srs.GetAuthorityName(None)
+    code = osr_srs.GetAuthorityCode(None)
+    if org and code:
+        srs_id = int(code)
+    else:
+        org, code, srs_id = 'NONE', 100000, 100000
+    return osr_srs.GetName() or 'unnamed', srs_id, org, int(code), osr_srs.ExportToWkt(), ''
+
+
+def create_tile_container(out_path: PathLikeOrStr, tile_format: TileFormat, grid: TileGrid,
+                          zooms: Sequence[int], extent: GeoRectangle, image_format: str, table_name: str):
+    """ creates the directory or the sqlite container, with the metadata of the tiles which are about to be made """
+    if tile_format == TileFormat.xyz:
+        os.makedirs(str(out_path), exist_ok=True)
+        return
+    con = connect_tile_container(out_path)
+    try:
+        # the workers write concurrently, in wal mode the writers don't block the readers
+        con.execute('PRAGMA journal_mode=WAL')
+        with con:
+            if tile_format == TileFormat.mbtiles:
+                for sql in mbtiles_schema:
+                    con.execute(sql)
+                extent_4326 = gdalos_extent.transform_extent(
+                    extent, projdef.get_transform(projdef.get_srs_pj(grid.srs), projdef.get_srs_pj(4326)))
+                metadata = dict(
+                    name=table_name, type='baselayer', version='1.1', description='',
+                    format=tile_image_formats[image_format][1], minzoom=min(zooms), maxzoom=max(zooms),
+                    bounds=','.join(str(v) for v in extent_4326.ldru))
+                con.execute('DELETE FROM metadata')
+                con.executemany('INSERT INTO metadata (name, value) VALUES (?, ?)',
+                                [(k, str(v)) for k, v in metadata.items()])
+            else:
+                for sql in gpkg_schema:
+                    con.execute(sql)
+                srs = get_gpkg_srs(grid.srs)
+                con.executemany('INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)',
+                                gpkg_default_srs + [get_gpkg_srs(4326), srs])
+                con.execute(
+                    'CREATE TABLE IF NOT EXISTS "{}" (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                    'zoom_level INTEGER NOT NULL, tile_column INTEGER NOT NULL, tile_row INTEGER NOT NULL, '
+                    'tile_data BLOB NOT NULL, UNIQUE (zoom_level, tile_column, tile_row))'.format(table_name))
+                con.execute('INSERT OR REPLACE INTO gpkg_contents '
+                            '(table_name, data_type, identifier, min_x, min_y, max_x, max_y, srs_id) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (table_name, 'tiles', table_name, *extent.ldru, srs[1]))
+                con.execute('INSERT OR REPLACE INTO gpkg_tile_matrix_set VALUES (?, ?, ?, ?, ?, ?)',
+                            (table_name, srs[1], *grid.bounds.ldru))
+                con.executemany('INSERT OR REPLACE INTO gpkg_tile_matrix VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                [(table_name, z, *grid.get_matrix_size(z), grid.tile_size, grid.tile_size,
+                                  grid.get_res(z), grid.get_res(z)) for z in zooms])
+    finally:
+        con.close()
+
+
+def finish_tile_container(out_path: PathLikeOrStr, tile_format: TileFormat):
+    if tile_format == TileFormat.xyz:
+        return
+    con = connect_tile_container(out_path)
+    try:
+        # back to a single file
+        con.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        con.close()
+
+
+def gdalos_tiles(
+        filename: PathLikeOrStr,
+        out_path: PathLikeOrStr,
+        tile_format: Union[TileFormat, str] = TileFormat.xyz,
+        grid: Optional[TileGrid] = None,
+        min_zoom: Optional[int] = None,
+        max_zoom: Optional[int] = None,
+        image_format: str = 'png',
+        creation_options: Optional[Sequence[str]] = None,
+        resampling_alg=None,
+        kind: Optional[RasterKind] = None,
+        metatile: int = default_metatile,
+        workers: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        table_name: Optional[str] = None,
+        logger=None,
+) -> int:
+    """
+    renders a (byte or paletted) raster into a tile pyramid: a directory of z/x/y tiles, an mbtiles or a gpkg.
+    the grid is web mercator by default (a custom grid could be made by TileGrid.from_extent).
+    the tiles of each zoom are made by jobs of metatile x metatile tiles, which run concurrently by the given
+    executor or by a process pool. each job warps its tiles at once from the source overview that fits the zoom,
+    and writes only the tiles which aren't empty (transparent).
+    returns the number of tiles that were written.
+    """
+    verbose = logger is not None and logger is not ...
+    filename = Path(filename)
+    if isinstance(tile_format, str):
+        tile_format = TileFormat[tile_format.lower()]
+    if grid is None:
+        grid = TileGrid.web_mercator()
+    if tile_format == TileFormat.mbtiles and not projdef.are_srs_equivalent(grid.srs, 3857):
+        raise Exception('mbtiles should be in web mercator, got: {}'.format(grid.srs))
+    if image_format not in tile_image_formats:
+        raise Exception('unknown tile image format: {}'.format(image_format))
+    if creation_options is None:
+        creation_options = tile_image_formats[image_format][2]
+    if table_name is None:
+        table_name = filename.stem
+
+    ds = gdalos_util.open_ds(filename)
+    if any(t != gdal.GDT_Byte for t in gdalos_util.get_band_types(ds)):
+        raise Exception('tiles are made from byte rasters, scale "{}" to byte (i.e. by gdalos_trans)'.format(filename))
+    if kind in [None, ...]:
+        kind = RasterKind.guess(ds)
+    if resampling_alg is None:
+        resampling_alg = kind.resampling_alg_by_kind()
+    resampling = None if resampling_alg is ... else enum_to_str(resampling_alg)
+
+    transform = projdef.get_transform(projdef.get_srs_pj(ds), projdef.get_srs_pj(grid.srs))
+    extent = gdalos_extent.transform_extent(gdalos_extent.get_extent(ds), transform).intersect(grid.bounds)
+    if extent.is_empty():
+        raise Exception('the raster "{}" is outside of the tile grid'.format(filename))
+    # the resolution of the source in the units of the grid, and the ratio between them
+    src_res = gdalos_util.get_pixel_size(ds)[0]
+    res_in_grid = extent.w / ds.RasterXSize
+    if max_zoom is None:
+        max_zoom = grid.get_zoom(res_in_grid)
+    if min_zoom is None:
+        min_zoom = min(max_zoom, grid.get_zoom(max(extent.w, extent.h) / grid.tile_size))
+    zooms = list(range(min_zoom, max_zoom + 1))
+
+    kwargs_list = []
+    for zoom in reversed(zooms):  # the biggest zoom first
+        tile_range = grid.get_tile_range(zoom, extent)
+        if tile_range is None:
+            continue
+        ovr_idx = gdalos_util.get_ovr_idx(ds, ovr_res=float(grid.get_res(zoom) * src_res / res_in_grid))
+        for metatile_range in split_tile_range(tile_range, metatile):
+            kwargs_list.append(dict(
+                filename=str(filename), ovr_idx=ovr_idx, grid=grid, zoom=zoom, tile_range=metatile_range,
+                out_path=str(out_path), tile_format=tile_format, image_format=image_format,
+                creation_options=list(creation_options), resampling=resampling, table_name=table_name))
+    ds = None
+
+    create_tile_container(out_path, tile_format, grid, zooms, extent, image_format, table_name)
+    metatile_memory = (metatile * grid.tile_size) ** 2 * 4 * 2
+    max_pending = get_workers_count(workers, job_memory=gdal.GetCacheMax() + metatile_memory)
+    if verbose:
+        logger.info('rendering zooms {}-{} of "{}" into "{}" by {} jobs with {} workers'.format(
+            min_zoom, max_zoom, filename, out_path, len(kwargs_list), max_pending))
+    start_time = time.time()
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=max_pending) as pool:
+            results = execute_bounded(pool, render_metatile, kwargs_list, max_pending, logger)
+    else:
+        results = execute_bounded(executor, render_metatile, kwargs_list, max_pending, logger)
+    finish_tile_container(out_path, tile_format)
+    if any(r is None for r in results):
+        raise Exception('{} of {} tile jobs failed'.format(sum(r is None for r in results), len(results)))
+    count = sum(results)
+    if verbose:
+        logger.info('{} tiles were written in {:.1f} seconds'.format(count, time.time() - start_time))
+    return count
@@ -1,9 +1,12 @@
 import datetime
 import logging
+import math
 import os
 import sys
 import tempfile
 import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from numbers import Real
 from argparse import ArgumentParser
 from pathlib import Path
@@ -25,8 +28,16 @@ from gdalos.gdalos_util import do_skip_if_exists
 from gdalos.partitions import Partition, make_partitions
 from gdalos.rectangle import GeoRectangle
 from osgeo_utils.auxiliary.util import PathOrDS, PathLikeOrStr
-from gdalos.gdalos_vrt import gdalos_make_vrt
+from gdalos.gdalos_vrt import gdalos_make_vrt, gdalos_make_vrt_with_overviews
 from gdalos.gdalos_types import MaybeSequence, warp_srs_base
+from gdalos.gdalos_plan import GdalosJob, GdalosPlan, JobKind, JobState, estimate_raster_bytes, \
+    default_warp_memory, get_workers_count, execute_bounded, gdalos_execute_plan, get_plan_report, print_plan_report
+from gdalos.gdalos_cache import GdalosCache, raster_identity, make_key
+from gdalos.gdalos_temp import TempWorkspace
+from gdalos.gdalos_report import RunReport, ReportCallback, report_phase
+from gdalos.gdalos_journal import JobJournal
+from gdalos import gdalos_tiff_copy, gdalos_pyramid
+from gdalos.gdalos_governor import ResourceGovernor
 from osgeo_utils.auxiliary.progress import get_progress_callback
 
 
@@ -78,6 +89,11 @@ gdalos_trans_sequence_keys = [
 # I also define negative overview numbers as follows: ovr_idx<0 == overview_count+ovr_idx+1
 # So for raster that has overview_count=3 holds 4 rasters which are numberd 0..3. (-1)->3; (-2)->2, (-3)->1, (-4)->0
 
+# thread safety: gdalos_trans (and gdalos_ovr) may run concurrently on several threads of a single process,
+# i.e. by a ThreadPoolExecutor, as long as the calls write different outputs:
+# config_options are set per thread (and restored after the call), and each call logs to its own logger.
+# a given logger is shared by the calls that it is passed to.
+
 @with_param_dict("all_args")
 def gdalos_trans(
         filename: MaybeSequence[PathOrDS],
@@ -139,10 +155,26 @@ def gdalos_trans(
         temp_files: Optional[list] = None,
         delete_temp_files: Optional[bool] = None,
         partition: Optional[Union[MaybeSequence[Partition], int]] = None,
+        partition_mosaic: Optional[bool] = None,  # make the partitions concurrently, then mosaic them into one output
         quiet: Optional[bool] = None,
         print_progress: Optional[bool] = None,
         logger: Optional[bool] = None,
         console_logger_level: Optional = None,
+        plan: Optional[GdalosPlan] = None,  # if a list is given, the jobs are appended to it instead of being performed
+        workers: Optional[int] = None,  # process list arguments by a pool of (up to) this many processes; 0 -> cpu count
+        executor: Optional[Executor] = None,  # process list arguments by this executor (i.e. threads for in-memory inputs)
+        cache: Optional[GdalosCache] = None,  # reuse the outputs of an identical previous job, and store new outputs
+        dry_run: Optional[bool] = None,  # resolve everything and return a report of the expected work, write nothing
+        cog_streaming: Optional[bool] = None,  # 2 step cog through in-memory vrt levels, without a temp raster
+        workspace: Optional[TempWorkspace] = None,  # place the intermediate files in memory or in a scratch dir
+        report: Optional[RunReport] = None,  # collect the time and i/o of each phase into this report
+        report_callback: Optional[ReportCallback] = None,  # called with the metrics of each phase that ends
+        write_report: Optional[bool] = None,  # write the report as json next to the output (.report.json)
+        journal: Optional[JobJournal] = None,  # skip jobs that were already done, clean up after unfinished ones
+        tile_copy: Optional[bool] = None,  # crop a tiled tiff by copying its compressed tiles (if possible)
+        governor: Optional[ResourceGovernor] = None,  # admit the job and assign its threads and memory by a budget
+        ovr_workers: Optional[int] = None,  # make the existing_reuse overview levels concurrently; 0 -> cpu count
+        pyramid: Optional[bool] = None,  # build external overviews in a single read of the raster (opt-in)
         *,
         all_args: dict = None,
 ):
@@ -212,11 +244,11 @@ def gdalos_trans(
         delete_temp_files = True
     if quiet is None:
         quiet = False
+    if tile_copy is None:
+        tile_copy = False
     if console_logger_level is None:
         console_logger_level = logging.INFO
 
-    print(all_args)
-
     if final_files is None:
         final_files = []
     if ovr_files is None:
@@ -233,6 +265,9 @@ def gdalos_trans(
         partition = None if partition <= 1 else make_partitions(partition)
         all_args["partition"] = partition
 
+    if dry_run and plan is None:
+        return gdalos_trans_dry_run(all_args)
+
     out_suffixes = []
 
     for key in gdalos_trans_sequence_keys:
@@ -263,6 +298,22 @@ def gdalos_trans(
         if gdalos_util.is_list_like(val):
             # input argument is a list, recurse over its values
             all_args_new = all_args.copy()
+            if plan is None and key == "partition" and partition_mosaic:
+                return gdalos_trans_mosaic(
+                    all_args_new, val, workers=workers, executor=executor,
+                    final_files=final_files, ovr_files=ovr_files, aux_files=aux_files, temp_files=temp_files,
+                    logger=logger)
+            if plan is None and (workers is not None or executor is not None):
+                kwargs_list = []
+                for v in val:
+                    kwargs = all_args_new.copy()
+                    kwargs[key] = v
+                    kwargs_list.append(kwargs)
+                print("iterate over {} ({} values)".format(key, len(val)))
+                return gdalos_trans_parallel(
+                    kwargs_list, workers=workers, executor=executor,
+                    final_files=final_files, ovr_files=ovr_files, aux_files=aux_files, temp_files=temp_files,
+                    logger=logger)
             ret_code = None
             for idx, v in enumerate(val):
                 print("iterate over {} ({}/{}) - {}".format(key, idx + 1, len(val), v))
@@ -284,13 +335,30 @@ def gdalos_trans(
 
     if not filename:
         return None
+    if journal is not None and plan is None:
+        return gdalos_trans_journaled(
+            journal, all_args, final_files=final_files, ovr_files=ovr_files, aux_files=aux_files, temp_files=temp_files)
+    if governor is not None and plan is None:
+        return gdalos_trans_governed(
+            governor, all_args, final_files=final_files, ovr_files=ovr_files, aux_files=aux_files, temp_files=temp_files)
+    if cache is not None and plan is None:
+        return gdalos_trans_cached(
+            cache, all_args, final_files=final_files, ovr_files=ovr_files, aux_files=aux_files, temp_files=temp_files)
+    if plan is None and report is None and (write_report or report_callback is not None):
+        return gdalos_trans_reported(
+            RunReport(report_callback), all_args,
+            final_files=final_files, ovr_files=ovr_files, aux_files=aux_files, temp_files=temp_files)
     start_time = time.time()
+    plan_start = len(plan) if plan is not None else 0
+    planning_files = []  # files that are needed only while planning
+    step_vrt_options = None
     ref_filename = reference_filename or filename
 
     # region console logger initialization
     logger_handlers = []
     if logger is None:
-        logger = logging.getLogger(__name__)
+        # a logger per call, so concurrent calls don't write to each other's handlers (console, spec file)
+        logger = gdalos_logger.get_call_logger(__name__)
         logger_handlers.append(gdalos_logger.set_logger_console(logger, level=console_logger_level))
         logger.debug("console handler added")
     all_args["logger"] = logger
@@ -304,6 +372,7 @@ def gdalos_trans(
     # creating a copy of the input dictionaries, as I don't want to change the input
     config_options = dict(config_options or dict())
     common_options = dict(common_options or dict())
+    creation_options_input = bool(creation_options)
     creation_options = dict(creation_options or dict())
     translate_options = dict(translate_options or dict())
     warp_options = dict(warp_options or dict())
@@ -315,9 +384,12 @@ def gdalos_trans(
         warp_options_inner['NUM_THREADS'] = multi_thread
         warp_options['multithread'] = True
 
-    if ovr_idx is not None:
-        ovr_idx = gdalos_util.get_ovr_idx(filename, ovr_idx)
-    ds = gdalos_util.open_ds(filename, ovr_idx=ovr_idx, open_options=open_options, logger=logger)
+    with report_phase(report, 'open'):
+        if ovr_idx is not None:
+            ovr_idx = gdalos_util.get_ovr_idx(filename, ovr_idx)
+        ds = gdalos_util.open_ds(filename, ovr_idx=ovr_idx, open_options=open_options, logger=logger)
+    if report is not None:
+        report.start('resolve')
 
     # filename_is_ds = not isinstance(filename, (str, Path))
     filename_is_ds = ds == filename
@@ -412,13 +484,20 @@ def gdalos_trans(
         warp_options["dstSRS"] = pjstr_tgt_srs
     # endregion
 
+    cutline_wkt = None  # the geometries of a cutline file which would be created by the trans job
     if cutline:
         if isinstance(cutline, str):
             cutline_filename = cutline
         elif isinstance(cutline, Sequence):
-            cutline_filename = tempfile.mktemp(suffix='.gpkg')
+            if workspace is not None:
+                cutline_filename = workspace.path(suffix='.gpkg', est_size=1024 ** 2)
+            else:
+                cutline_filename = tempfile.mktemp(suffix='.gpkg')
             temp_files.append(cutline_filename)
-            ogr_create_geometries_from_wkt(cutline_filename, cutline, of='GPKG', srs=4326)
+            if plan is not None:
+                cutline_wkt = cutline
+            elif not dry_run:
+                ogr_create_geometries_from_wkt(cutline_filename, cutline, of='GPKG', srs=4326)
         warp_options['cutlineDSName'] = cutline_filename
 
     do_warp = warp_srs is not None or cutline is not None
@@ -448,7 +527,14 @@ def gdalos_trans(
             vrt_options = dict()
             vrt_options["bandList"] = band_list_3
             vrt_path, ds = gdalos_make_vrt(ds, resampling_alg=..., vrt_options=vrt_options)
-            temp_files.append(vrt_path)
+            if plan is None:
+                temp_files.append(vrt_path)
+                if workspace is not None:
+                    workspace.add(vrt_path)
+            else:
+                # the job would make its own vrt, this one is only used for the planning
+                planning_files.append(vrt_path)
+                step_vrt_options = vrt_options
             # for some reason sometimes the vrt has less overviews than its source
             overview_count = gdalos_util.get_ovr_count(ds)
             band_types = gdalos_util.get_band_types(ds)
@@ -511,11 +597,31 @@ def gdalos_trans(
                 warp_options["srcNodata"] = src_nodatavalue
     # endregion
 
+    # region tile copy
+    # a crop of a tiled tiff, that doesn't change the pixels or the encoding, could copy the compressed tiles as they are.
+    # a cog is encoded again by its 2nd step, so only a gtiff output is made by copying the tiles.
+    # the tile copy crops an extent that is snapped to the tile grid, only if the tiles of that extent can be copied.
+    # if the copy fails anyway, the crop falls back to translate, of the extent that isn't snapped.
+    block_size_src = ds.GetRasterBand(1).GetBlockSize()
+    tile_copy = bool(
+        tile_copy
+        and not filename_is_ds and not is_vsimem and input_ext in ['.tif', '.tiff']
+        and not do_warp and not resample_is_needed and value_scale is None
+        and (ot is None or all(t == ot for t in band_types))
+        and comp == org_comp and not translate_options and not common_options and not creation_options_input
+        and of == GdalOutputFormat.gtiff and not cog and gdalos_util.is_true(tiled)
+        and (block_size is None or block_size_src == [block_size, block_size])
+        and gdalos_tiff_copy.get_tile_copy_image(ds) is not None
+    )
+    tile_copy_extent = None
+    # endregion
+
     # region extent
     org_extent_in_src_srs = gdalos_extent.get_extent(ds)
     if org_extent_in_src_srs.is_empty():
         raise Exception(f"no input extent: {filename} [{org_extent_in_src_srs}]")
     out_extent_in_src_srs = org_extent_in_src_srs
+    out_extent_in_tgt_srs_part = None
     pjstr_4326 = projdef.get_srs_pj(4326)  # 'EPSG:4326'
     if extent is not None or partition is not None:
         transform = projdef.get_transform(pjstr_src_srs, pjstr_4326)
@@ -553,6 +659,8 @@ def gdalos_trans(
             msg = f"no output extent: {filename} [{out_extent_in_tgt_srs}]"
             if extent_silent_fail_if_empty:
                 logger.warning(msg)
+                if report is not None:
+                    report.stop('resolve')
                 return None
             else:
                 raise Exception(msg)
@@ -564,6 +672,16 @@ def gdalos_trans(
 
         if extent_aligned:
             out_extent_in_tgt_srs_part = out_extent_in_tgt_srs_part.align(geo_transform)
+            if tile_copy:
+                # snap to the block grid of the source, so the tiles could be copied
+                block_geo_transform = list(geo_transform)
+                block_geo_transform[1] *= block_size_src[0]
+                block_geo_transform[5] *= block_size_src[1]
+                tile_copy_extent = out_extent_in_tgt_srs_part.align(block_geo_transform).intersect(
+                    org_extent_in_src_srs)
+                if gdalos_tiff_copy.get_tile_copy_source(ds, proj_win=tile_copy_extent.lurd) is None:
+                    tile_copy = False
+                    tile_copy_extent = None
 
         # -projwin minx maxy maxx miny (ulx uly lrx lry)
         translate_options["projWin"] = out_extent_in_tgt_srs_part.lurd
@@ -718,7 +836,8 @@ def gdalos_trans(
             out_src_path = [out_filename.parts[-1]]
         out_filename = Path(out_path).joinpath(*out_src_path)
 
-    if out_filename and not os.path.exists(os.path.dirname(out_filename)):
+    if plan is None and out_filename and not str(out_filename).startswith('/vsimem/') and \
+            not os.path.exists(os.path.dirname(out_filename)):
         os.makedirs(os.path.dirname(out_filename), exist_ok=True)
 
     if cog:
@@ -735,6 +854,29 @@ def gdalos_trans(
     trans_filename = out_filename
     if (value_scale is not None) and trans_or_warp_is_needed:
         trans_filename = trans_filename.with_suffix(".float" + outext)
+
+    cog_of = of
+    cog_streaming = bool(cog_streaming and cog_2_steps and ovr_type == OvrType.existing_reuse and
+                         value_scale is None and not filename_is_ds)
+    if workspace is not None and plan is None and not cog_streaming and \
+            (cog_2_steps or trans_filename != out_filename):
+        out_size = get_out_size(ds, common_options, translate_options, out_extent_in_tgt_srs_part,
+                                pjstr_src_srs, pjstr_tgt_srs)
+        est_size = estimate_raster_bytes(*out_size, len(band_types), ot or max(band_types))
+        if cog_2_steps:
+            # the base raster and its overviews (about a third more) are intermediate files
+            out_filename = Path(workspace.path(suffix='', name=out_filename.name, est_size=est_size * 4 // 3))
+            trans_filename = out_filename
+        if (value_scale is not None) and trans_or_warp_is_needed:
+            trans_filename = Path(workspace.path(
+                suffix='', name=trans_filename.name,
+                est_size=estimate_raster_bytes(*out_size, len(band_types), gdal.GDT_Float32)))
+    if cog_streaming:
+        # the base raster and its overviews are made as in-memory vrt files (warped on the fly),
+        # thus the cog step is the only one that reads the source pixels and writes the output pixels
+        of = GdalOutputFormat.vrt
+        out_filename = Path(f'/vsimem/gdalos_{uuid.uuid4()}') / (out_filename.name + '.vrt')
+        trans_filename = out_filename
     # endregion
 
     if cog_2_steps:
@@ -744,7 +886,11 @@ def gdalos_trans(
         final_files_for_step_1 = final_files
         ovr_files_for_step_1 = ovr_files
 
-    final_output_exists = do_skip_if_exists(final_filename, overwrite, logger)
+    if plan is None:
+        final_output_exists = do_skip_if_exists(final_filename, overwrite, logger)
+    else:
+        # while planning we don't delete anything, the jobs would overwrite the existing files
+        final_output_exists = not overwrite and os.path.isfile(final_filename)
 
     # for OvrType.existing_reuse we'll create the files in backwards order in the overview creation step
     skipped = (final_output_exists or
@@ -752,13 +898,21 @@ def gdalos_trans(
                 ((ovr_type == OvrType.existing_reuse and (not cog or cog_2_steps)) or
                  ((filename == out_filename) and (value_scale is None) and (not trans_or_warp_is_needed)))))
 
+    spec_filename = None
     if final_output_exists:
         final_files.append(final_filename)
-    elif write_spec:
-        spec_filename = gdalos_util.concat_paths(out_filename, ".spec")
-        logger_handlers.append(gdalos_logger.set_file_logger(logger, spec_filename))
-        logger.debug('spec file handler added: "{}"'.format(spec_filename))
-        logger.debug("gdalos versoin: {}".format(gdalos_version))
+    elif write_spec and not dry_run and not str(final_filename).startswith('/vsimem/'):
+        # out_filename might be an intermediate (in-memory) file, the spec belongs to the final output
+        spec_filename = gdalos_util.concat_paths(final_filename, ".spec")
+        if plan is None:
+            logger_handlers.append(gdalos_logger.set_file_logger(logger, spec_filename))
+            logger.debug('spec file handler added: "{}"'.format(spec_filename))
+            logger.debug("gdalos versoin: {}".format(gdalos_version))
+        else:
+            # planning doesn't write the spec, the jobs do (the other jobs of this run are made to depend on it)
+            plan.append(GdalosJob(
+                JobKind.spec, gdalos_spec_begin, dict(spec_filename=spec_filename, logger=logger),
+                out_filename=spec_filename))
         aux_files.append(spec_filename)
         # logger.debug('debug')
         # logger.info('info')
@@ -767,6 +921,8 @@ def gdalos_trans(
         # logger.critical('critical')
 
     # region create base raster
+    if report is not None:
+        report.stop('resolve')
     ret_code = None
     out_ds = None
     if not skipped:
@@ -809,12 +965,9 @@ def gdalos_trans(
                 creation_options["COPY_SRC_OVERVIEWS"] = str(ovr_type == OvrType.existing_reuse)
 
         creation_options_list = options_dict_to_list(creation_options)
-        if creation_options:
+        if creation_options and of != GdalOutputFormat.vrt:
             common_options["creationOptions"] = creation_options_list
 
-        if print_progress or print_progress is None:
-            common_options["callback"] = get_progress_callback(print_progress)
-
         if resample_is_needed:
             if resampling_alg is None:
                 resampling_alg = kind.resampling_alg_by_kind(expand_rgb)
@@ -832,55 +985,64 @@ def gdalos_trans(
         if input_ext == ".xml":
             config_options = {"GDAL_HTTP_UNSAFESSL": "YES"}  # for gdal-wms xml files
 
-        try:
-            if config_options:
-                if verbose:
-                    logger.info("config options: " + str(config_options))
-                for k, v in config_options.items():
-                    gdal.SetConfigOption(k, v)
-
-            if do_warp:
-                max_band_types = max(band_types)
-                if max_band_types != min(band_types):
-                    # it seems that Warp doesn't support different band types in the same output ds
-                    warp_options['outputType'] = max_band_types
-                if warp_options_inner:
-                    warp_options["warpOptions"] = options_dict_to_list(warp_options_inner)
-                if verbose and warp_options:
-                    logger.info("warp options: " + str(warp_options))
-                out_ds = gdal.Warp(str(trans_filename), ds, **common_options, **warp_options)
-
-                if out_ds is not None and value_scale is None and workaround_warp_scale_bug:
-                    scale_raster.assign_same_scale_and_offset_values(out_ds, ds)
-            elif trans_or_warp_is_needed or value_scale is None:
-                if verbose and translate_options:
-                    logger.info("translate options: " + str(translate_options))
-                out_ds = gdal.Translate(str(trans_filename), ds, **common_options, **translate_options)
-            if value_scale is not None:
-                temp_files.append(trans_filename)
-                if verbose:
-                    logger.info(f'scaling {out_filename}..."')
-                out_ds = scale_raster.scale_raster(
-                    out_ds or ds, out_filename,
-                    scale=value_scale, format=enum_to_str(of),
-                    hide_nodata=hide_nodatavalue,
-                    creation_options_list=creation_options_list, overwrite=overwrite)
-            ret_code = out_ds is not None
-            if not return_ds:
-                out_ds = None  # close output ds
+        if do_warp:
+            max_band_types = max(band_types)
+            if max_band_types != min(band_types):
+                # it seems that Warp doesn't support different band types in the same output ds
+                warp_options['outputType'] = max_band_types
+            if warp_options_inner:
+                warp_options["warpOptions"] = options_dict_to_list(warp_options_inner)
+
+        step_args = dict(
+            out_filename=out_filename,
+            trans_filename=trans_filename,
+            do_warp=do_warp,
+            trans_or_warp_is_needed=trans_or_warp_is_needed,
+            common_options=common_options,
+            warp_options=warp_options,
+            translate_options=translate_options,
+            config_options=config_options,
+            value_scale=value_scale,
+            of=of,
+            hide_nodatavalue=hide_nodatavalue,
+            overwrite=overwrite,
+            return_ds=return_ds,
+            print_progress=print_progress,
+            quiet=quiet,
+            logger=logger,
+            tile_copy=tile_copy,
+            tile_copy_proj_win=None if tile_copy_extent is None else tile_copy_extent.lurd,
+            big_tiff=big_tiff,
+        )
+        if plan is None:
+            out_ds = gdalos_trans_step(ds, **step_args, temp_files=temp_files, report=report)
+            if return_ds and out_ds:
+                ret_code = True
+            else:
+                out_ds, ret_code = None, out_ds
             if ret_code:
                 final_files_for_step_1.append(out_filename)
-            else:
-                e = gdal.GetLastErrorMsg()
-                logger.error(str(e))
-        except Exception as e:
-            if verbose:
-                logger.error(str(e))
-        finally:
-            for key, val in config_options.items():
-                gdal.SetConfigOption(key, None)
+        else:
+            # the job reopens the input by itself, so it could run in another process
+            step_args.update(filename=filename, ovr_idx=ovr_idx, open_options=open_options, vrt_options=step_vrt_options,
+                             cutline_wkt=cutline_wkt)
+            out_size = get_out_size(ds, common_options, translate_options, out_extent_in_tgt_srs_part,
+                                    pjstr_src_srs, pjstr_tgt_srs)
+            out_bands_count = 3 if "rgbExpand" in translate_options else \
+                len(translate_options.get("bandList") or band_types)
+            trans_job = GdalosJob(
+                JobKind.trans, gdalos_trans_step, step_args, out_filename=out_filename,
+                est_size=estimate_raster_bytes(*out_size, out_bands_count, ot or max(band_types)),
+                est_pixels=out_size[0] * out_size[1])
+            plan.append(trans_job)
+            if value_scale is not None:
+                temp_files.append(trans_filename)
+            if of == GdalOutputFormat.vrt and step_vrt_options:
+                temp_files.append(gdalos_util.concat_paths(out_filename, '.bands.vrt'))
+            final_files_for_step_1.append(out_filename)
+            ret_code = True
 
-        if verbose:
+        if verbose and plan is None:
             seconds = round(time.time() - start_time)
             time_string = str(datetime.timedelta(seconds=seconds))
             logger.info(
@@ -897,9 +1059,6 @@ def gdalos_trans(
     # region create overviews, cog, info
     cog_ready = cog and final_output_exists
     if not cog_ready and (ret_code or skipped):
-        if not skipped and hide_nodatavalue:
-            gdalos_util.unset_nodatavalue(out_ds or str(out_filename))
-
         if not cog or cog_2_steps:
             # create overview file(s)
             if ovr_type == OvrType.existing_reuse:
@@ -913,6 +1072,23 @@ def gdalos_trans(
                 all_args_new["write_spec"] = False
                 all_args_new["cog"] = False
                 all_args_new["logger"] = logger
+                # each level is reported as a single phase of this run
+                all_args_new["report"] = None
+                all_args_new["report_callback"] = None
+                all_args_new["write_report"] = False
+                # the levels copy tiles only if the base level does, so they all share the same extent
+                all_args_new["tile_copy"] = tile_copy
+                if tile_copy_extent is not None:
+                    # all the levels are cropped to the same (block aligned) extent of the base level
+                    all_args_new["extent"] = tile_copy_extent
+                    all_args_new["extent_in_4326"] = False
+                    all_args_new["extent_aligned"] = False
+                    all_args_new["partition"] = None
+                if cog_streaming:
+                    all_args_new["of"] = of
+                    all_args_new["cog_streaming"] = False
+                    # the level vrts reference their intermediate files (i.e. band selection vrts)
+                    all_args_new["delete_temp_files"] = False
                 # iterate backwards on the overviews
                 if verbose:
                     logger.debug(
@@ -920,38 +1096,52 @@ def gdalos_trans(
                             src_ovr_last, ovr_idx
                         )
                     )
+                levels_args = []
                 for cur_ovr_idx in range(src_ovr_last, ovr_idx - 1, -1):
-                    all_args_new["final_files"] = []
-                    all_args_new["ovr_files"] = []  # there shouldn't be any
-                    all_args_new["aux_files"] = []
-                    all_args_new["temp_files"] = []  # there shouldn't be any
-                    all_args_new["out_filename"] = gdalos_util.concat_paths(
+                    level_args = dict(all_args_new, final_files=[], ovr_files=[], aux_files=[], temp_files=[])
+                    level_args["out_filename"] = gdalos_util.concat_paths(
                         out_filename, ".ovr" * (cur_ovr_idx - ovr_idx)
                     )
-                    all_args_new["ovr_idx"] = cur_ovr_idx
+                    level_args["ovr_idx"] = cur_ovr_idx
                     if out_res not in [None, ...]:
                         res_factor = 2 ** (cur_ovr_idx - ovr_idx)
-                        all_args_new["out_res"] = [r * res_factor for r in out_res]
-                    all_args_new["write_info"] = write_info and (cur_ovr_idx == ovr_idx) and not cog
-                    ret_code = gdalos_trans(**all_args_new)
+                        level_args["out_res"] = [r * res_factor for r in out_res]
+                    level_args["write_info"] = write_info and (cur_ovr_idx == ovr_idx) and not cog
+                    levels_args.append(level_args)
+                if ovr_workers is not None and plan is None and not cog_streaming and len(levels_args) > 1:
+                    with report_phase(report, 'ovr_levels'):
+                        ret_codes = gdalos_trans_levels(
+                            levels_args, workers=ovr_workers, multi_thread=multi_thread,
+                            warp_memory=get_warp_memory(warp_options), logger=logger)
+                else:
+                    ret_codes = []
+                    for level_args in levels_args:
+                        with report_phase(report, 'ovr_level_{}'.format(level_args["ovr_idx"] - ovr_idx)):
+                            ret_codes.append(gdalos_trans(**level_args))
+                # the files are collected in the order of the levels, no matter the order in which they were made
+                for level_args, ret_code in zip(levels_args, ret_codes):
                     if not ret_code:
-                        logger.warning(f'return code was None for creating {all_args_new["out_filename"]}')
-                    if cur_ovr_idx == ovr_idx:
-                        final_files_for_step_1.extend(all_args_new["final_files"])
+                        logger.warning(f'return code was None for creating {level_args["out_filename"]}')
+                    if level_args["ovr_idx"] == ovr_idx:
+                        final_files_for_step_1.extend(level_args["final_files"])
                     else:
-                        ovr_files_for_step_1.extend(all_args_new["final_files"])
+                        ovr_files_for_step_1.extend(level_args["final_files"])
+                    if cog_streaming:
+                        temp_files.extend(level_args["temp_files"])
+                        level_args["temp_files"] = []
                     if verbose:
                         for f in ["ovr_files", "temp_files"]:
-                            if all_args_new[f]:
-                                logger.error(f'there should not be any {f} here, but there are! {all_args_new[f]}')
-                        if len(all_args_new["final_files"]) != 1:
-                            logger.error(f'ovr creating should have made exactly 1 file! {all_args_new["final_files"]}')
-                    aux_files.extend(all_args_new["aux_files"])
+                            if level_args[f]:
+                                logger.error(f'there should not be any {f} here, but there are! {level_args[f]}')
+                        if len(level_args["final_files"]) != 1:
+                            logger.error(f'ovr creating should have made exactly 1 file! {level_args["final_files"]}')
+                    aux_files.extend(level_args["aux_files"])
+                # the base level is the last one
+                ret_code = ret_codes[-1] if ret_codes else None
                 write_info = write_info and cog
             elif not filename_is_ds and ovr_type not in [OvrType.no_overviews, OvrType.existing_reuse]:
                 # create overviews from dataset (internal or external)
-                ret_code = gdalos_ovr(
-                    out_filename,
+                ovr_args = dict(
                     overwrite=overwrite,
                     ovr_type=ovr_type,
                     dst_ovr_count=dst_ovr_count,
@@ -959,9 +1149,22 @@ def gdalos_trans(
                     multi_thread=multi_thread,
                     resampling_alg=resampling_alg,
                     print_progress=print_progress,
+                    pyramid=pyramid,
                     logger=logger,
-                    ovr_files=ovr_files_for_step_1,
                 )
+                if plan is None:
+                    with report_phase(report, 'ovr'):
+                        ret_code = gdalos_ovr(out_filename, **ovr_args, ovr_files=ovr_files_for_step_1)
+                else:
+                    # an auto ovr_type is kept, so it would be decided by the size of the file once it exists
+                    base_size = sum(job.est_size for job in plan[plan_start:])
+                    ovr_args["filename"] = out_filename
+                    base_pixels = sum(job.est_pixels for job in plan[plan_start:])
+                    plan.append(GdalosJob(
+                        JobKind.ovr, gdalos_ovr, ovr_args, deps=plan[plan_start:],
+                        est_size=base_size // 3, est_pixels=base_pixels // 3,
+                        out_filename=gdalos_util.concat_paths(out_filename, ".ovr")))
+                    ovr_files_for_step_1.extend(get_ovr_filenames(out_filename, ovr_args["ovr_type"], dst_ovr_count))
 
         if cog_2_steps:
             if verbose:
@@ -970,26 +1173,47 @@ def gdalos_trans(
             cog_temp_files = []  # there shouldn't be any!
             cog_ovr_files = []  # there shouldn't be any!
             cog_aux_files = []
-            ret_code = gdalos_trans(
-                out_filename,
+            cog_args = dict(
+                filename=out_filename,
                 out_filename=final_filename,
                 cog=True,
                 ovr_type=OvrType.existing_reuse,
-                of=of,
+                of=cog_of,
                 outext=outext,
                 tiled=tiled,
                 big_tiff=big_tiff,
                 print_progress=print_progress,
-                final_files=cog_final_files,
-                ovr_files=cog_ovr_files,
-                aux_files=cog_aux_files,
-                temp_files=cog_temp_files,
                 delete_temp_files=False,
                 logger=logger,
                 overwrite=overwrite,
                 write_info=write_info,
                 write_spec=False,
             )
+            cog_func = gdalos_trans
+            if cog_streaming:
+                cog_func = gdalos_trans_from_vrt_levels
+                # the vrt has no compression metadata, so the compression is passed explicitly
+                cog_args.update(
+                    ovr_filenames=[gdalos_util.concat_paths(out_filename, ".ovr" * i)
+                                   for i in range(1, src_ovr_last - ovr_idx + 1)],
+                    prefer_2_step_cog=False, lossy=lossy, kind=kind)
+            if plan is None:
+                with report_phase(report, 'cog'):
+                    ret_code = cog_func(
+                        **cog_args,
+                        final_files=cog_final_files,
+                        ovr_files=cog_ovr_files,
+                        aux_files=cog_aux_files,
+                        temp_files=cog_temp_files,
+                    )
+            else:
+                plan.append(GdalosJob(
+                    JobKind.cog, cog_func, cog_args, deps=plan[plan_start:],
+                    est_size=sum(job.est_size for job in plan[plan_start:]),
+                    est_pixels=sum(job.est_pixels for job in plan[plan_start:]), out_filename=final_filename))
+                cog_final_files.append(final_filename)
+                if write_info:
+                    cog_aux_files.append(gdalos_util.concat_paths(final_filename, ".info"))
             if not ret_code:
                 logger.error(f"cog 2nd step failed to create {final_filename}")
             elif verbose:
@@ -1011,16 +1235,26 @@ def gdalos_trans(
                 False  # we don't need an info for the temp file from first step
             )
         if write_info:
-            info = gdalos_info(
-                out_filename, overwrite=overwrite, logger=logger
-            )
+            if plan is None:
+                with report_phase(report, 'info'):
+                    info = gdalos_info(
+                        final_filename, overwrite=overwrite, logger=logger
+                    )
+            else:
+                info = gdalos_util.concat_paths(final_filename, ".info")
+                plan.append(GdalosJob(
+                    JobKind.info, gdalos_info, dict(filename_or_ds=final_filename, overwrite=overwrite, logger=logger),
+                    deps=plan[plan_start:], out_filename=info, check_result=False))
             if info is not None:
                 aux_files.append(info)
     # endregion
 
-    missing_final_files = list(f for f in final_files if (f != '') and not os.path.exists(f))
-    if missing_final_files:
-        logger.error("output files are missing: {}".format(missing_final_files))
+    if plan is None:
+        missing_final_files = list(f for f in final_files if (f != '') and not os.path.exists(f))
+        if missing_final_files:
+            logger.error("output files are missing: {}".format(missing_final_files))
+    else:
+        missing_final_files = None  # the files would be created by the jobs
     do_delete_temp_files = ret_code and delete_temp_files and not missing_final_files
     # region log file lists
     if verbose:
@@ -1034,20 +1268,39 @@ def gdalos_trans(
 
     # region delete temp files
     if do_delete_temp_files and temp_files:
-        for f in temp_files:
-            if f == filename:
-                if verbose:
-                    logger.error(f'somehow the input file was set as a temp file for deletion: "{f}")')
-            elif str(f).startswith('/vsimem/'):
-                gdal.Unlink(f)
-            elif os.path.isfile(f):
-                try:
-                    os.remove(f)
-                except Exception as e:
-                    logger.warning('could not delete file: "{}" ({})'.format(f, str(e)))
-            else:
-                logger.warning('file for deletion not found: "{}"'.format(f))
-        temp_files.clear()
+        if plan is None:
+            with report_phase(report, 'cleanup'):
+                gdalos_delete_files(temp_files, filename=filename, workspace=workspace, logger=logger)
+            temp_files.clear()
+        else:
+            # the files of an auto ovr_type are known only once it is decided, so all the candidates are listed
+            plan.append(GdalosJob(
+                JobKind.cleanup, gdalos_delete_files,
+                dict(files=list(temp_files), filename=filename, workspace=workspace, missing_ok=True, logger=logger),
+                deps=plan[plan_start:], check_result=False))
+    if planning_files:
+        gdalos_delete_files(planning_files, logger=logger)
+    # endregion
+
+    if plan is not None and spec_filename is not None:
+        # the jobs of this run write their logs to the spec, once it was started
+        spec_job = plan[plan_start]
+        for job in plan[plan_start + 1:]:
+            if spec_job not in job.deps:
+                job.deps.insert(0, spec_job)
+            job.kwargs = dict(job.kwargs, spec_func=job.func, spec_filename=spec_filename)
+            job.func = gdalos_job_with_spec
+
+    # region report
+    if report is not None:
+        report.add_files(final_files + ovr_files + aux_files)
+        if write_report and plan is None and not final_output_exists and \
+                final_filename and not str(final_filename).startswith('/vsimem/'):
+            report_filename = gdalos_util.concat_paths(final_filename, ".report.json")
+            report.write(report_filename)
+            aux_files.append(report_filename)
+        if verbose:
+            logger.debug("report: {}".format(report.to_dict()))
     # endregion
 
     if verbose:
@@ -1061,9 +1314,626 @@ def gdalos_trans(
             logger.removeHandler(handler)
         logger.debug("logging handlers removed")  # this shouldn't log anything
     # end region
+    if plan is not None:
+        return plan
     return out_ds or ret_code
 
 
+def get_warp_memory(warp_options: Optional[dict]) -> int:
+    """ returns the warp memory limit (in bytes) of the given warp options """
+    warp_memory = (warp_options or dict()).get("warpMemoryLimit") or default_warp_memory
+    if warp_memory < 10000:
+        warp_memory *= 1024 ** 2  # values below 10000 are interpreted by gdal as megabytes
+    return warp_memory
+
+
+def gdalos_trans_levels(
+        levels_args: Sequence[dict], workers: Optional[int] = None,
+        multi_thread: Optional[Union[bool, int, str]] = None, warp_memory: int = default_warp_memory,
+        logger=None) -> list:
+    """
+    makes the given overview levels concurrently by a pool of threads (the levels read different source overviews),
+    the files lists of each level are filled in place. returns the result of each level.
+    the biggest level (the last) is started first, as it takes the longest.
+    the threads share the block cache of the process, so the concurrency is bounded by the warp memory of a level,
+    and the threads of multi_thread are divided between the concurrent levels.
+    """
+    # the gdal block cache is shared by the threads
+    max_pending = min(len(levels_args), get_workers_count(workers, job_memory=warp_memory))
+    if multi_thread:
+        multi_thread = multi_thread_to_str(multi_thread)
+        threads = int(multi_thread) if multi_thread.isdigit() else os.cpu_count() or 1
+        multi_thread = max(1, threads // max_pending)
+    kwargs_list = [dict(kwargs, multi_thread=multi_thread, print_progress=False, workers=None, executor=None)
+                   for kwargs in reversed(levels_args)]
+    if logger is not None and logger is not ...:
+        logger.info("making {} overview levels with {} threads".format(len(kwargs_list), max_pending))
+    with ThreadPoolExecutor(max_workers=max_pending) as executor:
+        results = execute_bounded(executor, gdalos_trans, kwargs_list, max_pending, logger)
+    return list(reversed(results))
+
+
+def gdalos_trans_worker(**kwargs):
+    """ runs gdalos_trans (i.e. in a worker process), returns its result with the files that it made """
+    files = dict(final_files=[], ovr_files=[], aux_files=[], temp_files=[])
+    kwargs.update(files)
+    ret_code = gdalos_trans(**kwargs)
+    return ret_code, files
+
+
+def gdalos_trans_parallel(
+        kwargs_list: Sequence[dict],
+        workers: Optional[int] = None, executor: Optional[Executor] = None,
+        final_files: list = None, ovr_files: list = None, aux_files: list = None, temp_files: list = None,
+        logger=None) -> list:
+    """
+    runs gdalos_trans for each of the given kwargs concurrently, by the given executor or by a process pool.
+    the number of concurrent jobs is bounded by the number of workers and by the usable physical memory,
+    or by the resource governor (if the jobs are given one).
+    the files lists of all the jobs are merged into the given lists.
+    returns a list with the result of each job (None for a job that failed)
+    """
+    kwargs_list = [dict(kwargs, workers=None, executor=None, plan=None) for kwargs in kwargs_list]
+    if executor is None:
+        for kwargs in kwargs_list:
+            kwargs["return_ds"] = False  # datasets can't be returned from another process
+
+    governor = kwargs_list[0].get("governor") if kwargs_list else None
+    if governor is not None:
+        max_pending = governor.get_concurrency(len(kwargs_list))
+        if workers not in [None, ..., True] and workers > 0:
+            max_pending = min(max_pending, workers)
+        if executor is None:
+            # each worker process has its own block cache, so each gets a part of the budget
+            process_governor = governor.split(max_pending)
+            for kwargs in kwargs_list:
+                kwargs["governor"] = process_governor
+    else:
+        warp_memory = get_warp_memory(kwargs_list[0].get("warp_options") if kwargs_list else None)
+        max_pending = get_workers_count(workers, job_memory=gdal.GetCacheMax() + warp_memory)
+    if logger is not None and logger is not ...:
+        logger.info("running {} jobs with {} workers".format(len(kwargs_list), max_pending))
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=max_pending) as pool:
+            results = execute_bounded(pool, gdalos_trans_worker, kwargs_list, max_pending, logger)
+    else:
+        results = execute_bounded(executor, gdalos_trans_worker, kwargs_list, max_pending, logger)
+
+    ret_codes = []
+    for result in results:
+        if result is None:
+            ret_codes.append(None)
+            continue
+        ret_code, files = result
+        ret_codes.append(ret_code)
+        for lst, name in ((final_files, "final_files"), (ovr_files, "ovr_files"),
+                          (aux_files, "aux_files"), (temp_files, "temp_files")):
+            if lst is not None:
+                lst.extend(files[name])
+    return ret_codes
+
+
+def gdalos_trans_mosaic(
+        all_args: dict, partitions: Sequence[Partition],
+        workers: Optional[int] = None, executor: Optional[Executor] = None,
+        final_files: list = None, ovr_files: list = None, aux_files: list = None, temp_files: list = None,
+        logger=None):
+    """
+    makes the partitions concurrently, each into a gtiff with overviews on a common pixel grid,
+    then mosaics them by a vrt (which exposes the overviews of the parts as implicit overviews)
+    and copies the vrt into the same output that a non-partitioned run would have made.
+    """
+    verbose = logger is not None and logger is not ...
+    all_args = dict(all_args, partition=None, partition_mosaic=None)
+    all_args.pop("plan", None)
+    if temp_files is None:
+        temp_files = []
+
+    # the plan of the non-partitioned run gives the name of the final output and its resolution
+    plan_final_files = []
+    plan = gdalos_trans_plan(**dict(all_args, final_files=plan_final_files, ovr_files=[], aux_files=[], temp_files=[]))
+    if not plan or not plan_final_files:
+        return None
+    final_filename = Path(plan_final_files[0])
+    out_res = all_args["out_res"]
+    if out_res in [None, ...]:
+        res = [(job.kwargs["common_options"].get("xRes"), job.kwargs["common_options"].get("yRes"))
+               for job in plan if job.kind == JobKind.trans]
+        res = [r for r in res if r[0] is not None]
+        if res:
+            # the finest resolution is of the base raster, the rest are overviews
+            out_res = min(res, key=lambda r: abs(r[0]))
+
+    ovr_type = all_args["ovr_type"]
+    if isinstance(ovr_type, str):
+        ovr_type = OvrType[ovr_type]
+    if ovr_type == OvrType.no_overviews:
+        part_ovr_type = OvrType.no_overviews
+    elif ovr_type in [None, ..., OvrType.auto_select]:
+        with gdalos_util.OpenDS(all_args["filename"], logger=logger) as ds:
+            has_overviews = gdalos_util.get_ovr_count(ds) > 0
+        part_ovr_type = OvrType.existing_reuse if has_overviews else OvrType.create_external_single
+    else:
+        part_ovr_type = ovr_type
+
+    kwargs_list = []
+    for idx, partition in enumerate(partitions):
+        kwargs_list.append(dict(
+            all_args, partition=partition, out_res=out_res,
+            out_filename=gdalos_util.concat_paths(final_filename, ".part{}.tif".format(idx)), out_path=None,
+            of=GdalOutputFormat.gtiff, cog=False, ovr_type=part_ovr_type, write_info=False, write_spec=False))
+    part_files = []
+    ret_codes = gdalos_trans_parallel(
+        kwargs_list, workers=workers if workers is not None or executor is not None else 0, executor=executor,
+        final_files=part_files, ovr_files=temp_files, aux_files=temp_files, temp_files=temp_files, logger=logger)
+    temp_files.extend(part_files)
+    if not all(ret_codes) or len(part_files) != len(partitions):
+        if verbose:
+            logger.error("failed to create some of the partitions: {}".format(ret_codes))
+        return None
+
+    vrt_filename = gdalos_util.concat_paths(final_filename, ".parts.vrt")
+    vrt_ds = gdal.BuildVRT(str(vrt_filename), [str(f) for f in part_files])
+    if vrt_ds is None:
+        raise Exception(f"failed to create a vrt file: {vrt_filename}")
+    vrt_ds = None
+    temp_files.append(vrt_filename)
+
+    comp = gdalos_util.get_image_structure_metadata(str(part_files[0]), "COMPRESSION")
+    mosaic_final_files = []
+    ret_code = gdalos_trans(
+        vrt_filename,
+        out_filename=final_filename,
+        cog=all_args["cog"],
+        prefer_2_step_cog=False,
+        of=all_args["of"],
+        outext=all_args["outext"],
+        kind=all_args["kind"],
+        tiled=all_args["tiled"],
+        block_size=all_args["block_size"],
+        big_tiff=all_args["big_tiff"],
+        quality=all_args["quality"],
+        lossy=(comp is not None) and ("JPEG" in comp),
+        hide_nodatavalue=all_args["hide_nodatavalue"],
+        ovr_type=OvrType.no_overviews if part_ovr_type == OvrType.no_overviews else OvrType.existing_reuse,
+        multi_thread=all_args["multi_thread"],
+        overwrite=all_args["overwrite"],
+        write_info=all_args["write_info"],
+        write_spec=all_args["write_spec"],
+        print_progress=all_args["print_progress"],
+        final_files=mosaic_final_files,
+        ovr_files=ovr_files,
+        aux_files=aux_files,
+        temp_files=temp_files,
+        delete_temp_files=False,
+        logger=logger,
+    )
+    if final_files is not None:
+        final_files.extend(mosaic_final_files)
+    delete_temp_files = all_args["delete_temp_files"]
+    if ret_code and mosaic_final_files and (delete_temp_files is None or delete_temp_files):
+        gdalos_delete_files(temp_files, filename=all_args["filename"], logger=logger)
+        temp_files.clear()
+    return ret_code
+
+
+# arguments of the jobs that don't affect their outputs
+cache_key_ignored_args = ['logger', 'print_progress', 'quiet', 'overwrite', 'return_ds',
+                          'final_files', 'ovr_files', 'aux_files', 'temp_files', 'report', 'report_callback',
+                          'governor', 'workspace', 'journal', 'cache', 'plan', 'workers', 'executor', 'ovr_workers',
+                          'multi_thread', 'delete_temp_files', 'console_logger_level']
+
+# options that change how fast the outputs are made, but not the outputs, thus are not a part of the cache key
+cache_key_ignored_options = ['NUM_THREADS', 'GDAL_NUM_THREADS', 'multithread', 'warpMemoryLimit']
+
+
+def strip_cache_key_ignored_options(value):
+    if isinstance(value, dict):
+        return {k: strip_cache_key_ignored_options(v) for k, v in value.items() if k not in cache_key_ignored_options}
+    if isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+        return [v for v in value if v.split('=', 1)[0] not in cache_key_ignored_options]
+    return value
+
+
+def gdalos_trans_cached(cache: GdalosCache, all_args: dict,
+                        final_files: list, ovr_files: list, aux_files: list, temp_files: list):
+    """
+    runs gdalos_trans through the cache: the job is planned, and its key is made of the identity of the input files
+    and of the fully resolved jobs of the plan (not including the output path).
+    if the key is in the cache, the outputs are restored from it, otherwise the plan is executed and stored.
+    """
+    logger = all_args["logger"]
+    verbose = logger is not None and logger is not ...
+    filename = all_args["filename"]
+    all_args = dict(all_args, cache=None)
+    all_args.pop("plan", None)
+    identity = raster_identity(filename, cache.checksum) if isinstance(filename, (str, Path)) else None
+    if identity is None:
+        if verbose:
+            logger.warning(f'input can not be cached, running without the cache: {filename}')
+        return gdalos_trans(**dict(all_args, final_files=final_files, ovr_files=ovr_files,
+                                   aux_files=aux_files, temp_files=temp_files))
+
+    files = dict(final_files=[], ovr_files=[], aux_files=[], temp_files=[])
+    plan = gdalos_trans_plan(**dict(all_args, **files))
+    if not files["final_files"]:
+        return None
+    final_files.extend(files["final_files"])
+    if not plan:
+        return True  # the output already exists
+    final_filename = str(files["final_files"][0])
+    out_prefix = os.path.join(os.path.dirname(final_filename), os.path.basename(final_filename).split('.')[0])
+    key = make_key([identity, [
+        (job.kind, job.func, strip_cache_key_ignored_options(
+            {k: v for k, v in job.kwargs.items() if k not in cache_key_ignored_args}))
+        for job in plan]], out_prefix=out_prefix, temp_prefixes=files["temp_files"])
+
+    restored = dict()
+    if cache.restore(key, final_filename, restored, overwrite=all_args["overwrite"]):
+        if verbose:
+            logger.info(f'restored from cache: {final_filename} [{key}]')
+        ovr_files.extend(restored.get("ovr_files", []))
+        aux_files.extend(restored.get("aux_files", []))
+        return True
+
+    executed = gdalos_execute_plan(plan, logger=logger)
+    ret_code = all(job.state == JobState.done for job in executed)
+    ovr_files.extend(files["ovr_files"])
+    aux_files.extend(files["aux_files"])
+    if not ret_code:
+        temp_files.extend(files["temp_files"])
+        return None
+    files.pop("temp_files")
+    cache.store(key, final_filename, files, description=str(filename))
+    if verbose:
+        logger.info(f'stored in cache: {final_filename} [{key}]')
+    return True
+
+
+journal_key_ignored_args = cache_key_ignored_args
+
+
+def gdalos_trans_governed(governor: ResourceGovernor, all_args: dict,
+                          final_files: list, ovr_files: list, aux_files: list, temp_files: list):
+    """
+    runs gdalos_trans once the governor admits it, with the threads and the warp memory that it assigns.
+    explicit warp memory and disabled multi threading are kept.
+    """
+    logger = all_args["logger"]
+    verbose = logger is not None and logger is not ...
+    all_args = dict(all_args, governor=None)
+    with governor.admit() as resources:
+        if verbose:
+            logger.info(f'job resources: {resources}')
+        if all_args["multi_thread"] is not False:
+            all_args["multi_thread"] = resources.threads
+        warp_options = dict(all_args["warp_options"] or dict())
+        warp_options.setdefault("warpMemoryLimit", resources.warp_memory)
+        all_args["warp_options"] = warp_options
+        return gdalos_trans(**dict(all_args, final_files=final_files, ovr_files=ovr_files,
+                                   aux_files=aux_files, temp_files=temp_files))
+
+
+def gdalos_trans_journaled(journal: JobJournal, all_args: dict,
+                           final_files: list, ovr_files: list, aux_files: list, temp_files: list):
+    """
+    runs gdalos_trans through the journal: the job is keyed by the identity of its input files and by its args.
+    a job that is journaled as done, with intact outputs, is skipped.
+    otherwise, the files of a previous unfinished attempt (if any) are deleted,
+    the job is planned to learn the files it would make, journaled as running, then run and journaled as done/failed.
+    """
+    logger = all_args["logger"]
+    verbose = logger is not None and logger is not ...
+    filename = all_args["filename"]
+    all_args = dict(all_args, journal=None)
+    all_args.pop("plan", None)
+    identity = raster_identity(filename) if isinstance(filename, (str, Path)) else None
+    if identity is None:
+        if verbose:
+            logger.warning(f'input can not be journaled, running without the journal: {filename}')
+        return gdalos_trans(**dict(all_args, final_files=final_files, ovr_files=ovr_files,
+                                   aux_files=aux_files, temp_files=temp_files))
+    params = {k: v for k, v in all_args.items() if k not in journal_key_ignored_args}
+    key = make_key([identity, params])
+
+    entry = journal.get(key)
+    if entry is not None:
+        if journal.verify(entry):
+            if verbose:
+                logger.info(f'already done (by the journal): {filename} [{key}]')
+            final_files.extend(entry["files"].get("final_files", []))
+            ovr_files.extend(entry["files"].get("ovr_files", []))
+            aux_files.extend(entry["files"].get("aux_files", []))
+            return True
+        deleted = journal.cleanup(entry)
+        if verbose and deleted:
+            logger.warning(f'deleted the files of an unfinished attempt: {deleted}')
+    elif not all_args["overwrite"]:
+        files = dict(final_files=[], ovr_files=[], aux_files=[], temp_files=[])
+        gdalos_trans_plan(**dict(all_args, **files))
+        if files["final_files"] and all(os.path.isfile(f) for f in files["final_files"]):
+            # an output which was not made by a journaled run, it is kept as without the journal
+            final_files.extend(files["final_files"])
+            return True
+
+    # planning doesn't write the outputs (nor the cutline or the spec, which are made by the jobs),
+    # with overwrite all the files that the job would make are listed
+    files = dict(final_files=[], ovr_files=[], aux_files=[], temp_files=[])
+    gdalos_trans_plan(**dict(all_args, overwrite=True, **files))
+    journal.begin(key, params, files, description=str(filename))
+
+    run_files = dict(final_files=[], ovr_files=[], aux_files=[], temp_files=[])
+    ret_code = None
+    error = None
+    try:
+        ret_code = gdalos_trans(**dict(all_args, overwrite=True, **run_files))
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        if error is None and not ret_code:
+            error = 'failed'
+        journal.finish(key, run_files, error=error)
+        final_files.extend(run_files["final_files"])
+        ovr_files.extend(run_files["ovr_files"])
+        aux_files.extend(run_files["aux_files"])
+        temp_files.extend(run_files["temp_files"])
+    return ret_code
+
+
+def gdalos_trans_reported(report: RunReport, all_args: dict,
+                          final_files: list, ovr_files: list, aux_files: list, temp_files: list):
+    """
+    runs gdalos_trans with the given (new) report,
+    the resolve phase is closed also if the run ends early or fails, so the callback gets all the phases
+    """
+    try:
+        return gdalos_trans(**dict(all_args, report=report, final_files=final_files, ovr_files=ovr_files,
+                                   aux_files=aux_files, temp_files=temp_files))
+    finally:
+        report.stop('resolve')
+
+
+def gdalos_trans_dry_run(all_args: dict, print_report: bool = True) -> dict:
+    """
+    resolves all the parameters exactly as a real run would, without writing or opening any output,
+    and returns a report of the planned gdal calls, pixel counts, expected bytes per file and temp disk peak
+    """
+    files = dict(final_files=[], ovr_files=[], aux_files=[], temp_files=[])
+    all_args = dict(all_args, dry_run=True, cache=None, **files)
+    all_args.pop("plan", None)
+    plan = gdalos_trans_plan(**all_args)
+    report = get_plan_report(plan, temp_files=files["temp_files"])
+    report.update(files)
+    if print_report:
+        print_plan_report(report)
+    return report
+
+
+def gdalos_trans_from_vrt_levels(filename: PathLikeOrStr, ovr_filenames: Sequence[PathLikeOrStr], **kwargs):
+    """
+    runs gdalos_trans (i.e. the cog step) on a vrt that exposes the given (vrt) base raster and overview levels,
+    so the source pixels are warped once, directly into the output
+    """
+    vrt_path = gdalos_make_vrt_with_overviews(filename, ovr_filenames,
+                                              vrt_path=gdalos_util.concat_paths(filename, '.levels.vrt'))
+    try:
+        return gdalos_trans(vrt_path, **kwargs)
+    finally:
+        gdalos_delete_files([vrt_path])
+
+
+def gdalos_trans_plan(*args, **kwargs) -> GdalosPlan:
+    """
+    makes all the decisions of gdalos_trans (crs, extent, ovr_type, cog 2 steps, file names...)
+    and returns the jobs it would have performed, each with its dependencies and expected output size.
+    the plan can be inspected with `gdalos_plan.print_plan` and performed with `gdalos_plan.gdalos_execute_plan`
+    """
+    plan = []
+    gdalos_trans(*args, plan=plan, **kwargs)
+    return plan
+
+
+def gdalos_trans_step(
+        filename: PathOrDS,
+        out_filename: PathLikeOrStr,
+        trans_filename: Optional[PathLikeOrStr] = None,
+        ovr_idx: Optional[int] = None,
+        open_options: Optional[dict] = None,
+        vrt_options: Optional[dict] = None,
+        do_warp: bool = False,
+        trans_or_warp_is_needed: bool = True,
+        common_options: Optional[dict] = None,
+        warp_options: Optional[dict] = None,
+        translate_options: Optional[dict] = None,
+        config_options: Optional[dict] = None,
+        value_scale: Optional[Real] = None,
+        of: GdalOutputFormat = GdalOutputFormat.gtiff,
+        hide_nodatavalue: bool = False,
+        overwrite: bool = False,
+        return_ds: bool = False,
+        print_progress: Optional[bool] = None,
+        temp_files: Optional[list] = None,
+        quiet: bool = False,
+        logger=None,
+        report: Optional[RunReport] = None,
+        tile_copy: bool = False,
+        tile_copy_proj_win: Optional[Sequence[float]] = None,
+        big_tiff: Optional[str] = None,
+        cutline_wkt: Optional[Sequence[str]] = None,
+):
+    """
+    creates the base raster by a single gdal warp or translate (and value scaling), with resolved options.
+    if tile_copy, a tiff crop is first tried by copying the compressed tiles of the source,
+    of tile_copy_proj_win if given (the extent snapped to the tiles), otherwise of the projWin of the translate.
+    if cutline_wkt is given, the cutline file of the warp is first created from it (so planning doesn't write it)
+    """
+    verbose = logger is not None and logger is not ... and not quiet
+    if trans_filename is None:
+        trans_filename = out_filename
+    common_options = dict(common_options or dict())
+    warp_options = warp_options or dict()
+    translate_options = translate_options or dict()
+    config_options = config_options or dict()
+    if print_progress or print_progress is None:
+        common_options["callback"] = get_progress_callback(print_progress)
+
+    ds = gdalos_util.open_ds(filename, ovr_idx=ovr_idx, open_options=open_options, logger=logger)
+    vrt_path = None
+    if vrt_options:
+        if of == GdalOutputFormat.vrt:
+            # the output vrt references this vrt, so it is kept until the temp files are deleted
+            vrt_path, ds = gdalos_make_vrt(ds, vrt_path=gdalos_util.concat_paths(out_filename, '.bands.vrt'),
+                                           resampling_alg=..., vrt_options=vrt_options)
+        else:
+            vrt_path, ds = gdalos_make_vrt(ds, resampling_alg=..., vrt_options=vrt_options)
+    if out_filename and not str(out_filename).startswith('/vsimem/') and \
+            not os.path.exists(os.path.dirname(out_filename)):
+        os.makedirs(os.path.dirname(out_filename), exist_ok=True)
+    if cutline_wkt:
+        ogr_create_geometries_from_wkt(warp_options['cutlineDSName'], cutline_wkt, of='GPKG', srs=4326)
+    # pooled datasets of the files that are about to be written are stale
+    gdalos_util.invalidate_dataset(out_filename)
+    gdalos_util.invalidate_dataset(trans_filename)
+
+    ret_code = None
+    out_ds = None
+    tiles_copied = False
+    config_scope = gdalos_util.ScopedConfigOptions(config_options)
+    try:
+        if config_options:
+            if verbose:
+                logger.info("config options: " + str(config_options))
+            config_scope.set()
+
+        if tile_copy and not do_warp and value_scale is None and not vrt_options and \
+                of == GdalOutputFormat.gtiff and trans_filename == out_filename:
+            with report_phase(report, 'tile_copy'):
+                tiles_copied = gdalos_tiff_copy.tiff_copy_tiles(
+                    ds, out_filename, proj_win=tile_copy_proj_win or translate_options.get("projWin"),
+                    src_win=translate_options.get("srcWin"), big_tiff=big_tiff, logger=logger if verbose else None)
+        if tiles_copied:
+            out_ds = gdal.Open(str(out_filename))
+        elif do_warp:
+            if verbose and warp_options:
+                logger.info("warp options: " + str(warp_options))
+            with report_phase(report, 'warp'):
+                out_ds = gdal.Warp(str(trans_filename), ds, **common_options, **warp_options)
+
+            if out_ds is not None and value_scale is None and workaround_warp_scale_bug:
+                scale_raster.assign_same_scale_and_offset_values(out_ds, ds)
+        elif trans_or_warp_is_needed or value_scale is None:
+            if verbose and translate_options:
+                logger.info("translate options: " + str(translate_options))
+            with report_phase(report, 'translate'):
+                out_ds = gdal.Translate(str(trans_filename), ds, **common_options, **translate_options)
+        if value_scale is not None:
+            if temp_files is not None:
+                temp_files.append(trans_filename)
+            if verbose:
+                logger.info(f'scaling {out_filename}..."')
+            with report_phase(report, 'scale'):
+                out_ds = scale_raster.scale_raster(
+                    out_ds or ds, out_filename,
+                    scale=value_scale, format=enum_to_str(of),
+                    hide_nodata=hide_nodatavalue,
+                    creation_options_list=common_options.get("creationOptions"), overwrite=overwrite)
+        ret_code = out_ds is not None
+        if not return_ds:
+            out_ds = None  # close output ds
+        if not ret_code and logger is not None:
+            e = gdal.GetLastErrorMsg()
+            logger.error(str(e))
+    except Exception as e:
+        if verbose:
+            logger.error(str(e))
+    finally:
+        config_scope.restore()
+        ds = None
+        if vrt_path is not None and of != GdalOutputFormat.vrt:
+            gdal.Unlink(vrt_path)
+
+    if ret_code and hide_nodatavalue:
+        gdalos_util.unset_nodatavalue(out_ds or str(out_filename))
+        gdalos_util.invalidate_dataset(out_filename)
+    return out_ds or ret_code
+
+
+def get_out_size(ds: gdal.Dataset, common_options: dict, translate_options: dict,
+                 out_extent: Optional[GeoRectangle], pjstr_src_srs: str, pjstr_tgt_srs: Optional[str]) -> Tuple[int, int]:
+    """ returns the expected size (in pixels) of the output raster by the resolved options """
+    srcwin = translate_options.get("srcWin")
+    if srcwin is not None:
+        return int(srcwin[2]), int(srcwin[3])
+    do_warp = pjstr_tgt_srs is not None and not projdef.are_srs_equivalent(pjstr_src_srs, pjstr_tgt_srs)
+    res = common_options.get("xRes"), common_options.get("yRes")
+    if res[0] is None:
+        if do_warp:
+            # gdal would choose a resolution that keeps about the same number of pixels
+            return ds.RasterXSize, ds.RasterYSize
+        geo_transform = ds.GetGeoTransform()
+        res = geo_transform[1], geo_transform[5]
+    if out_extent is None:
+        transform = projdef.get_transform(pjstr_src_srs, pjstr_tgt_srs) if do_warp else None
+        out_extent = gdalos_extent.transform_extent(gdalos_extent.get_extent(ds), transform)
+    return math.ceil(abs(out_extent.w / res[0])), math.ceil(abs(out_extent.h / res[1]))
+
+
+def gdalos_delete_files(files: Sequence[PathLikeOrStr], filename: Optional[PathOrDS] = None,
+                        workspace: Optional[TempWorkspace] = None, missing_ok: bool = False, logger=None):
+    """ deletes the given (temp) files, the input `filename` is never deleted """
+    verbose = logger is not None and logger is not ...
+    for f in files:
+        if f == filename:
+            if verbose:
+                logger.error(f'somehow the input file was set as a temp file for deletion: "{f}")')
+        elif workspace is not None and f in workspace:
+            workspace.remove(f)
+        elif str(f).startswith('/vsimem/'):
+            gdalos_util.invalidate_dataset(f)
+            gdal.Unlink(str(f))
+        elif os.path.isfile(f):
+            try:
+                gdalos_util.invalidate_dataset(f)
+                os.remove(f)
+            except Exception as e:
+                if verbose:
+                    logger.warning('could not delete file: "{}" ({})'.format(f, str(e)))
+        elif verbose and not missing_ok:
+            logger.warning('file for deletion not found: "{}"'.format(f))
+
+
+def get_spec_logger(logger, spec_filename: PathLikeOrStr, mode: str) -> Tuple[logging.Logger, logging.Handler]:
+    """ returns a logger that writes to the spec file and propagates to the given logger, and its file handler """
+    spec_logger = logging.Logger(logger.name)
+    spec_logger.parent = logger
+    return spec_logger, gdalos_logger.set_file_logger(spec_logger, str(spec_filename), mode=mode)
+
+
+def gdalos_spec_begin(spec_filename: PathLikeOrStr, logger=None) -> bool:
+    """ starts the spec file of a planned run, the other jobs of the run append their logs to it """
+    if logger is None or logger is ...:
+        logger = logging.getLogger(__name__)
+    os.makedirs(os.path.dirname(spec_filename) or '.', exist_ok=True)
+    spec_logger, handler = get_spec_logger(logger, spec_filename, mode='w')
+    spec_logger.debug('spec file handler added: "{}"'.format(spec_filename))
+    spec_logger.debug("gdalos versoin: {}".format(gdalos_version))
+    handler.close()
+    return True
+
+
+def gdalos_job_with_spec(spec_func, spec_filename: PathLikeOrStr, logger=None, **kwargs):
+    """ runs a planned job, with its logs appended to the spec file of the run """
+    if logger is None or logger is ...:
+        return spec_func(logger=logger, **kwargs)
+    spec_logger, handler = get_spec_logger(logger, spec_filename, mode='a')
+    try:
+        return spec_func(logger=spec_logger, **kwargs)
+    finally:
+        spec_logger.removeHandler(handler)
+        handler.close()
+
+
 def add_ovr(
         filename,
         options,
@@ -1094,6 +1964,33 @@ def add_ovr(
 default_dst_ovr_count = 10
 
 
+def get_external_ovr_type(file_size: int, max_ovr_gb: Real = 1) -> OvrType:
+    """ returns the type of external overviews to create for a file of the given size """
+    if file_size > max_ovr_gb * 1024 ** 3:
+        return OvrType.create_external_multi
+    else:
+        return OvrType.create_external_single
+
+
+def get_ovr_filenames(filename, ovr_type: OvrType, dst_ovr_count=default_dst_ovr_count) -> List[Path]:
+    """
+    returns the names of the files that gdalos_ovr would report for the given ovr_type.
+    an auto ovr_type is decided only by the size of the file, so all the files it might make are returned.
+    """
+    if dst_ovr_count is None or dst_ovr_count <= 0:
+        dst_ovr_count = default_dst_ovr_count
+    out_filename = gdalos_util.concat_paths(filename, ".ovr")
+    if ovr_type in (OvrType.create_internal, OvrType.create_external_single):
+        return [out_filename]
+    elif ovr_type in (OvrType.create_external_multi, OvrType.auto_select, OvrType.create_external_auto):
+        ovr_filenames = []
+        for i in range(dst_ovr_count):
+            ovr_filenames.append(out_filename)
+            out_filename = gdalos_util.concat_paths(out_filename, ".ovr")
+        return ovr_filenames
+    return []
+
+
 def gdalos_ovr(
         filename,
         comp=None,
@@ -1107,6 +2004,7 @@ def gdalos_ovr(
         ovr_files: list = None,
         multi_thread: Union[bool, int, str] = True,
         print_progress: Optional[bool] = None,
+        pyramid: Optional[bool] = None,
         logger=None,
 ):
     verbose = logger is not None and logger is not ...
@@ -1116,6 +2014,8 @@ def gdalos_ovr(
 
     if not os.path.isfile(filename):
         raise Exception('file not found: "{}"'.format(filename))
+    # the overviews would be added to the file, so its pooled datasets are stale
+    gdalos_util.invalidate_dataset(filename)
 
     if dst_ovr_count is None or dst_ovr_count <= 0:
         dst_ovr_count = default_dst_ovr_count
@@ -1128,12 +2028,7 @@ def gdalos_ovr(
     elif ovr_type is None:
         ovr_type = OvrType.auto_select
     if ovr_type in [OvrType.auto_select, OvrType.create_external_auto]:
-        file_size = os.path.getsize(filename)
-        max_ovr_gb = 1
-        if file_size > max_ovr_gb * 1024 ** 3:
-            ovr_type = OvrType.create_external_multi
-        else:
-            ovr_type = OvrType.create_external_single
+        ovr_type = get_external_ovr_type(os.path.getsize(filename))
     elif ovr_type not in [
         OvrType.create_internal,
         OvrType.create_external_single,
@@ -1168,12 +2063,24 @@ def gdalos_ovr(
     else:
         config_options["COMPRESS_OVERVIEW"] = comp
 
+    config_scope = gdalos_util.ScopedConfigOptions(config_options)
     try:
         if config_options:
             if verbose:
                 logger.info("config options: " + str(config_options))
-            for k, v in config_options.items():
-                gdal.SetConfigOption(k, v)
+            config_scope.set()
+
+        if pyramid and \
+                ovr_type in (OvrType.create_external_single, OvrType.create_external_multi):
+            # all the external levels from a single read of the raster, unless it's not supported
+            pyramid_filenames = gdalos_pyramid.get_pyramid_filenames(filename, ovr_type, dst_ovr_count)
+            skipped = [do_skip_if_exists(f, overwrite, logger) for f in pyramid_filenames]
+            if not any(skipped):
+                ret_code = gdalos_pyramid.gdalos_pyramid(
+                    filename, ovr_type, dst_ovr_count, ovr_options.get("resampling"), ovr_files=ovr_files,
+                    callback=ovr_options.get("callback"), logger=logger)
+                if ret_code is not None:
+                    return ret_code
 
         out_filename = filename
         access_mode = gdal.GA_ReadOnly
@@ -1212,8 +2119,7 @@ def gdalos_ovr(
         else:
             raise Exception("invalid ovr type")
     finally:
-        for key, val in config_options.items():
-            gdal.SetConfigOption(key, None)
+        config_scope.restore()
     return ret_code
 
 
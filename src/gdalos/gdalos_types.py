@@ -54,6 +54,16 @@ class GdalOutputFormat(Enum):
     cog = auto()
     gpkg = auto()
     mem = auto()
+    vrt = auto()
+
+
+class TileFormat(Enum):
+    # a directory of z/x/y tile files
+    xyz = auto()
+    # an sqlite tile container (web mercator, tms rows)
+    mbtiles = auto()
+    # a geopackage tiles table
+    gpkg = auto()
 
 
 class RasterKind(Enum):
@@ -0,0 +1,310 @@
+import math
+import os
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from osgeo import gdal
+
+from osgeo_utils.auxiliary.util import PathLikeOrStr, PathOrDS
+from gdalos import gdalos_util, gdalos_extent, projdef
+from gdalos.gdalos_base import enum_to_str
+from gdalos.gdalos_pyramid import PyramidReducer, get_pyramid_resampling, gdal_array_type, default_strip_memory
+from gdalos.gdalos_types import MaybeSequence, RasterKind
+from gdalos.rectangle import GeoRectangle
+
+Window = Tuple[int, int, int, int]  # (col_start, row_start, col_end, row_end) in pixels, the ends are exclusive
+
+# the RasterIO resamplings, by which the overviews that gdal has built are recomputed
+rasterio_resamplings = {
+    'nearest': gdal.GRIORA_NearestNeighbour,
+    'average': gdal.GRIORA_Average,
+    'bilinear': gdal.GRIORA_Bilinear,
+    'cubic': gdal.GRIORA_Cubic,
+    'cubicspline': gdal.GRIORA_CubicSpline,
+    'lanczos': gdal.GRIORA_Lanczos,
+    'gauss': gdal.GRIORA_Gauss,
+    'mode': gdal.GRIORA_Mode,
+}
+rasterio_kernel_radius = 4  # output pixels on each side of a pixel which it depends on (lanczos, with a spare)
+
+
+def get_dirty_window(ds: gdal.Dataset, extent: GeoRectangle) -> Optional[Window]:
+    """ returns the pixel window of the extent (in the srs of the dataset), expanded to whole blocks """
+    gt = ds.GetGeoTransform()
+    if gt[2] or gt[4]:
+        raise Exception('rotated rasters are not supported')
+    cols = sorted(((extent.min_x - gt[0]) / gt[1], (extent.max_x - gt[0]) / gt[1]))
+    rows = sorted(((extent.min_y - gt[3]) / gt[5], (extent.max_y - gt[3]) / gt[5]))
+    x0, x1 = max(0, math.floor(cols[0])), min(ds.RasterXSize, math.ceil(cols[1]))
+    y0, y1 = max(0, math.floor(rows[0])), min(ds.RasterYSize, math.ceil(rows[1]))
+    if x0 >= x1 or y0 >= y1:
+        return None
+    bw, bh = ds.GetRasterBand(1).GetBlockSize()
+    return (x0 // bw * bw, y0 // bh * bh,
+            min(ds.RasterXSize, -(-x1 // bw) * bw), min(ds.RasterYSize, -(-y1 // bh) * bh))
+
+
+def get_reduced_window(window: Window, out_size: Tuple[int, int], min_offset: int, max_offset: int) -> Window:
+    """
+    returns the window of a reduced (by 2) raster which depends on the given window of its input,
+    where the output pixel j depends on the input pixels [2*j+min_offset, 2*j+max_offset]
+    """
+    x0, y0, x1, y1 = window
+    return (max(0, -((max_offset - x0) // 2)), max(0, -((max_offset - y0) // 2)),
+            min(out_size[0], (x1 - 1 - min_offset) // 2 + 1), min(out_size[1], (y1 - 1 - min_offset) // 2 + 1))
+
+
+def get_window_strip_rows(width: int, band_count: int, strip_memory: int = default_strip_memory) -> int:
+    # the float64 temporaries of the reducer take about this many times the pixels of a strip
+    return max(16, strip_memory // max(1, width * band_count * 8 * 8))
+
+
+def get_overview_levels(filename: PathLikeOrStr, ds: gdal.Dataset) -> Tuple[List[List[gdal.Band]], list]:
+    """
+    returns the bands of each overview level of the dataset (which was opened for update),
+    and the datasets which hold them (which should be kept open while the bands are used)
+    """
+    chain = []
+    ovr_filename = gdalos_util.concat_paths(filename, '.ovr')
+    while os.path.isfile(ovr_filename):
+        chain.append(ovr_filename)
+        ovr_filename = gdalos_util.concat_paths(ovr_filename, '.ovr')
+    if len(chain) > 1:
+        # an external multi chain (.ovr.ovr...), each file holds a single level
+        datasets = [gdal.Open(str(f), gdal.GA_Update) for f in chain]
+        if any(d is None for d in datasets):
+            raise Exception('failed to open the overviews of {} for update'.format(filename))
+        return [[d.GetRasterBand(i + 1) for i in range(d.RasterCount)] for d in datasets], datasets
+    # internal overviews or an external single .ovr (which gdal opens for update with the dataset)
+    bands = [ds.GetRasterBand(i + 1) for i in range(ds.RasterCount)]
+    return [[band.GetOverview(i) for band in bands] for i in range(bands[0].GetOverviewCount())], []
+
+
+def update_base(ds: gdal.Dataset, src_ds: Sequence[gdal.Dataset], window: Window, warp_options: dict,
+                strip_rows: int):
+    """ warps the sources into the window of the dataset, the pixels which the sources don't cover are kept """
+    x0, y0, x1, y1 = window
+    bands = [ds.GetRasterBand(i + 1) for i in range(ds.RasterCount)]
+    for row in range(y0, y1, strip_rows):
+        rows = min(strip_rows, y1 - row)
+        # the current pixels (with the georeference, nodata and color interpretation) of the strip
+        mem_ds = gdal.Translate('', ds, format='MEM', srcWin=[x0, row, x1 - x0, rows])
+        if mem_ds is None or gdal.Warp(mem_ds, list(src_ds), **warp_options) is None:
+            raise Exception('failed to warp the sources into the rows {}-{}'.format(row, row + rows))
+        for band, arr in zip(bands, mem_ds.ReadAsArray().reshape((len(bands), rows, x1 - x0))):
+            band.WriteArray(arr, x0, row)
+        mem_ds = None
+
+
+def update_level(src_bands: Sequence[gdal.Band], dst_bands: Sequence[gdal.Band], window: Window,
+                 resampling: str, strip_memory: int = default_strip_memory) -> Optional[Window]:
+    """
+    recomputes the part of the overview level (dst_bands) which depends on the given window of its input
+    (src_bands, the previous level) by the reducer of the pyramid builder, returns the recomputed window of the level
+    """
+    in_size = (src_bands[0].XSize, src_bands[0].YSize)
+    out_size = (dst_bands[0].XSize, dst_bands[0].YSize)
+    if out_size != ((in_size[0] + 1) // 2, (in_size[1] + 1) // 2):
+        raise Exception('unexpected overview size: {} for an input of size {}'.format(out_size, in_size))
+    if get_pyramid_resampling(resampling) is None:
+        raise Exception('unsupported overview resampling: {}'.format(resampling))
+    reducer = PyramidReducer(get_pyramid_resampling(resampling),
+                             [band.GetNoDataValue() for band in src_bands], gdal_array_type(src_bands[0].DataType))
+    min_offset, max_offset = min(reducer.offsets + [0]), max(reducer.offsets + [1])
+    out_window = get_reduced_window(window, out_size, min_offset, max_offset)
+    j0, i0, j1, i1 = out_window
+    if j0 >= j1 or i0 >= i1:
+        return None
+    in_x0, in_x1 = max(0, 2 * j0 + min_offset), min(in_size[0], 2 * (j1 - 1) + max_offset + 1)
+    strip_rows = get_window_strip_rows(in_x1 - in_x0, len(src_bands), strip_memory) // 2
+    for i in range(i0, i1, strip_rows):
+        count = min(strip_rows, i1 - i)
+        in_y0, in_y1 = max(0, 2 * i + min_offset), min(in_size[1], 2 * (i + count - 1) + max_offset + 1)
+        arr = np.stack([band.ReadAsArray(in_x0, in_y0, in_x1 - in_x0, in_y1 - in_y0) for band in src_bands])
+        out = reducer.reduce(arr, in_y0, in_size, i, count, in_x0, j0, j1 - j0)
+        for band, band_rows in zip(dst_bands, out):
+            band.WriteArray(band_rows, j0, i)
+    return out_window
+
+
+def update_level_resampled(src_bands: Sequence[gdal.Band], dst_bands: Sequence[gdal.Band], window: Window,
+                           resampling: str, strip_memory: int = default_strip_memory) -> Optional[Window]:
+    """
+    recomputes the part of the overview level (dst_bands) which depends on the given window of its input
+    (src_bands, the base raster or a previous level) by gdal RasterIO resampling, as gdal builds overviews,
+    returns the recomputed window of the level
+    """
+    if resampling not in rasterio_resamplings:
+        raise Exception('unsupported overview resampling: {}'.format(resampling))
+    in_size = (src_bands[0].XSize, src_bands[0].YSize)
+    out_size = (dst_bands[0].XSize, dst_bands[0].YSize)
+    # the output pixel j is resampled from the input pixels around (j + 0.5) * ratio,
+    # where the ratio is of the whole rasters (i.e. not exactly 2 for odd sizes)
+    ratios = (in_size[0] / out_size[0], in_size[1] / out_size[1])
+    x0, y0, x1, y1 = window
+    j0 = max(0, math.floor(x0 / ratios[0] - 0.5) - rasterio_kernel_radius)
+    i0 = max(0, math.floor(y0 / ratios[1] - 0.5) - rasterio_kernel_radius)
+    j1 = min(out_size[0], math.ceil(x1 / ratios[0] - 0.5) + rasterio_kernel_radius)
+    i1 = min(out_size[1], math.ceil(y1 / ratios[1] - 0.5) + rasterio_kernel_radius)
+    out_window = (j0, i0, j1, i1)
+    if j0 >= j1 or i0 >= i1:
+        return None
+    strip_rows = max(1, get_window_strip_rows(
+        math.ceil((j1 - j0) * ratios[0]), len(src_bands), strip_memory) // math.ceil(ratios[1]))
+    for i in range(i0, i1, strip_rows):
+        count = min(strip_rows, i1 - i)
+        # a floating point window of the input, so the pixels are sampled as in the whole raster
+        in_x0, in_y0 = j0 * ratios[0], i * ratios[1]
+        in_x1, in_y1 = min(in_size[0], j1 * ratios[0]), min(in_size[1], (i + count) * ratios[1])
+        for src_band, dst_band in zip(src_bands, dst_bands):
+            arr = src_band.ReadAsArray(in_x0, in_y0, in_x1 - in_x0, in_y1 - in_y0, j1 - j0, count,
+                                       resample_alg=rasterio_resamplings[resampling])
+            dst_band.WriteArray(arr, j0, i)
+    return out_window
+
+
+def clear_statistics(bands: Sequence[gdal.Band]):
+    # the statistics of the updated bands are stale
+    for band in bands:
+        metadata = band.GetMetadata()
+        if any(k.startswith('STATISTICS_') for k in metadata):
+            band.SetMetadata({k: v for k, v in metadata.items() if not k.startswith('STATISTICS_')})
+
+
+def relayout_cog(filename: PathLikeOrStr, logger=None) -> bool:
+    """
+    rewrites an updated cog (which gdal updates in place as a plain tiff, with the changed blocks appended)
+    in the cog layout, keeping its overviews
+    """
+    verbose = logger is not None and logger is not ...
+    filename = Path(filename)
+    ds = gdal.Open(str(filename))
+    comp = gdalos_util.get_image_structure_metadata(ds, 'COMPRESSION')
+    predictor = gdalos_util.get_image_structure_metadata(ds, 'PREDICTOR')
+    creation_options = ['OVERVIEWS=FORCE_USE_EXISTING', 'BIGTIFF=IF_SAFER',
+                        'BLOCKSIZE={}'.format(ds.GetRasterBand(1).GetBlockSize()[0])]
+    if comp:
+        creation_options.append('COMPRESS={}'.format('JPEG' if comp == 'YCbCr JPEG' else comp))
+    if predictor and predictor != '1':
+        creation_options.append('PREDICTOR={}'.format(predictor))
+    temp_filename = gdalos_util.concat_paths(filename, '.relayout.tif')
+    if verbose:
+        logger.info('rewriting "{}" as a cog, creation options: {}'.format(filename, creation_options))
+    out_ds = gdal.Translate(str(temp_filename), ds, format='COG', creationOptions=creation_options)
+    ok = out_ds is not None
+    out_ds = ds = None
+    if not ok:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        return False
+    gdalos_util.invalidate_dataset(filename)
+    os.replace(temp_filename, filename)
+    return True
+
+
+def gdalos_update(
+        filename: PathLikeOrStr,
+        src: MaybeSequence[PathOrDS],
+        extent: GeoRectangle,
+        extent_in_4326: Optional[bool] = None,
+        resampling_alg=None,
+        ovr_resampling_alg=None,
+        kind: Optional[RasterKind] = None,
+        multi_thread: Union[bool, int, str] = True,
+        warp_options: Optional[dict] = None,
+        cog_relayout: Optional[bool] = None,
+        pyramid: Optional[bool] = None,
+        strip_memory: int = default_strip_memory,
+        logger=None,
+) -> Optional[Window]:
+    """
+    updates the dirty extent of an existing output (a tiff or a cog, made by gdalos_trans) from its (updated) sources,
+    then recomputes only the parts of the overviews (internal, an external single .ovr or a multi .ovr chain)
+    which depend on it, level by level.
+    the blocks of the output which intersect the extent are warped again from the sources into the output grid,
+    the output pixels which the sources don't cover are kept (so the sources might be only the changed patch).
+    the output is expected to be a plain warp of its sources (i.e. no value scaling).
+    the overviews are recomputed by gdal RasterIO resampling, as gdal has built them,
+    or by the reducers of the pyramid builder if they were built by it (pyramid=True, as given to gdalos_trans).
+    a cog is updated in place as a tiff: the changed blocks are appended, so the file grows with each update
+    and is no longer in the cog layout (it is still a valid tiff).
+    if cog_relayout, it is then rewritten in the cog layout, which costs a read and a write of the whole file.
+    returns the updated pixel window of the output, or None if the extent doesn't intersect it.
+    """
+    verbose = logger is not None and logger is not ...
+    filename = Path(filename)
+    if not os.path.isfile(filename):
+        raise Exception('file not found: "{}"'.format(filename))
+    if extent_in_4326 is None:
+        extent_in_4326 = True
+    if cog_relayout is None:
+        cog_relayout = False
+    if warp_options is None:
+        warp_options = dict()
+    src = gdalos_util.open_ds(src if gdalos_util.is_list_like(src) else [src])
+
+    # the output is opened as a tiff, as a cog can't be updated by the COG driver
+    gdalos_util.invalidate_dataset(filename)
+    ds = gdal.OpenEx(str(filename), gdal.OF_RASTER | gdal.OF_UPDATE, allowed_drivers=['GTiff'])
+    if ds is None:
+        raise Exception('failed to open "{}" for update'.format(filename))
+    is_cog = gdalos_util.get_image_structure_metadata(ds, 'LAYOUT') == 'COG'
+    if extent_in_4326:
+        transform = projdef.get_transform(projdef.get_srs_pj(4326), projdef.get_srs_pj(ds))
+        extent = gdalos_extent.transform_extent(extent, transform)
+    window = get_dirty_window(ds, extent)
+    if window is None:
+        if verbose:
+            logger.warning('the extent {} does not intersect "{}"'.format(extent, filename))
+        return None
+
+    if kind in [None, ...]:
+        kind = RasterKind.guess(src[0])
+    if resampling_alg is None:
+        resampling_alg = kind.resampling_alg_by_kind()
+    if ovr_resampling_alg is None:
+        ovr_resampling_alg = kind.resampling_alg_by_kind()
+    elif ovr_resampling_alg is ...:
+        ovr_resampling_alg = 'nearest'  # gdal's default overview resampling
+    warp_options = dict(warp_options)
+    if resampling_alg is not ...:
+        warp_options.setdefault('resampleAlg', enum_to_str(resampling_alg))
+    if multi_thread:
+        warp_options.setdefault('multithread', True)
+        warp_options.setdefault('warpOptions', ['NUM_THREADS={}'.format(
+            'ALL_CPUS' if isinstance(multi_thread, bool) else multi_thread)])
+
+    if verbose:
+        logger.info('updating the window {} of "{}"'.format(window, filename))
+    bands = [ds.GetRasterBand(i + 1) for i in range(ds.RasterCount)]
+    update_base(ds, src, window, warp_options,
+                get_window_strip_rows(window[2] - window[0], len(bands), strip_memory))
+    clear_statistics(bands)
+
+    levels, level_datasets = get_overview_levels(filename, ds)
+    level_window = window
+    src_bands = bands
+    ovr_resampling = get_pyramid_resampling(ovr_resampling_alg) or enum_to_str(ovr_resampling_alg).lower()
+    pyramid = bool(pyramid and get_pyramid_resampling(ovr_resampling) is not None)
+    # gdal computes each level from the previous one, but the nearest levels from the base
+    cascading = pyramid or ovr_resampling != 'nearest'
+    for i, dst_bands in enumerate(levels):
+        update_func = update_level if pyramid else update_level_resampled
+        out_window = update_func(src_bands, dst_bands, level_window, ovr_resampling, strip_memory)
+        if out_window is None:
+            break
+        if verbose:
+            logger.debug('updated the window {} of overview {}'.format(out_window, i + 1))
+        if cascading:
+            src_bands, level_window = dst_bands, out_window
+    levels = src_bands = bands = None
+    for level_ds in level_datasets:
+        level_ds.FlushCache()
+    level_datasets = None
+    ds.FlushCache()
+    ds = None
+
+    if is_cog and cog_relayout and not relayout_cog(filename, logger):
+        raise Exception('failed to rewrite "{}" as a cog'.format(filename))
+    return window
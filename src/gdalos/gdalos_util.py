@@ -1,4 +1,5 @@
 import glob
+from functools import wraps
 from pathlib import Path
 
 from gdalos.backports.ogr_utils import ogr_create_geometries_from_wkt
@@ -9,12 +10,38 @@ from osgeo_utils.auxiliary.raster_creation import *  # noqa
 # backwards compatibility
 from osgeo_utils.auxiliary.raster_creation import get_creation_options  # noqa
 
+# datasets are opened through the dataset pool, if it is enabled
+from gdalos.gdalos_pool import OpenDS, get_dataset_pool, invalidate_dataset  # noqa
+
 print_progress_callback = get_progress_callback
 wkt_write_ogr = ogr_create_geometries_from_wkt
 get_big_tiff = get_bigtiff_creation_option_value
 get_tiled = is_true
 
 
+def open_ds(filename_or_ds: MaybeSequence[PathOrDS], *args, **kwargs) -> MaybeSequence[gdal.Dataset]:
+    if not isinstance(filename_or_ds, PathOrDS.__args__):
+        return [open_ds(f, *args, **kwargs) for f in filename_or_ds]
+    ods = OpenDS(filename_or_ds, *args, **kwargs)
+    return ods.__enter__()
+
+
+def with_pooled_ds(func):
+    # opens the first argument through the dataset pool, if it is a path and the pool is enabled
+    @wraps(func)
+    def wrapper(filename_or_ds, *args, **kwargs):
+        if get_dataset_pool() is not None and is_path_like(filename_or_ds):
+            filename_or_ds = open_ds(filename_or_ds)
+        return func(filename_or_ds, *args, **kwargs)
+    return wrapper
+
+
+get_band_types = with_pooled_ds(get_band_types)
+get_ovr_count = with_pooled_ds(get_ovr_count)
+get_metadata_item = with_pooled_ds(get_metadata_item)
+get_image_structure_metadata = with_pooled_ds(get_image_structure_metadata)
+
+
 def is_list_like(lst: Sequence) -> bool:
     return isinstance(lst, Sequence) and not isinstance(lst, str)
 
@@ -66,6 +93,44 @@ def flatten_and_expand_file_list(lst, do_expand_txt=True, do_expand_glob: Option
     return flat_list
 
 
+class ScopedConfigOptions(object):
+    """
+    sets gdal config options for the current thread only, and restores their previous values,
+    so concurrent calls (on different threads) don't see (or reset) each other's options.
+    note: threads which are started by gdal itself (i.e. NUM_THREADS workers) don't see thread local options.
+    """
+    __slots__ = ['config_options', 'prev']
+
+    def __init__(self, config_options: Optional[dict] = None):
+        self.config_options = config_options or dict()
+        self.prev = None
+
+    def set(self):
+        if self.prev is not None or not self.config_options:
+            return
+        set_option = getattr(gdal, 'SetThreadLocalConfigOption', gdal.SetConfigOption)
+        get_option = getattr(gdal, 'GetThreadLocalConfigOption', None)
+        self.prev = dict()
+        for k, v in self.config_options.items():
+            self.prev[k] = get_option(k, None) if get_option is not None else None
+            set_option(k, v)
+
+    def restore(self):
+        if self.prev is None:
+            return
+        set_option = getattr(gdal, 'SetThreadLocalConfigOption', gdal.SetConfigOption)
+        for k, v in self.prev.items():
+            set_option(k, v)
+        self.prev = None
+
+    def __enter__(self):
+        self.set()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.restore()
+
+
 def do_skip_if_exists(out_filename, overwrite, logger=None):
     verbose = logger not in [None,  ...]
     skip = False
@@ -77,6 +142,7 @@ def do_skip_if_exists(out_filename, overwrite, logger=None):
         else:
             if verbose:
                 logger.warning('file "{}" exists, deleting...!'.format(out_filename))
+            invalidate_dataset(out_filename)
             os.remove(out_filename)
     return skip
 
@@ -3,6 +3,7 @@ import os
 import re
 import shutil
 import uuid
+import xml.etree.ElementTree as ET
 from collections import defaultdict
 from pathlib import Path
 from typing import List, Optional
@@ -353,6 +354,54 @@ def gdalos_make_vrt(
     return vrt_path, ds
 
 
+def vsi_read_text(filename) -> str:
+    # works for /vsimem/ files as well as for regular files
+    filename = str(filename)
+    f = gdal.VSIFOpenL(filename, 'rb')
+    if f is None:
+        raise Exception('could not open file: "{}"'.format(filename))
+    try:
+        size = gdal.VSIStatL(filename).size
+        return gdal.VSIFReadL(1, size, f).decode()
+    finally:
+        gdal.VSIFCloseL(f)
+
+
+def vsi_write_text(filename, text: str):
+    filename = str(filename)
+    f = gdal.VSIFOpenL(filename, 'wb')
+    if f is None:
+        raise Exception('could not create file: "{}"'.format(filename))
+    try:
+        data = text.encode()
+        gdal.VSIFWriteL(data, 1, len(data), f)
+    finally:
+        gdal.VSIFCloseL(f)
+
+
+def gdalos_make_vrt_with_overviews(filename, ovr_filenames: List, vrt_path=None):
+    """
+    creates a vrt over the given raster (i.e. a warped vrt) with explicit <Overview> elements
+    for each of the given overview rasters (ordered from the largest to the smallest)
+    """
+    if vrt_path is None:
+        vrt_path = f'/vsimem/{uuid.uuid4()}.vrt'
+    vrt_path = str(vrt_path)
+    ds = gdal.BuildVRT(vrt_path, [str(filename)])
+    if ds is None:
+        raise Exception("Error! cannot create vrt. Cannot proceed")
+    ds = None
+    root = ET.fromstring(vsi_read_text(vrt_path))
+    for band in root.findall('VRTRasterBand'):
+        band_num = band.get('band')
+        for ovr_filename in ovr_filenames:
+            ovr = ET.SubElement(band, 'Overview')
+            ET.SubElement(ovr, 'SourceFilename', relativeToVRT='0').text = str(ovr_filename)
+            ET.SubElement(ovr, 'SourceBand').text = band_num
+    vsi_write_text(vrt_path, ET.tostring(root, encoding='unicode'))
+    return vrt_path
+
+
 if __name__ == '__main__':
     parent_dir = Path(r'd:\Maps.progress\osm')
     make_overviews_vrt_dir(parent_dir / 'wikimedia-3857.xml')
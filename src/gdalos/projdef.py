@@ -5,6 +5,9 @@ from gdalos.backports.osr_util2 import *  # noqa
 from gdalos.backports.osr_utm_util import *  # noqa
 from gdalos.talos_osr import *  # noqa
 from osgeo_utils.auxiliary import osr_util  # noqa
+# memoized versions
+from gdalos.srs_registry import srs_registry, get_srs, get_srs_pj, are_srs_equivalent, get_transform, \
+    get_transformer, parse_proj_string_and_zone, get_proj_string  # noqa
 
 get_srs_from_ds = get_srs
 get_proj4_string = get_proj_string
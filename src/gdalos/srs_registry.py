@@ -0,0 +1,159 @@
+import threading
+from numbers import Real
+from typing import Callable, Dict, Hashable, Optional, Union
+
+from osgeo import gdal, osr
+
+from osgeo_utils.auxiliary import osr_util
+from osgeo_utils.auxiliary.osr_util import AnySRS, OAMS_AXIS_ORDER, get_default_axis_order
+from gdalos import talos_osr
+
+default_max_size = 256  # max items of each kind per thread
+
+
+class SRSRegistry(object):
+    """
+    memoizes srs objects, coordinate transformations and the results of srs queries.
+    osr/proj objects must not be shared between threads, so each thread has its own caches,
+    while the hit/miss counters are shared.
+    the cached objects are shared between the callers (of the same thread), thus should not be modified.
+    """
+    __slots__ = ['max_size', 'local', 'lock', 'generation', 'hits', 'misses']
+
+    def __init__(self, max_size: int = default_max_size):
+        self.max_size = max_size
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits: Dict[str, int] = dict()
+        self.misses: Dict[str, int] = dict()
+
+    def get_cache(self, kind: str) -> dict:
+        local = self.local
+        if getattr(local, 'generation', None) != self.generation:
+            local.generation = self.generation
+            local.caches = dict()
+        cache = local.caches.get(kind)
+        if cache is None:
+            cache = local.caches[kind] = dict()
+        return cache
+
+    def count(self, counters: Dict[str, int], kind: str):
+        with self.lock:
+            counters[kind] = counters.get(kind, 0) + 1
+
+    def get(self, kind: str, key: Optional[Hashable], factory: Callable):
+        """ returns the cached value of the key, or a new one from the factory. None key is not cached """
+        if key is None:
+            return factory()
+        cache = self.get_cache(kind)
+        if key in cache:
+            self.count(self.hits, kind)
+            return cache[key]
+        self.count(self.misses, kind)
+        value = factory()
+        if len(cache) >= self.max_size:
+            cache.clear()
+        cache[key] = value
+        return value
+
+    def clear(self):
+        """ drops the caches of all the threads (each thread drops its own on its next access) """
+        with self.lock:
+            self.generation += 1
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits.clear()
+            self.misses.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {kind: dict(hits=self.hits.get(kind, 0), misses=self.misses.get(kind, 0))
+                    for kind in sorted(set(self.hits) | set(self.misses))}
+
+    def print(self):
+        for kind, stats in self.stats().items():
+            print('{}: hits: {} misses: {}'.format(kind, stats['hits'], stats['misses']))
+
+
+srs_registry = SRSRegistry()
+
+
+def get_srs_key(srs_like: AnySRS) -> Optional[Hashable]:
+    """ returns a hashable key that identifies the srs, or None if the srs should not be cached """
+    if isinstance(srs_like, (str, int)) and not isinstance(srs_like, bool):
+        return type(srs_like), srs_like
+    if isinstance(srs_like, gdal.Dataset):
+        return str, srs_like.GetProjection()
+    # srs objects are mutable, so they are not used as keys
+    return None
+
+
+def get_srs(srs_like: AnySRS, axis_order: Optional[OAMS_AXIS_ORDER] = None) -> osr.SpatialReference:
+    key = get_srs_key(srs_like)
+    if key is None:
+        return osr_util.get_srs(srs_like, axis_order)
+    if axis_order is None:
+        axis_order = get_default_axis_order()
+    return srs_registry.get('srs', (key, axis_order), lambda: osr_util.get_srs(srs_like, axis_order))
+
+
+def get_srs_pj(srs: AnySRS) -> str:
+    return srs_registry.get('srs_pj', get_srs_key(srs), lambda: get_srs(srs).ExportToProj4())
+
+
+def are_srs_equivalent(srs1: AnySRS, srs2: AnySRS) -> bool:
+    if srs1 == srs2:
+        return True
+    key1 = get_srs_key(srs1)
+    key2 = get_srs_key(srs2)
+    key = None if key1 is None or key2 is None else (key1, key2)
+    return srs_registry.get('srs_equivalent', key, lambda: get_srs(srs1).IsSame(get_srs(srs2)))
+
+
+def get_transform(src_srs: AnySRS, tgt_srs: AnySRS) -> Optional[osr.CoordinateTransformation]:
+    def make_transform():
+        src = get_srs(src_srs)
+        tgt = get_srs(tgt_srs)
+        return None if src.IsSame(tgt) else osr.CoordinateTransformation(src, tgt)
+
+    key1 = get_srs_key(src_srs)
+    key2 = get_srs_key(tgt_srs)
+    key = None if key1 is None or key2 is None else (key1, key2, get_default_axis_order())
+    return srs_registry.get('transform', key, make_transform)
+
+
+def get_transformer(src_srs, tgt_srs, always_xy: bool = False):
+    """ returns a pyproj Transformer between the given crs (which are given in a form that pyproj accepts) """
+    from pyproj.transformer import Transformer
+    try:
+        key = (src_srs, tgt_srs, always_xy)
+        hash(key)
+    except TypeError:
+        key = None
+    return srs_registry.get('transformer', key,
+                            lambda: Transformer.from_crs(src_srs, tgt_srs, always_xy=always_xy))
+
+
+def parse_proj_string_and_zone(talos_pj: Optional[Union[str, Real]], zone: Optional[Real] = None, **kwargs):
+    try:
+        # the types are a part of the key, as i.e. 4326 and 4326.0 are parsed differently
+        key = (type(talos_pj), talos_pj, type(zone), zone, tuple(sorted(kwargs.items())))
+        hash(key)
+    except TypeError:
+        key = None
+    return srs_registry.get('proj_string', key,
+                            lambda: talos_osr.parse_proj_string_and_zone(talos_pj, zone, **kwargs))
+
+
+def get_proj_string(talos_pj: Optional[Union[str, Real]], zone: Optional[Real] = None, **kwargs) -> str:
+    pj_string, _ = parse_proj_string_and_zone(talos_pj, zone, **kwargs)
+    return pj_string
+
+
+def get_tmerc_proj(zone_lon0: Real):
+    """ returns a pyproj Proj of a transverse mercator with the utm parameters around the given meridian """
+    from pyproj import Proj
+    return srs_registry.get('tmerc_proj', float(zone_lon0), lambda: Proj(
+        proj='tmerc', k=0.9996, lon_0=zone_lon0, x_0=500000, ellps='WGS84', preserve_units=False))
@@ -1,5 +1,7 @@
+from typing import Optional, Sequence
+
 import numpy as np
-from osgeo import gdal
+from osgeo import gdal, osr
 
 from gdalos import gdalos_color
 from gdalos.gdalos_color import ColorPalette
@@ -31,6 +33,76 @@ def test_data_generator(filename, levels=10, of='GTiff', color_palette: ColorPal
         ds.FlushCache()
 
 
+default_strip_rows = 256  # rows that are generated and written at once, so the raster size is not bound by memory
+
+
+def create_synthetic_ds(filename, size: int, bands: int, gdal_dtype, pixel_size: float, epsg: int,
+                        origin: Sequence[float], of: str = 'GTiff',
+                        creation_options: Optional[Sequence[str]] = None) -> gdal.Dataset:
+    driver = gdal.GetDriverByName(of)
+    if creation_options is None:
+        creation_options = ['TILED=YES', 'BIGTIFF=IF_SAFER'] if of == 'GTiff' else []
+    ds = driver.Create(str(filename), xsize=size, ysize=size, bands=bands, eType=gdal_dtype,
+                       options=list(creation_options))
+    ds.SetGeoTransform([origin[0], pixel_size, 0, origin[1], 0, -pixel_size])
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    ds.SetProjection(srs.ExportToWkt())
+    return ds
+
+
+def synthetic_terrain(rows: np.ndarray, cols: np.ndarray, size: int, seed: int, strip_idx: int) -> np.ndarray:
+    """ returns smooth hills (a sum of waves) with some noise, the same for the same size, seed and strip """
+    y = rows[:, np.newaxis] / size * 2 * np.pi
+    x = cols[np.newaxis, :] / size * 2 * np.pi
+    z = 400 + 300 * np.sin(x * 3) * np.cos(y * 2) + 120 * np.sin(x * 11 + y * 7) + 40 * np.cos(x * 29 - y * 23)
+    rng = np.random.default_rng([seed, strip_idx])
+    return z + rng.normal(0, 2, z.shape)
+
+
+def make_synthetic_dtm(filename, size: int = 4096, pixel_size: float = 10, epsg: int = 32636,
+                       origin: Sequence[float] = (600000, 3500000), nodata: float = -32768,
+                       seed: int = 0, strip_rows: int = default_strip_rows, of: str = 'GTiff',
+                       creation_options: Optional[Sequence[str]] = None):
+    """
+    creates a reproducible synthetic Float32 dtm of size x size pixels.
+    it is written strip by strip, so it could scale to multi GB rasters.
+    """
+    ds = create_synthetic_ds(filename, size, 1, gdal.GDT_Float32, pixel_size, epsg, origin, of, creation_options)
+    bnd = ds.GetRasterBand(1)
+    bnd.SetNoDataValue(nodata)
+    cols = np.arange(size)
+    for strip_idx, row in enumerate(range(0, size, strip_rows)):
+        rows = np.arange(row, min(row + strip_rows, size))
+        arr = synthetic_terrain(rows, cols, size, seed, strip_idx).astype(np.float32)
+        bnd.WriteArray(arr, 0, row)
+    ds.FlushCache()
+    return filename
+
+
+def make_synthetic_rgb(filename, size: int = 4096, pixel_size: float = 1, epsg: int = 32636,
+                       origin: Sequence[float] = (600000, 3500000),
+                       seed: int = 0, strip_rows: int = default_strip_rows, of: str = 'GTiff',
+                       creation_options: Optional[Sequence[str]] = None):
+    """
+    creates a reproducible synthetic 3 band (Byte) image of size x size pixels, a shaded terrain with a grid.
+    it is written strip by strip, so it could scale to multi GB rasters.
+    """
+    ds = create_synthetic_ds(filename, size, 3, gdal.GDT_Byte, pixel_size, epsg, origin, of, creation_options)
+    cols = np.arange(size)
+    for strip_idx, row in enumerate(range(0, size, strip_rows)):
+        rows = np.arange(row, min(row + strip_rows, size))
+        z = synthetic_terrain(rows, cols, size, seed, strip_idx)
+        shade = (z + 100) / 1000 * 255  # the terrain is within about -100..900
+        grid = ((rows[:, np.newaxis] % 128 == 0) | (cols[np.newaxis, :] % 128 == 0)) * 64
+        for band_idx, arr in enumerate([shade, shade * 0.8 + grid, 255 - shade * 0.6]):
+            ds.GetRasterBand(band_idx + 1).WriteArray(np.clip(arr, 0, 255).astype(np.uint8), 0, row)
+    for band_idx, color_interp in enumerate([gdal.GCI_RedBand, gdal.GCI_GreenBand, gdal.GCI_BlueBand]):
+        ds.GetRasterBand(band_idx + 1).SetColorInterpretation(color_interp)
+    ds.FlushCache()
+    return filename
+
+
 if __name__ == '__main__':
     filename = r'd:\Maps.temp\test.tif'
     test_data_generator(filename=filename)
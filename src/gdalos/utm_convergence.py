@@ -1,6 +1,6 @@
 import numpy as np
-from pyproj import Proj
 
+from gdalos.srs_registry import get_tmerc_proj
 from gdalos.talos.gen_consts import M_PI_180
 
 
@@ -20,6 +20,6 @@ def utm_convergence_old(lon, lat: float, zone_lon0: float) -> float:
 
 
 def utm_convergence(lon, lat: float, zone_lon0: float) -> float:
-    p = Proj(proj='tmerc', k=0.9996, lon_0=zone_lon0, x_0=500000, ellps='WGS84', preserve_units=False)
+    p = get_tmerc_proj(zone_lon0)
     factors = p.get_factors(longitude=lon, latitude=lat)
     return factors.meridian_convergence
@@ -6,37 +6,39 @@ import math
 import os
 import tempfile
 import time
+from concurrent.futures import Executor, ProcessPoolExecutor
 from enum import Enum
 from functools import partial
 from itertools import cycle
 from pathlib import Path
-from typing import Union, Sequence, Optional, List, Tuple
+from typing import Union, Sequence, Optional, List, Tuple, Iterator
 from collections import OrderedDict
 
 import numpy as np
 import requests
-from osgeo import gdal, ogr, osr
+from osgeo import gdal, gdal_array, ogr, osr
 from osgeo_utils.auxiliary.extent_util import Extent
 from osgeo_utils.auxiliary.util import get_ovr_idx
 from pyproj.enums import TransformDirection
-from pyproj.transformer import Transformer
 
-from gdalos import gdalos_base, gdalos_color, projdef, gdalos_util, gdalos_extent
-from gdalos.calc import gdal_calc, gdal_to_czml, gdalos_combine
+from gdalos import gdalos_base, gdalos_color, projdef, gdalos_util
+from gdalos.calc import gdal_to_czml, gdalos_combine
 from gdalos.calc.discrete_mode import DiscreteMode
 from gdalos.calc.gdal_to_czml import polyline_to_czml
 from gdalos.calc.gdal_to_json import gdal_to_json
 from gdalos.calc.gdalos_raster_color import gdalos_raster_color
 from gdalos.utm_convergence import utm_convergence
 from gdalos.gdalos_base import PathLikeOrStr, list_of_dict_to_dict_of_lists
+from gdalos.gdalos_dtm_cache import ProjectedDtmCache
 from gdalos.gdalos_color import ColorPaletteOrPathOrStrings
-from gdalos.gdalos_selector import get_projected_pj, DataSetSelector
+from gdalos.gdalos_plan import execute_bounded_iter, get_workers_count
+from gdalos.gdalos_selector import DataSetSelector
+from gdalos.gdalos_temp import TempWorkspace
 from gdalos.gdalos_trans import gdalos_trans, workaround_warp_scale_bug
 from gdalos.gdalos_types import MaybeSequence, OvrType
-from gdalos.rectangle import GeoRectangle
 from gdalos.talos.geom_arc import PolygonizeSector
 from gdalos.talos.ogr_util import create_layer_from_geometries
-from gdalos.viewshed import viewshed_params
+from gdalos.viewshed import viewshed_params, viewshed_numpy
 from gdalos.viewshed.radio_params import RadioCalcType
 from gdalos.viewshed.talosgis_init import talos_module_init, talos_radio_init
 from gdalos.viewshed.viewshed_grid_params import ViewshedGridParams
@@ -50,9 +52,10 @@ class ViewshedBackend(Enum):
     radio = 2
     rfmodel = 3
     z_rest = 4
+    numpy = 5
 
     def requires_projected_ds(self):
-        return self in [ViewshedBackend.gdal, ViewshedBackend.talos]
+        return self in [ViewshedBackend.gdal, ViewshedBackend.talos, ViewshedBackend.numpy]
 
 
 default_LOSBackend = ViewshedBackend.talos
@@ -94,14 +97,55 @@ class CalcOperation(Enum):
         return operation
 
 
-def temp_params(is_temp_file):
+def temp_params(is_temp_file, workspace: Optional[TempWorkspace] = None, in_memory: Optional[bool] = None):
     gdal_out_format = 'GTiff' if is_temp_file else 'MEM'
-    d_path = tempfile.mktemp(suffix='.tif') if is_temp_file else ''
+    if not is_temp_file:
+        d_path = ''
+    elif workspace is not None:
+        d_path = workspace.path(suffix='.tif', in_memory=in_memory)
+    else:
+        d_path = tempfile.mktemp(suffix='.tif')
     return_ds = True
     # return_ds = not is_temp_file
     return is_temp_file, gdal_out_format, d_path, return_ds
 
 
+def get_talos_ndv(dt, low_nodata: bool):
+    """
+    returns the nodata value of a talos result of the given (gdal or numpy) type,
+    which is the low or the high limit of it
+    """
+    dtype = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(dt) if isinstance(dt, int) else dt)
+    info = np.iinfo(dtype) if np.issubdtype(dtype, np.integer) else np.finfo(dtype)
+    return info.min if low_nodata else info.max
+
+
+def talos_rasters_to_ds(rasters: Sequence, dtm_ds: gdal.Dataset, x0_pixel: int, y0_pixel: int,
+                        low_nodata: Optional[bool] = None) -> Optional[gdal.Dataset]:
+    """
+    returns a MEM dataset with a band of each of the given talos result arrays,
+    which are in the grid of the given dtm, starting at the given pixel.
+    each band gets the nodata value of its type (as GS_SaveRaster sets), unless low_nodata is None.
+    returns None if the results are not arrays of the same shape.
+    """
+    arrays = [np.asarray(r) for r in rasters]
+    if not arrays or any(a.ndim != 2 or a.shape != arrays[0].shape for a in arrays):
+        return None
+    y_size, x_size = arrays[0].shape
+    gt = dtm_ds.GetGeoTransform()
+    ds: gdal.Dataset = gdal.GetDriverByName('MEM').Create('', x_size, y_size, 0)
+    ds.SetGeoTransform((gt[0] + x0_pixel * gt[1] + y0_pixel * gt[2], gt[1], gt[2],
+                        gt[3] + x0_pixel * gt[4] + y0_pixel * gt[5], gt[4], gt[5]))
+    ds.SetProjection(dtm_ds.GetProjection())
+    for i, arr in enumerate(arrays):
+        ds.AddBand(gdal_array.NumericTypeCodeToGDALTypeCode(arr.dtype))
+        bnd = ds.GetRasterBand(i + 1)
+        bnd.WriteArray(arr)
+        if low_nodata is not None:
+            bnd.SetNoDataValue(float(get_talos_ndv(arr.dtype, low_nodata)))
+    return ds
+
+
 def make_slice(slicer):
     if isinstance(slicer, slice):
         return slicer
@@ -110,6 +154,22 @@ def make_slice(slicer):
     return slice(*[{True: lambda n: None, False: int}[x == ''](x) for x in (slicer.split(':') + ['', '', ''])[:3]])
 
 
+def remove_temp_files(temp_files: List, workspace: Optional[TempWorkspace] = None) -> List:
+    removed = []
+    for f in temp_files:
+        try:
+            if workspace is not None and f in workspace:
+                if not workspace.remove(f):
+                    continue
+            else:
+                os.remove(f)
+            removed.append(f)
+        except:
+            pass
+            # probably this is a file that backs the ds that we'll return
+    return removed
+
+
 def viewshed_calc(output_filename, of='GTiff', **kwargs):
     output_filename = Path(output_filename) if output_filename else None
     # ext = output_filename.suffix
@@ -137,10 +197,9 @@ def viewshed_calc(output_filename, of='GTiff', **kwargs):
         ds = driver.CreateCopy(str(output_filename), ds)
 
     if temp_files:
+        removed = remove_temp_files(temp_files, kwargs.get('workspace'))
         for f in temp_files:
-            try:
-                os.remove(f)
-            except:
+            if f not in removed:
                 print('failed to remove temp file:{}'.format(f))
     return ds
 
@@ -177,6 +236,54 @@ def polygon_to_np(filename: PathLikeOrStr,
     return vertex_count, xys
 
 
+def get_calc_combiner(operation: CalcOperation, in_ndv, extent, hide_ndv: bool = True) \
+        -> Tuple[gdalos_combine.RasterCombiner, Optional[float]]:
+    """ returns a combiner that folds the viewsheds by the given operation, and the nodata value of its output """
+    no_data_value = in_ndv
+    if operation == CalcOperation.viewshed:
+        accumulator = gdalos_combine.IndexAccumulator
+    elif operation == CalcOperation.max:
+        accumulator = gdalos_combine.MaxAccumulator
+    elif operation == CalcOperation.min:
+        accumulator = gdalos_combine.MinAccumulator
+    elif operation == CalcOperation.count:
+        no_data_value = 0
+        accumulator = gdalos_combine.CountAccumulator
+    elif operation == CalcOperation.count_z:
+        no_data_value = viewshed_params.viewshed_comb_ndv
+        accumulator = partial(gdalos_combine.CountZAccumulator, in_ndv=in_ndv)
+    elif operation == CalcOperation.unique:
+        no_data_value = viewshed_params.viewshed_comb_ndv
+        accumulator = gdalos_combine.UniqueAccumulator
+    else:
+        raise Exception('Unknown operation: {}'.format(operation))
+    return gdalos_combine.RasterCombiner(accumulator, extent=extent, hide_ndv=hide_ndv), no_data_value
+
+
+def get_same_dtm_observers(vp_array: Sequence[ViewshedParams], transform_coords_to_4326=None,
+                           input_selector: Optional[DataSetSelector] = None, input_filename=None,
+                           dtm_cache: Optional[ProjectedDtmCache] = None,
+                           dtm_center: Optional[Tuple[float, float]] = None) -> List[ViewshedParams]:
+    """
+    returns the observers which would be calculated from the same dtm as the current one:
+    the same file of the selector (input_filename), and the same local projection (dtm_center) of a geographic dtm
+    """
+    if input_selector is None and dtm_center is None:
+        return list(vp_array)
+    result = []
+    for vp in vp_array:
+        geo_ox, geo_oy = vp.ox, vp.oy
+        if transform_coords_to_4326:
+            geo_ox, geo_oy, _ = transform_coords_to_4326.TransformPoint(geo_ox, geo_oy)
+        if input_selector is not None and \
+                Path(input_selector.select_item_projected(geo_ox, geo_oy).filename).resolve() != input_filename:
+            continue
+        if dtm_center is not None and dtm_cache.get_center(geo_ox, geo_oy) != dtm_center:
+            continue
+        result.append(vp)
+    return result
+
+
 def viewshed_calc_to_ds(
         vp_array,
         input_filename: Union[gdal.Dataset, PathLikeOrStr, DataSetSelector],
@@ -190,7 +297,13 @@ def viewshed_calc_to_ds(
         backend: ViewshedBackend = None,
         output_ras: Optional[list] = None,
         temp_files=None,
-        files=None):
+        files=None,
+        workspace: Optional[TempWorkspace] = None,
+        workers: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        dtm_cache: Optional[ProjectedDtmCache] = None):
+    # workers: calculate the observers concurrently by that many worker processes (0 -> cpu count)
+    # dtm_cache: the projected windows of a geographic dtm (by default they are shared only within the call)
     input_selector = None
     input_ds = None
     calc_cutline = None if not calc_cutline else cutline if isinstance(calc_cutline, bool) else calc_cutline
@@ -215,6 +328,10 @@ def viewshed_calc_to_ds(
 
     do_post_color = False
     temp_files = temp_files if temp_files is not None else []
+    # the viewsheds are folded one at a time into the combined raster
+    combiner = None
+    base_calc_ndv = no_data_value = None
+    own_dtm_cache = None
 
     vp_slice = make_slice(vp_slice)
 
@@ -250,11 +367,60 @@ def viewshed_calc_to_ds(
         pjstr_4326 = srs_4326.ExportToProj4()
 
         first_vs = True
+        # the numpy backend reads the windows of the observers from the (projected) dtm by this cache
+        numpy_dtm_cache = viewshed_numpy.DtmCache()
 
         if in_coords_srs is not None:
             in_coords_srs = projdef.get_proj_string(in_coords_srs)
 
-        for vp in vp_array:
+        if workers is not None and operation and len(vp_array) > 1 and \
+                (input_selector is not None or isinstance(input_filename, PathLikeOrStr.__args__)):
+            # each observer is calculated into a file by a worker process (which has its own gdal and talos state)
+            if input_selector is None:
+                pjstr_inter_srs = projdef.get_srs_pj(input_ds)
+                pjstr_output_srs = projdef.get_proj_string(out_crs) if out_crs is not None else pjstr_inter_srs
+                vp_inputs = [input_filename] * len(vp_array)
+            else:
+                pjstr_output_srs = projdef.get_proj_string(out_crs) if out_crs is not None else pjstr_4326
+                pjstr_inter_srs = pjstr_output_srs
+                if in_coords_srs is None:
+                    in_coords_srs = pjstr_4326
+                transform_coords_to_4326 = projdef.get_transform(in_coords_srs, pjstr_4326)
+                vp_inputs = []
+                for vp in vp_array:
+                    if transform_coords_to_4326:
+                        geo_ox, geo_oy, _ = transform_coords_to_4326.TransformPoint(vp.ox, vp.oy)
+                    else:
+                        geo_ox, geo_oy = vp.ox, vp.oy
+                    vp_inputs.append(Path(input_selector.get_item_projected(geo_ox, geo_oy)[0]).resolve())
+            for idx, vs_file in viewshed_calc_parallel(
+                    vp_array, vp_inputs, workers=workers, executor=executor, workspace=workspace,
+                    calc_cutline=calc_cutline or False, in_coords_srs=in_coords_srs, out_crs=pjstr_inter_srs,
+                    bi=bi, ovr_idx=ovr_idx, co=co, threads=threads, backend=backend, output_ras=output_ras,
+                    dtm_cache=dtm_cache):
+                # fold each viewshed into the combined raster as soon as it's done, then remove its file.
+                # the viewsheds complete out of order, so each is folded by its index in vp_array (i.e. for unique)
+                ds = gdalos_util.open_ds(vs_file)
+                if combiner is None:
+                    bnd = ds.GetRasterBand(1)
+                    base_calc_ndv = bnd.GetNoDataValue()
+                    do_post_color = bool(color_palette) and bnd.DataType not in [gdal.GDT_Byte, gdal.GDT_UInt16]
+                    if color_palette and not do_post_color:
+                        if not color_palette.is_numeric():
+                            min_max = bnd.ComputeRasterMinMax()
+                            color_palette.apply_percent(*min_max)
+                        color_table = gdalos_color.get_color_table(color_palette)
+                        if color_table is None:
+                            raise Exception('Could not create color table')
+                    bnd = None
+                    combiner, no_data_value = get_calc_combiner(operation, base_calc_ndv, extent, operation_hidendv)
+                combiner.add(ds, index=idx)
+                ds = None
+                remove_temp_files([vs_file], workspace)
+            vp_array = []  # all the observers were calculated by the workers
+
+        for vp_idx, vp in enumerate(vp_array):
+            vp_temp_files = len(temp_files)
             # vp might get changed, so make a copy
             vp = copy.copy(vp)
             if first_vs or input_selector is not None:
@@ -298,28 +464,6 @@ def viewshed_calc_to_ds(
                 input_raster_is_projected = input_srs.IsProjected()
                 if input_raster_is_projected:
                     transform_coords_to_raster = projdef.get_transform(in_coords_srs, pjstr_input_srs)
-                else:
-                    raise Exception(f'input raster has to be projected')
-            zone_lon0 = input_srs.GetProjParm('central_meridian')
-            vp.convergence = utm_convergence(vp.ox, vp.oy, zone_lon0)
-            if input_raster_is_projected:
-                projected_filename = input_filename
-                if transform_coords_to_raster:
-                    vp.ox, vp.oy, _ = transform_coords_to_raster.TransformPoint(vp.ox, vp.oy)
-            else:
-                projected_pj = get_projected_pj(geo_ox, geo_oy)
-                transform_coords_to_raster = projdef.get_transform(in_coords_srs, projected_pj)
-                vp.ox, vp.oy, _ = transform_coords_to_raster.TransformPoint(vp.ox, vp.oy)
-                d = gdalos_extent.transform_resolution_p(transform_coords_to_raster, 10, 10, vp.ox, vp.oy)
-                extent = GeoRectangle.from_center_and_radius(vp.ox, vp.oy, vp.max_r + d, vp.max_r + d)
-
-                projected_filename = tempfile.mktemp('.tif')
-                projected_ds = gdalos_trans(
-                    input_ds, out_filename=projected_filename, warp_srs=projected_pj,
-                    extent=extent, return_ds=True, write_info=False, write_spec=False)
-                if not projected_ds:
-                    raise Exception('input raster projection failed')
-                input_ds = projected_ds
 
             if backend is None:
                 backend = default_ViewshedBackend
@@ -328,12 +472,42 @@ def viewshed_calc_to_ds(
             if backend == ViewshedBackend.radio:
                 backend = ViewshedBackend.talos
 
+            if input_raster_is_projected:
+                zone_lon0 = input_srs.GetProjParm('central_meridian')
+                vp.convergence = utm_convergence(vp.ox, vp.oy, zone_lon0)
+                projected_filename = input_filename
+                projected_ovr_idx = ovr_idx
+                if transform_coords_to_raster:
+                    vp.ox, vp.oy, _ = transform_coords_to_raster.TransformPoint(vp.ox, vp.oy)
+                dtm_center = None
+            else:
+                # nearby observers share a window of the dtm, which was warped into a local projection
+                if dtm_cache is None:
+                    # talos opens the projected file by itself, so it has to be on disk
+                    dtm_cache = own_dtm_cache = ProjectedDtmCache(
+                        in_memory=False if backend == ViewshedBackend.talos else None)
+                if input_ds is None:
+                    input_ds = gdalos_util.open_ds(input_filename, ovr_idx=ovr_idx)
+                if transform_coords_to_4326:
+                    geo_ox, geo_oy, _ = transform_coords_to_4326.TransformPoint(vp.ox, vp.oy)
+                else:
+                    geo_ox, geo_oy = vp.ox, vp.oy
+                projected_dtm = dtm_cache.get(input_ds, geo_ox, geo_oy, vp.max_r)
+                dtm_center = dtm_cache.get_center(geo_ox, geo_oy)
+                vp.convergence = projected_dtm.get_convergence(geo_ox, geo_oy)
+                transform_coords_to_raster = projdef.get_transform(in_coords_srs, projected_dtm.pj)
+                vp.ox, vp.oy, _ = transform_coords_to_raster.TransformPoint(vp.ox, vp.oy)
+                projected_filename = projected_dtm.filename
+                projected_ovr_idx = 0
+                input_ds = projected_dtm.ds
+                projected_dtm = None
+
             is_base_calc = True
             if backend == ViewshedBackend.gdal:
                 # TypeError: '>' not supported between instances of 'NoneType' and 'int'
                 bnd_type = gdal.GDT_Byte
                 # todo: why dosn't it work without it?
-                is_temp_file, gdal_out_format, d_path, return_ds = temp_params(True)
+                is_temp_file, gdal_out_format, d_path, return_ds = temp_params(True, workspace)
 
                 inputs = vp.get_as_gdal_params()
                 print(inputs)
@@ -346,6 +520,19 @@ def viewshed_calc_to_ds(
 
                 if not ds:
                     raise Exception('Viewshed calculation failed')
+            elif backend == ViewshedBackend.numpy:
+                # the observers that share a dtm window read it once
+                bnd_type = gdal.GDT_Byte
+                if input_ds is None:
+                    input_ds = gdalos_util.open_ds(projected_filename, ovr_idx=projected_ovr_idx)
+                window = viewshed_numpy.get_observer_window(input_ds, vp)[-1]
+                # read the windows of this observer and of the following observers (in this dtm) at once
+                same_dtm_vps = get_same_dtm_observers(
+                    vp_array[vp_idx + 1:], transform_coords_to_4326, input_selector, input_filename,
+                    dtm_cache, dtm_center)
+                numpy_dtm_cache.prime(input_ds, bi, [window] + viewshed_numpy.get_observer_windows(
+                    input_ds, same_dtm_vps, transform_coords_to_raster))
+                ds = viewshed_numpy.viewshed_calc_numpy(input_ds, vp, bi=bi, cache=numpy_dtm_cache)
             elif backend == ViewshedBackend.talos:
                 # is_temp_file = True  # output is file, not ds
                 if not projected_filename:
@@ -355,8 +542,8 @@ def viewshed_calc_to_ds(
                 talosgis_version = talos_module_init()
                 dtm_open_err = talos.GS_DtmOpenDTM(str(projected_filename))
                 talos.GS_SetProjectCRSFromActiveDTM()
-                ovr_idx = get_ovr_idx(projected_filename, ovr_idx)
-                talos.GS_DtmSelectOvle(ovr_idx)
+                projected_ovr_idx = get_ovr_idx(projected_filename, projected_ovr_idx)
+                talos.GS_DtmSelectOvle(projected_ovr_idx)
                 talos.GS_DtmSetCalcThreadsCount(threads or 0)
                 if dtm_open_err != 0:
                     raise Exception('talos could not open input file {}'.format(projected_filename))
@@ -403,10 +590,16 @@ def viewshed_calc_to_ds(
                 output_ras = output_ras or ['v']
                 output_ras = [s[0].lower() for s in output_ras]
                 my_rasters = [v for k, v in ras_map.items() if k in output_ras and v is not None]
+                ds = None
+                if X0Pixel is not None and not vp.out_res:
+                    # the results are arrays in the grid of the dtm, starting at the given pixel
+                    dtm_ds = gdalos_util.open_ds(projected_filename, ovr_idx=projected_ovr_idx)
+                    ds = talos_rasters_to_ds(my_rasters, dtm_ds, X0Pixel, Y0Pixel, low_nodata=inputs['low_nodata'])
+                    dtm_ds = None
                 my_ds = []
-                for r in my_rasters:
+                for r in my_rasters if ds is None else []:
                     # talos supports only file output (not ds)
-                    is_temp_file, gdal_out_format, d_path, return_ds = temp_params(True)
+                    is_temp_file, gdal_out_format, d_path, return_ds = temp_params(True, workspace, in_memory=False)
                     temp_files.append(d_path)
                     talos.GS_SaveRaster(r, str(d_path))
                     # I will reopen the ds to change the color table and ndv
@@ -424,7 +617,7 @@ def viewshed_calc_to_ds(
 
             input_ds = None
 
-            set_nodata = backend == ViewshedBackend.gdal
+            set_nodata = backend in [ViewshedBackend.gdal, ViewshedBackend.numpy]
             # set_nodata = is_base_calc
             bnd = ds.GetRasterBand(1)
             if set_nodata:
@@ -452,21 +645,22 @@ def viewshed_calc_to_ds(
 
             cut_sector = (backend == ViewshedBackend.gdal) and not vp.is_omni_h()
             # warp_result = False
-            warp_result = (input_selector is not None)
+            warp_result = (input_selector is not None) or not input_raster_is_projected
             if warp_result or cut_sector:
                 if cut_sector:
                     ring = PolygonizeSector(vp.ox, vp.oy, vp.max_r, vp.max_r, vp.get_grid_azimuth(), vp.h_aperture)
-                    post_calc_cutline = tempfile.mktemp(suffix='.gpkg')
+                    post_calc_cutline = workspace.path(suffix='.gpkg') if workspace is not None else \
+                        tempfile.mktemp(suffix='.gpkg')
                     temp_files.append(post_calc_cutline)
                     create_layer_from_geometries([ring], post_calc_cutline)
                 else:
                     post_calc_cutline = None
                 # todo: check why without temp file it crashes on operation
-                is_temp_file, gdal_out_format, d_path, return_ds = temp_params(True)
+                is_temp_file, gdal_out_format, d_path, return_ds = temp_params(True, workspace)
                 scale = ds.GetRasterBand(1).GetScale()
                 ds = gdalos_trans(ds, out_filename=d_path, warp_srs=pjstr_inter_srs,
                                   cutline=post_calc_cutline, of=gdal_out_format, return_ds=return_ds,
-                                  ovr_type=OvrType.no_overviews)
+                                  ovr_type=OvrType.no_overviews, workspace=workspace)
                 if is_temp_file:
                     # close original ds and reopen
                     ds = None
@@ -478,64 +672,37 @@ def viewshed_calc_to_ds(
                     raise Exception('Viewshed calculation failed to cut')
 
             if operation:
-                files.append(ds)
+                if combiner is None:
+                    combiner, no_data_value = get_calc_combiner(operation, base_calc_ndv, extent, operation_hidendv)
+                # fold the viewshed into the combined raster, so its files are not needed anymore
+                combiner.add(ds)
+                ds = None
+                for f in remove_temp_files(temp_files[vp_temp_files:], workspace):
+                    temp_files.remove(f)
 
     if operation:
-        # alpha_pattern = '1*({{}}>{})'.format(viewshed_thresh)
-        # alpha_pattern = 'np.multiply({{}}>{}, dtype=np.uint8)'.format(viewshed_thresh)
-        no_data_value = base_calc_ndv
-        if operation == CalcOperation.viewshed:
-            # no_data_value = viewshed_params.viewshed_ndv
-            f = gdalos_combine.get_by_index
-            # calc_expr, calc_kwargs, f = gdal_calc.make_calc_with_func(files, alpha_pattern, 'f'), sum
-        elif operation == CalcOperation.max:
-            # no_data_value = viewshed_params.viewshed_ndv
-            f = gdalos_combine.vs_max
-            # calc_expr, calc_kwargs, f = gdal_calc.make_calc_with_func(files, alpha_pattern, 'f'), sum
-        elif operation == CalcOperation.min:
-            f = gdalos_combine.vs_min
-        elif operation == CalcOperation.count:
-            no_data_value = 0
-            f = gdalos_combine.vs_count
-            # calc_expr, calc_kwargs = gdal_calc.make_calc_with_operand(files, alpha_pattern, '+')
-            # calc_expr, calc_kwargs, f = gdal_calc.make_calc_with_func(files, alpha_pattern), sum
-        elif operation == CalcOperation.count_z:
-            no_data_value = viewshed_params.viewshed_comb_ndv
-            f = partial(gdalos_combine.vs_count_z, in_ndv=base_calc_ndv)
-            # calc_expr, calc_kwargs f, = gdal_calc.make_calc_with_func(files, alpha_pattern, 'f'), sum
-        elif operation == CalcOperation.unique:
-            no_data_value = viewshed_params.viewshed_comb_ndv
-            f = gdalos_combine.vs_unique
-            # calc_expr, calc_kwargs, f = gdal_calc.make_calc_with_func(files, alpha_pattern, 'f'), unique
-        else:
-            raise Exception('Unknown operation: {}'.format(operation))
-
-        calc_expr = 'f(x)'
-        calc_kwargs = dict(x=files)
-        user_namespace = dict(f=f)
-
-        debug_time = 1
         t = time.time()
-        for i in range(debug_time):
-            is_temp_file, gdal_out_format, d_path, return_ds = temp_params(False)
-            ds = gdal_calc.Calc(
-                calc_expr, outfile=str(d_path), extent=extent, format=gdal_out_format,
-                color_table=color_table, overwrite=True,
-                NoDataValue=no_data_value, hideNoData=operation_hidendv,
-                user_namespace=user_namespace, **calc_kwargs)
+        if combiner is None:
+            # the viewsheds were given as files, or were calculated by the workers
+            combiner, no_data_value = get_calc_combiner(operation, base_calc_ndv, extent, operation_hidendv)
+        for i in range(len(files)):
+            combiner.add(gdalos_util.open_ds(files[i]))
+            files[i] = None  # close calc input ds(s)
+        is_temp_file, gdal_out_format, d_path, return_ds = temp_params(False)
+        ds = combiner.get_ds(d_path, gdal_out_format, no_data_value=no_data_value, color_table=color_table)
+        combiner = None
         t = time.time() - t
         print('time for calc: {:.3f} seconds'.format(t))
 
         if not ds:
             raise Exception('error occurred')
-        for i in range(len(files)):
-            files[i] = None  # close calc input ds(s)
 
     combined_post_process_needed = cutline or not projdef.are_srs_equivalent(pjstr_inter_srs, pjstr_output_srs)
     if combined_post_process_needed:
         is_temp_file, gdal_out_format, d_path, return_ds = temp_params(False)
         ds = gdalos_trans(ds, out_filename=d_path, warp_srs=pjstr_output_srs,
-                          cutline=cutline, of=gdal_out_format, return_ds=return_ds, ovr_type=OvrType.no_overviews)
+                          cutline=cutline, of=gdal_out_format, return_ds=return_ds, ovr_type=OvrType.no_overviews,
+                          workspace=workspace)
 
         if return_ds:
             if not ds:
@@ -547,21 +714,62 @@ def viewshed_calc_to_ds(
         if not ds:
             raise Exception('Viewshed calculation failed to color result')
 
-    removed = []
-    if temp_files:
-        for f in temp_files:
-            try:
-                os.remove(f)
-                removed.append(f)
-            except:
-                pass
-                # probably this is a file that backs the ds that we'll return
-                # print('failed to remove temp file:{}'.format(f))
+    if own_dtm_cache is not None:
+        own_dtm_cache.clear()
+    removed = remove_temp_files(temp_files, workspace) if temp_files else []
     for f in removed:
         temp_files.remove(f)
     return ds
 
 
+def viewshed_calc_worker(out_filename: PathLikeOrStr, **kwargs) -> str:
+    """ calculates a single viewshed (i.e. in a worker process) and saves it into the given file """
+    temp_files = []
+    ds = viewshed_calc_to_ds(**kwargs, temp_files=temp_files)
+    if not ds:
+        raise Exception('Viewshed calculation failed')
+    out_ds = gdal.GetDriverByName('GTiff').CreateCopy(str(out_filename), ds)
+    if out_ds is None:
+        raise Exception('failed to save the viewshed to {}'.format(out_filename))
+    out_ds = ds = None
+    remove_temp_files(temp_files)
+    return str(out_filename)
+
+
+def viewshed_calc_parallel(vp_array: Sequence[ViewshedParams], input_filenames: Sequence[PathLikeOrStr],
+                           workers: Optional[int] = None, executor: Optional[Executor] = None,
+                           workspace: Optional[TempWorkspace] = None, **kwargs) -> Iterator[Tuple[int, str]]:
+    """
+    calculates the viewshed of each observer (with its input file) concurrently, by the given executor
+    or by a process pool, as talos (and gdal viewshed) can't calculate concurrently in a single process.
+    each worker process calculates a single observer at a time, with its part of the calc threads.
+    yields (index in vp_array, file) of each viewshed as it completes, the caller owns (and removes) the file.
+    """
+    max_pending = get_workers_count(workers)
+    if not kwargs.get('threads'):
+        kwargs['threads'] = max(1, (os.cpu_count() or 1) // max_pending)
+    kwargs_list = []
+    for vp, input_filename in zip(vp_array, input_filenames):
+        out_filename = workspace.path(suffix='.tif', in_memory=False) if workspace is not None else \
+            tempfile.mktemp(suffix='.tif')
+        kwargs_list.append(dict(kwargs, vp_array=[vp], input_filename=input_filename, operation=None,
+                                out_filename=out_filename))
+    failed = []
+    pool = ProcessPoolExecutor(max_workers=max_pending) if executor is None else None
+    try:
+        for idx, result in execute_bounded_iter(pool or executor, viewshed_calc_worker, kwargs_list, max_pending):
+            if result is None:
+                failed.append(kwargs_list[idx]['out_filename'])
+            else:
+                yield idx, result
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if failed:
+        remove_temp_files(failed, workspace)
+        raise Exception('{} of {} viewshed calculations failed'.format(len(failed), len(kwargs_list)))
+
+
 def ordered_dict_get(d: OrderedDict, key):
     if key in d:
         return d[key]
@@ -936,7 +1144,7 @@ def los_calc(
             res['ty'] = vp.ty
 
         # transform block point from projected to 4326
-        transformer = Transformer.from_crs(in_coords_srs, pjstr_input_srs, always_xy=True)
+        transformer = projdef.get_transformer(in_coords_srs, pjstr_input_srs, always_xy=True)
         if any(b in output_names for b in ['bx', 'by']):
             res['bx'], res['by'] = transformer.transform(xx=res['bx'], yy=res['by'],
                                                          direction=TransformDirection.INVERSE)
@@ -0,0 +1,310 @@
+import math
+import time
+from typing import Optional, Sequence, List, Tuple
+
+import numpy as np
+from osgeo import gdal
+
+from gdalos.viewshed.viewshed_params import ViewshedParams
+
+earth_radius = 6378137.0
+default_ray_chunk = 512  # rays which are swept at once
+default_cache_pixels = 64 * 1024 ** 2  # the largest dtm window that would be read for a batch of observers
+
+PixelWindow = Tuple[int, int, int, int]  # x0, y0, x1, y1 (exclusive)
+
+
+def get_scalar(v):
+    return v[0] if isinstance(v, Sequence) else v
+
+
+def get_union_window(windows: Sequence[PixelWindow]) -> PixelWindow:
+    return min(w[0] for w in windows), min(w[1] for w in windows), \
+           max(w[2] for w in windows), max(w[3] for w in windows)
+
+
+class DtmWindow(object):
+    """ the elevations of a window of a dtm band, which might serve several observers """
+    __slots__ = ['key', 'window', 'arr', 'valid']
+
+    def __init__(self, key, window: PixelWindow, arr: np.ndarray, valid: np.ndarray):
+        self.key = key
+        self.window = window
+        self.arr = arr
+        self.valid = valid
+
+    def contains(self, key, window: PixelWindow) -> bool:
+        return self.key == key and \
+               self.window[0] <= window[0] and self.window[1] <= window[1] and \
+               self.window[2] >= window[2] and self.window[3] >= window[3]
+
+    def get(self, window: PixelWindow) -> Tuple[np.ndarray, np.ndarray]:
+        s = np.s_[window[1] - self.window[1]:window[3] - self.window[1],
+                  window[0] - self.window[0]:window[2] - self.window[0]]
+        return self.arr[s], self.valid[s]
+
+
+class DtmCache(object):
+    """
+    keeps the last dtm window that was read, so the observers which share a window read the dtm once.
+    a batch of observers is read as the union of their windows, as long as it is not larger than max_pixels.
+    """
+    __slots__ = ['max_pixels', 'last']
+
+    def __init__(self, max_pixels: int = default_cache_pixels):
+        self.max_pixels = max_pixels
+        self.last: Optional[DtmWindow] = None
+
+    @staticmethod
+    def get_key(ds: gdal.Dataset, bi: int):
+        return ds.GetDescription() or id(ds), ds.RasterXSize, ds.RasterYSize, bi
+
+    def read(self, ds: gdal.Dataset, bi: int, window: PixelWindow) -> DtmWindow:
+        key = self.get_key(ds, bi)
+        if self.last is None or not self.last.contains(key, window):
+            bnd = ds.GetRasterBand(bi)
+            if bnd is None:
+                raise Exception('band number out of range')
+            x0, y0, x1, y1 = window
+            arr = bnd.ReadAsArray(x0, y0, x1 - x0, y1 - y0).astype(np.float64)
+            ndv = bnd.GetNoDataValue()
+            valid = np.isfinite(arr)
+            if ndv is not None:
+                valid &= arr != ndv
+            self.last = DtmWindow(key, window, arr, valid)
+        return self.last
+
+    def contains(self, ds: gdal.Dataset, bi: int, window: PixelWindow) -> bool:
+        return self.last is not None and self.last.contains(self.get_key(ds, bi), window)
+
+    def prime(self, ds: gdal.Dataset, bi: int, windows: Sequence[PixelWindow]):
+        """
+        reads the union of the leading windows at once (at least the first window),
+        as long as it is not larger than max_pixels. nothing is read if the first window is already cached.
+        """
+        if not windows or self.contains(ds, bi, windows[0]):
+            return
+        union = windows[0]
+        for window in windows[1:]:
+            next_union = get_union_window([union, window])
+            if (next_union[2] - next_union[0]) * (next_union[3] - next_union[1]) > self.max_pixels:
+                break
+            union = next_union
+        self.read(ds, bi, union)
+
+    def get(self, ds: gdal.Dataset, bi: int, window: PixelWindow) -> Tuple[np.ndarray, np.ndarray]:
+        return self.read(ds, bi, window).get(window)
+
+
+def get_pixel_window(ds: gdal.Dataset, x: float, y: float, max_r: float) \
+        -> Optional[Tuple[int, int, int, PixelWindow]]:
+    """ returns the pixel of the given point, the radius in pixels, and the window (clipped to the raster) around it,
+    or None if the point is outside of the raster """
+    gt = ds.GetGeoTransform()
+    if gt[2] or gt[4]:
+        raise Exception('rotated rasters are not supported')
+    col = math.floor((x - gt[0]) / gt[1])
+    row = math.floor((y - gt[3]) / gt[5])
+    if not (0 <= col < ds.RasterXSize and 0 <= row < ds.RasterYSize):
+        return None
+    r = max(1, math.ceil(max_r / min(abs(gt[1]), abs(gt[5]))))
+    window = max(0, col - r), max(0, row - r), min(ds.RasterXSize, col + r + 1), min(ds.RasterYSize, row + r + 1)
+    return col, row, r, window
+
+
+def get_observer_window(ds: gdal.Dataset, vp: ViewshedParams) -> Tuple[int, int, int, PixelWindow]:
+    """ returns the pixel of the observer, the radius in pixels, and the window (clipped to the raster) around it """
+    res = get_pixel_window(ds, get_scalar(vp.ox), get_scalar(vp.oy), get_scalar(vp.max_r))
+    if res is None:
+        raise Exception('observer is outside of the raster')
+    return res
+
+
+def get_observer_windows(ds: gdal.Dataset, vp_array: Sequence[ViewshedParams], transform=None) -> List[PixelWindow]:
+    """
+    returns the windows of the given observers, up to the first observer which is outside of the raster.
+    transform: from the coordinates of the observers to the srs of the raster (None if they are the same)
+    """
+    windows = []
+    for vp in vp_array:
+        x, y = get_scalar(vp.ox), get_scalar(vp.oy)
+        if transform:
+            x, y, _ = transform.TransformPoint(x, y)
+        res = get_pixel_window(ds, x, y, get_scalar(vp.max_r))
+        if res is None:
+            break
+        windows.append(res[-1])
+    return windows
+
+
+def get_perimeter(r: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ returns the offsets of the cells of the perimeter of a square of the given radius (8r cells) """
+    k = np.arange(-r, r)
+    full = np.full(2 * r, r)
+    dx = np.concatenate([k, full, -k, -full])
+    dy = np.concatenate([-full, k, full, -k])
+    return dx, dy
+
+
+def viewshed_visibility(z: np.ndarray, valid: np.ndarray, col: int, row: int, r: int,
+                        px: float, py: float, oz_abs: float, tz: float, tmsl: bool, curv: float,
+                        ray_chunk: int = default_ray_chunk) -> np.ndarray:
+    """
+    radial sweep: a ray is cast from the observer to each cell of the perimeter of the radius,
+    a cell along a ray is visible if the slope to its target height is not below the slopes of the preceding cells.
+    a cell is visible if any of the rays that pass through it sees it.
+    """
+    h, w = z.shape
+    visible = np.zeros((h, w), dtype=bool)
+    perimeter_dx, perimeter_dy = get_perimeter(r)
+    t = np.arange(1, r + 1) / r
+    for i in range(0, len(perimeter_dx), ray_chunk):
+        sx = np.rint(perimeter_dx[i:i + ray_chunk, None] * t).astype(np.intp)
+        sy = np.rint(perimeter_dy[i:i + ray_chunk, None] * t).astype(np.intp)
+        cx = col + sx
+        cy = row + sy
+        inside = (cx >= 0) & (cx < w) & (cy >= 0) & (cy < h)
+        cx = np.clip(cx, 0, w - 1)
+        cy = np.clip(cy, 0, h - 1)
+        zs = z[cy, cx]
+        vs = valid[cy, cx] & inside
+
+        d = np.hypot(sx * px, sy * py)
+        # the height of the line of sight (without slope), with the curvature of the earth
+        base = d * d * curv + oz_abs
+        obstacle = np.where(vs, (zs - base) / d, -np.inf)
+        horizon = np.maximum.accumulate(obstacle, axis=1)
+        horizon = np.concatenate([np.full((len(horizon), 1), -np.inf), horizon[:, :-1]], axis=1)
+        target = ((tz if tmsl else zs + tz) - base) / d
+        seen = vs & (target >= horizon)
+        visible[cy[seen], cx[seen]] = True
+    visible[row, col] = True
+    return visible
+
+
+def viewshed_calc_numpy(ds: gdal.Dataset, vp: ViewshedParams, bi: int = 1,
+                        cache: Optional[DtmCache] = None,
+                        ray_chunk: int = default_ray_chunk) -> gdal.Dataset:
+    """
+    calculates the viewshed of a single observer over a projected dtm, returns a Byte MEM dataset of the window
+    that is covered by max_r. the values are vv, iv, ov (out of range or out of the aperture) and ndv (no dtm).
+    """
+    oz = get_scalar(vp.oz)
+    tz = get_scalar(vp.tz)
+    if oz is None or tz is None:
+        raise Exception('the numpy backend calculates visibility only, oz and tz are required')
+    if cache is None:
+        cache = DtmCache()
+    col, row, r, window = get_observer_window(ds, vp)
+    x0, y0, x1, y1 = window
+    z, valid = cache.get(ds, bi, window)
+    col -= x0
+    row -= y0
+    if not valid[row, col]:
+        raise Exception('no dtm elevation at the observer')
+
+    gt = ds.GetGeoTransform()
+    px, py = abs(gt[1]), abs(gt[5])
+    curv = (1 - vp.refraction_coeff) / (2 * earth_radius)
+    oz_abs = oz if vp.omsl else z[row, col] + oz
+    visible = viewshed_visibility(z, valid, col, row, r, px, py, oz_abs, tz, vp.tmsl, curv, ray_chunk)
+
+    # the range and the aperture of the viewshed
+    dx = (np.arange(z.shape[1]) - col) * px
+    dy = (np.arange(z.shape[0]) - row) * py
+    dx, dy = np.meshgrid(dx, dy)
+    d = np.hypot(dx, dy)
+    dz = (tz if vp.tmsl else z + tz) - d * d * curv - oz_abs
+    max_r = get_scalar(vp.max_r)
+    in_range = (np.hypot(d, dz) if vp.max_r_slant else d) <= max_r
+    if vp.min_r:
+        in_range &= d >= vp.min_r
+    if not vp.is_omni_h():
+        # azimuth is clockwise from the grid north (the rows go south)
+        azimuth = np.degrees(np.arctan2(dx, -dy))
+        diff = (azimuth - vp.get_grid_azimuth() + 180) % 360 - 180
+        in_range &= np.abs(diff) <= vp.h_aperture / 2
+    if vp.v_aperture is not None and vp.v_aperture < 180:
+        elevation = np.degrees(np.arctan2(dz, d))
+        in_range &= np.abs(elevation - get_scalar(vp.elevation)) <= vp.v_aperture / 2
+    in_range[row, col] = True
+
+    res = np.where(visible, vp.vv, vp.iv).astype(np.uint8)
+    res[~in_range] = vp.ov
+    res[~valid] = vp.ndv
+
+    out_ds: gdal.Dataset = gdal.GetDriverByName('MEM').Create('', x1 - x0, y1 - y0, 1, gdal.GDT_Byte)
+    out_ds.SetGeoTransform((gt[0] + x0 * gt[1], gt[1], 0, gt[3] + y0 * gt[5], 0, gt[5]))
+    out_ds.SetProjection(ds.GetProjection())
+    bnd = out_ds.GetRasterBand(1)
+    bnd.WriteArray(res)
+    bnd.SetNoDataValue(vp.ndv)
+    bnd = None
+    return out_ds
+
+
+def viewshed_calc_numpy_batch(ds: gdal.Dataset, vp_array: Sequence[ViewshedParams], bi: int = 1,
+                              cache: Optional[DtmCache] = None, **kwargs) -> List[gdal.Dataset]:
+    """ calculates the viewsheds of the given observers, which share a single read of the dtm if possible """
+    if cache is None:
+        cache = DtmCache()
+    windows = [get_observer_window(ds, vp)[-1] for vp in vp_array]
+    res = []
+    for i, vp in enumerate(vp_array):
+        cache.prime(ds, bi, windows[i:])
+        res.append(viewshed_calc_numpy(ds, vp, bi=bi, cache=cache, **kwargs))
+    return res
+
+
+def benchmark_viewshed_backends(raster_filename, vp_array: Sequence[ViewshedParams], bi: int = 1,
+                                repeat: int = 3) -> dict:
+    """
+    times the numpy backend against gdal.ViewshedGenerate over the given (projected) raster,
+    returns the best time of each backend and the fraction of the cells that both backends agree on.
+    """
+    ds = gdal.Open(str(raster_filename))
+    bnd = ds.GetRasterBand(bi)
+    times = dict(gdal=math.inf, numpy=math.inf)
+    gdal_res = numpy_res = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        gdal_res = [gdal.ViewshedGenerate(bnd, 'MEM', '', None, **vp.get_as_gdal_params()) for vp in vp_array]
+        times['gdal'] = min(times['gdal'], time.perf_counter() - t)
+
+        t = time.perf_counter()
+        numpy_res = viewshed_calc_numpy_batch(ds, vp_array, bi=bi)
+        times['numpy'] = min(times['numpy'], time.perf_counter() - t)
+
+    agree = []
+    for vp, gdal_ds, numpy_ds in zip(vp_array, gdal_res, numpy_res):
+        # gdal returns the whole raster, compare the window of the numpy result
+        gt = gdal_ds.GetGeoTransform()
+        ngt = numpy_ds.GetGeoTransform()
+        xoff = round((ngt[0] - gt[0]) / gt[1])
+        yoff = round((ngt[3] - gt[3]) / gt[5])
+        a = numpy_ds.ReadAsArray()
+        b = gdal_ds.ReadAsArray(xoff, yoff, numpy_ds.RasterXSize, numpy_ds.RasterYSize)
+        mask = (a == vp.vv) | (a == vp.iv)
+        if mask.any():
+            agree.append(np.count_nonzero(a[mask] == b[mask]) / np.count_nonzero(mask))
+    times['agreement'] = sum(agree) / len(agree) if agree else None
+    return times
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    from gdalos.gdalos_selector import get_projected_pj
+    from gdalos import projdef
+
+    raster_filename = Path(__file__).parents[3] / 'data' / 'maps' / 'srtm1_x35_y32.tif'
+    lon, lat = 35.5, 32.5
+    projected_pj = get_projected_pj(lon, lat)
+    projected_filename = '/vsimem/viewshed_numpy_benchmark.tif'
+    gdal.Warp(projected_filename, str(raster_filename), dstSRS=projected_pj, resampleAlg='bilinear')
+    ox, oy, _ = projdef.get_transform(4326, projected_pj).TransformPoint(lon, lat)
+    vps = []
+    for i in range(4):
+        vp = ViewshedParams()
+        vp.update(dict(ox=ox + i * 100, oy=oy, oz=10, tz=2, max_r=8000))
+        vps.append(vp)
+    print(benchmark_viewshed_backends(projected_filename, vps))
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+pytest.importorskip('osgeo.gdal')
+
+from gdalos.gdalos_cache import GdalosCache, make_key
+
+
+def write(filename, data):
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+
+def read(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+def store_entry(tmp_path, cache, key='k0'):
+    out_filename = tmp_path / 'out.tif'
+    write(out_filename, b'base')
+    write(str(out_filename) + '.ovr', b'overviews')
+    assert cache.store(key, out_filename, dict(final_files=[out_filename], ovr_files=[str(out_filename) + '.ovr']))
+    os.remove(out_filename)
+    os.remove(str(out_filename) + '.ovr')
+    return out_filename
+
+
+def test_restore_is_a_copy(tmp_path):
+    cache = GdalosCache(tmp_path / 'cache')
+    out_filename = store_entry(tmp_path, cache)
+    files = dict()
+    assert cache.restore('k0', out_filename, files)
+    assert [len(files[c]) for c in ['final_files', 'ovr_files']] == [1, 1]
+    # an update of the restored output doesn't change the entry
+    write(out_filename, b'updated')
+    restored = tmp_path / 'restored.tif'
+    assert cache.restore('k0', restored)
+    assert read(restored) == b'base'
+
+
+def test_restore_without_overwrite(tmp_path):
+    cache = GdalosCache(tmp_path / 'cache')
+    out_filename = store_entry(tmp_path, cache)
+    write(str(out_filename) + '.ovr', b'other')
+    assert not cache.restore('k0', out_filename)
+    # the entry is restored all or nothing
+    assert not os.path.exists(out_filename)
+    assert read(str(out_filename) + '.ovr') == b'other'
+
+
+def test_restore_of_damaged_entry(tmp_path):
+    cache = GdalosCache(tmp_path / 'cache')
+    out_filename = store_entry(tmp_path, cache)
+    entry_files = sorted(os.listdir(cache.entry_path('k0')))
+    os.remove(cache.entry_path('k0') / [f for f in entry_files if f.endswith('.ovr')][0])
+    assert not cache.restore('k0', out_filename)
+    assert not os.path.exists(out_filename)
+    assert 'k0' not in cache
+
+
+def test_key_of_temp_paths():
+    def job(temp_dir):
+        temp_filename = f'{temp_dir}/out.temp.tif'
+        return [dict(filename=temp_filename, cutlineDSName=f'{temp_dir}.gpkg'),
+                dict(filename=temp_filename + '.ovr')], [temp_filename, f'{temp_dir}.gpkg']
+
+    keys = []
+    for temp_dir in ['/vsimem/gdalos_1234', '/tmp/gdalos_temp_5678']:
+        parts, temp_files = job(temp_dir)
+        keys.append(make_key(parts, out_prefix='/data/out', temp_prefixes=temp_files))
+    assert keys[0] == keys[1]
+    parts, temp_files = job('/vsimem/gdalos_1234')
+    assert make_key(parts, temp_prefixes=temp_files) != make_key(parts + [dict(resampling='cubic')],
+                                                                 temp_prefixes=temp_files)
@@ -0,0 +1,106 @@
+from functools import partial
+
+import pytest
+
+np = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+
+from osgeo_utils.auxiliary.extent_util import Extent
+
+from gdalos.calc import gdalos_combine
+from gdalos.calc.gdalos_combine import RasterCombiner
+
+ndv = 0
+res = 10
+# (x0, y0, width, height) of each dataset, in pixels of a common grid, partially overlapping
+windows = [(0, 0, 12, 10), (5, 3, 10, 12), (8, -2, 6, 10), (-3, 6, 15, 7)]
+
+accumulators = [
+    (gdalos_combine.MaxAccumulator, gdalos_combine.vs_max),
+    (gdalos_combine.MinAccumulator, gdalos_combine.vs_min),
+    (gdalos_combine.CountAccumulator, gdalos_combine.vs_count),
+    (gdalos_combine.CountZAccumulator, gdalos_combine.vs_count_z),
+    (gdalos_combine.UniqueAccumulator, gdalos_combine.vs_unique),
+    (gdalos_combine.IndexAccumulator, gdalos_combine.get_by_index),
+]
+
+
+def make_arrays(seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 6, (h, w)).astype(np.uint8) for x0, y0, w, h in windows]
+
+
+def make_ds(arr, x0, y0):
+    ds = gdal.GetDriverByName('MEM').Create('', arr.shape[1], arr.shape[0], 1, gdal.GDT_Byte)
+    ds.SetGeoTransform([x0 * res, res, 0, -y0 * res, 0, -res])
+    bnd = ds.GetRasterBand(1)
+    bnd.WriteArray(arr)
+    bnd.SetNoDataValue(ndv)
+    return ds
+
+
+def get_extent_window(extent):
+    x0s = [w[0] for w in windows]
+    y0s = [w[1] for w in windows]
+    x1s = [w[0] + w[2] for w in windows]
+    y1s = [w[1] + w[3] for w in windows]
+    if extent == Extent.UNION:
+        return min(x0s), min(y0s), max(x1s), max(y1s)
+    return max(x0s), max(y0s), min(x1s), min(y1s)
+
+
+def stack_arrays(arrays, window):
+    """ returns the arrays in the given window, filled with ndv (like the vrts of gdal_calc) """
+    wx0, wy0, wx1, wy1 = window
+    stacked = []
+    for arr, (x0, y0, w, h) in zip(arrays, windows):
+        full = np.full((wy1 - wy0, wx1 - wx0), ndv, dtype=arr.dtype)
+        gdalos_combine.copy_overlap(arr, full, y0 - wy0, x0 - wx0)
+        stacked.append(full)
+    return stacked
+
+
+def combine(accumulator, arrays, extent, hide_ndv=True, no_data_value=None):
+    combiner = RasterCombiner(accumulator, extent=extent, hide_ndv=hide_ndv)
+    for arr, (x0, y0, w, h) in zip(arrays, windows):
+        combiner.add(make_ds(arr, x0, y0))
+    ds = combiner.get_ds(no_data_value=no_data_value)
+    gt = ds.GetGeoTransform()
+    window = round(gt[0] / res), round(-gt[3] / res), \
+        round(gt[0] / res) + ds.RasterXSize, round(-gt[3] / res) + ds.RasterYSize
+    return ds.GetRasterBand(1).ReadAsArray(), window
+
+
+@pytest.mark.parametrize('extent', [Extent.UNION, Extent.INTERSECT])
+@pytest.mark.parametrize('accumulator, ref', accumulators)
+def test_combiner_vs_stacked(accumulator, ref, extent):
+    arrays = make_arrays()
+    res_arr, res_window = combine(accumulator, arrays, extent)
+    window = get_extent_window(extent)
+    assert res_window == window
+    expected = ref(stack_arrays(arrays, window))
+    assert np.array_equal(res_arr, expected.astype(res_arr.dtype))
+
+
+@pytest.mark.parametrize('accumulator, ref', accumulators)
+def test_combiner_show_ndv(accumulator, ref):
+    no_data_value = 255
+    arrays = make_arrays(1)
+    res_arr, res_window = combine(accumulator, arrays, Extent.UNION, hide_ndv=False, no_data_value=no_data_value)
+    stacked = stack_arrays(arrays, res_window)
+    expected = ref(stacked).astype(res_arr.dtype)
+    # a pixel that is ndv in any of the datasets (or out of any of them) is ndv
+    expected[np.any(np.stack(stacked) == ndv, axis=0)] = no_data_value
+    assert np.array_equal(res_arr, expected)
+
+
+@pytest.mark.parametrize('accumulator', [gdalos_combine.UniqueAccumulator,
+                                         partial(gdalos_combine.IndexAccumulator, index=2)])
+def test_combiner_out_of_order(accumulator):
+    arrays = make_arrays(2)
+    res_arr, res_window = combine(accumulator, arrays, Extent.UNION)
+    # the datasets are added in reverse, each with its index
+    combiner = RasterCombiner(accumulator, extent=Extent.UNION)
+    for idx in reversed(range(len(windows))):
+        combiner.add(make_ds(arrays[idx], *windows[idx][:2]), index=idx)
+    assert np.array_equal(combiner.get_ds().GetRasterBand(1).ReadAsArray(), res_arr)
@@ -0,0 +1,112 @@
+import math
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('osgeo.gdal')
+
+from gdalos import gdalos_extent, projdef
+from gdalos.gdalos_extent import calc_dx_dy_from_extent_and_count, round_to_sig, transform_resolution_p
+from gdalos.rectangle import GeoRectangle
+
+# (src srs, tgt srs, extent in the src srs, resolution in the src srs)
+cases = [
+    # geographic <-> utm
+    (4326, 32636, GeoRectangle.from_min_max(34, 36, 29, 33), (0.001, -0.001)),
+    (32636, 4326, GeoRectangle.from_min_max(600000, 700000, 3500000, 3600000), (30, -30)),
+    # across the antimeridian, from the longitudes beyond 180 and from utm zone 1 to longitudes of both sides
+    (4326, 32660, GeoRectangle.from_min_max(175, 185, -20, -10), (0.001, -0.001)),
+    (32601, 4326, GeoRectangle.from_min_max(150000, 350000, 5000000, 5200000), (30, -30)),
+    # geographic <-> web mercator
+    (4326, 3857, GeoRectangle.from_min_max(-170, 170, -80, 80), (0.01, -0.01)),
+    (3857, 32636, GeoRectangle.from_min_max(3500000, 4000000, 3500000, 4000000), (10, -10)),
+]
+
+
+def get_transform(src_srs, tgt_srs):
+    return projdef.get_transform(projdef.get_srs_pj(src_srs), projdef.get_srs_pj(tgt_srs))
+
+
+def transform_extent_loop(extent, transform, sample_count=1000):
+    """ the implementation of transform_extent of a point at a time """
+    maxf = float("inf")
+    (out_min_x, out_max_x, out_min_y, out_max_y) = (maxf, -maxf, maxf, -maxf)
+
+    dx, dy = calc_dx_dy_from_extent_and_count(extent, sample_count)
+    if dx == 0:
+        return GeoRectangle.empty()
+
+    y = float(extent.min_y)
+    while y <= extent.max_y + dy:
+        x = float(extent.min_x)
+        while x <= extent.max_x + dx:
+            tx, ty, tz = transform.TransformPoint(x, y)
+            x += dx
+            if not math.isfinite(tz):
+                continue
+            out_min_x = min(out_min_x, tx)
+            out_max_x = max(out_max_x, tx)
+            out_min_y = min(out_min_y, ty)
+            out_max_y = max(out_max_y, ty)
+        y += dy
+
+    return GeoRectangle.from_min_max(out_min_x, out_max_x, out_min_y, out_max_y)
+
+
+def transform_resolution_loop(transform, input_res, extent, equal_res=..., sample_count=1000):
+    """ the implementation of transform_resolution of a point at a time """
+    dx, dy = calc_dx_dy_from_extent_and_count(extent, sample_count)
+
+    calc_only_res_y = equal_res is ...
+    out_x = []
+    out_y = []
+    y = float(extent.min_y)
+    while y <= extent.max_y:
+        x = float(extent.min_x)
+        while x < extent.max_x:
+            out_y.append(transform_resolution_p(transform, 0, input_res[1], x, y))
+            if not calc_only_res_y:
+                out_x.append(transform_resolution_p(transform, input_res[0], 0, x, y))
+            x += dx
+        y += dy
+
+    if calc_only_res_y:
+        out_y.sort()
+        out_x = out_y
+    if equal_res:
+        out_y.extend(out_x)
+        out_y.sort()
+        out_x = out_y
+    else:
+        out_x.sort()
+        out_y.sort()
+    out_r = [out_x, out_y]
+
+    out_res = [round_to_sig(r[round(len(r) / 2)], -1) for r in out_r]
+    out_res[1] = -out_res[1]
+    return out_res
+
+
+@pytest.mark.parametrize('src_srs, tgt_srs, extent, res', cases)
+@pytest.mark.parametrize('sample_count', [10, 1000])
+def test_transform_extent(src_srs, tgt_srs, extent, res, sample_count):
+    transform = get_transform(src_srs, tgt_srs)
+    expected = transform_extent_loop(extent, transform, sample_count)
+    assert not expected.is_empty()
+    assert gdalos_extent.transform_extent(extent, transform, sample_count).min_max == \
+           pytest.approx(expected.min_max, rel=1e-12)
+
+
+def test_transform_extents():
+    extents = [c[2] for c in cases if c[0] == 4326] + [GeoRectangle.empty()]
+    transform = get_transform(4326, 32636)
+    assert [e.min_max for e in gdalos_extent.transform_extents(extents, transform)] == \
+           [gdalos_extent.transform_extent(e, transform).min_max for e in extents]
+
+
+@pytest.mark.parametrize('src_srs, tgt_srs, extent, res', cases)
+@pytest.mark.parametrize('equal_res', [..., False, True])
+def test_transform_resolution(src_srs, tgt_srs, extent, res, equal_res):
+    transform = get_transform(src_srs, tgt_srs)
+    assert gdalos_extent.transform_resolution(transform, res, extent, equal_res) == \
+           transform_resolution_loop(transform, res, extent, equal_res)
@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip('osgeo.gdal')
+
+from gdalos.gdalos_plan import execute_bounded, execute_bounded_iter
+
+
+def square(x):
+    if x < 0:
+        raise ValueError(x)
+    return x * x
+
+
+def test_execute_bounded_iter():
+    kwargs_list = [dict(x=x) for x in [1, 2, -1, 3]]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = dict(execute_bounded_iter(executor, square, kwargs_list, max_pending=2))
+    assert results == {0: 1, 1: 4, 2: None, 3: 9}
+
+
+def test_execute_bounded():
+    kwargs_list = [dict(x=x) for x in [3, -2, 1]]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert execute_bounded(executor, square, kwargs_list, max_pending=1) == [9, None, 1]
@@ -0,0 +1,91 @@
+import shutil
+
+import pytest
+
+np = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+
+from gdalos import gdalos_pyramid
+from gdalos.gdalos_types import OvrType
+
+ovr_count = 3
+
+
+def make_src(filename, width, height, data_type=gdal.GDT_Int16, nodata=None, smooth=False):
+    ds = gdal.GetDriverByName('GTiff').Create(str(filename), width, height, 2, data_type, ['TILED=YES'])
+    ds.SetGeoTransform([600000, 30, 0, 3600000, 0, -30])
+    ds.SetProjection('EPSG:32636')
+    rng = np.random.default_rng(0)
+    rows, cols = np.indices((height, width))
+    for i in range(2):
+        if smooth:
+            arr = 100 * np.sin(rows / 17 + i) * np.cos(cols / 23) + 200
+        else:
+            arr = rng.integers(0, 1000, (height, width))
+        if nodata is not None:
+            arr[rng.random((height, width)) < 0.1] = nodata
+            ds.GetRasterBand(i + 1).SetNoDataValue(nodata)
+        ds.GetRasterBand(i + 1).WriteArray(arr)
+    ds = None
+    return filename
+
+
+def read_overviews(filename):
+    ds = gdal.Open(str(filename))
+    levels = []
+    for i in range(ds.GetRasterBand(1).GetOverviewCount()):
+        levels.append(np.stack([ds.GetRasterBand(b + 1).GetOverview(i).ReadAsArray() for b in range(ds.RasterCount)]))
+    return levels
+
+
+def build_both(tmp_path, resampling, ovr_type=OvrType.create_external_single, **kwargs):
+    """ returns the overviews by the pyramid builder and by gdal BuildOverviews, of copies of the same raster """
+    src = make_src(tmp_path / 'src.tif', **kwargs)
+    pyramid_filename = tmp_path / 'pyramid.tif'
+    gdal_filename = tmp_path / 'gdal.tif'
+    shutil.copy(src, pyramid_filename)
+    shutil.copy(src, gdal_filename)
+    assert gdalos_pyramid.gdalos_pyramid(pyramid_filename, ovr_type, ovr_count, resampling)
+    ds = gdal.Open(str(gdal_filename))
+    assert ds.BuildOverviews(resampling.upper(), [2 ** (i + 1) for i in range(ovr_count)]) == 0
+    ds = None
+    return read_overviews(pyramid_filename), read_overviews(gdal_filename)
+
+
+@pytest.mark.parametrize('resampling', ['nearest', 'average'])
+@pytest.mark.parametrize('nodata', [None, -1])
+def test_pyramid_vs_build_overviews(tmp_path, resampling, nodata):
+    pyramid_levels, gdal_levels = build_both(tmp_path, resampling, width=256, height=256, nodata=nodata)
+    assert len(pyramid_levels) == len(gdal_levels) == ovr_count
+    assert np.array_equal(pyramid_levels[0], gdal_levels[0])
+    if nodata is None:
+        # the next levels are reduced from the previous level, which might round differently than gdal
+        for p, g in zip(pyramid_levels[1:], gdal_levels[1:]):
+            assert np.abs(p.astype(np.int32) - g).max() <= (0 if resampling == 'nearest' else 1)
+
+
+@pytest.mark.parametrize('resampling', ['average', 'bilinear', 'cubic'])
+def test_pyramid_vs_build_overviews_smooth(tmp_path, resampling):
+    # odd sizes, the edges are resampled differently, thus only the inner pixels are compared
+    pyramid_levels, gdal_levels = build_both(tmp_path, resampling, width=255, height=201,
+                                             data_type=gdal.GDT_Float32, smooth=True)
+    for p, g in zip(pyramid_levels, gdal_levels):
+        assert p.shape == g.shape
+        assert np.allclose(p[:, 2:-2, 2:-2], g[:, 2:-2, 2:-2], atol=1)
+
+
+def test_pyramid_multi_files(tmp_path):
+    pyramid_levels, gdal_levels = build_both(tmp_path, 'average', ovr_type=OvrType.create_external_multi,
+                                             width=256, height=256)
+    # a chain of .ovr files, of which each holds a single level
+    ds = gdal.Open(str(tmp_path / 'pyramid.tif.ovr'))
+    assert (ds.RasterXSize, ds.RasterYSize) == (128, 128)
+    assert pyramid_levels[0].shape == gdal_levels[0].shape
+    assert np.array_equal(ds.ReadAsArray(), gdal_levels[0])
+
+
+def test_pyramid_not_supported(tmp_path):
+    src = make_src(tmp_path / 'src.tif', 64, 64)
+    assert gdalos_pyramid.gdalos_pyramid(src, OvrType.create_external_single, ovr_count, 'lanczos') is None
+    assert gdalos_pyramid.gdalos_pyramid(src, OvrType.create_internal, ovr_count, 'average') is None
+    assert not (tmp_path / 'src.tif.ovr').exists()
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+
+from gdalos import gdalos_tiff_copy
+
+width, height = 700, 600
+tile = 256
+
+
+def make_src(filename, bands=1, data_type=gdal.GDT_Int16, **creation_options):
+    ds = gdal.GetDriverByName('GTiff').Create(
+        str(filename), width, height, bands, data_type, [f'{k}={v}' for k, v in creation_options.items()])
+    ds.SetGeoTransform([600000, 30, 0, 3600000, 0, -30])
+    ds.SetProjection('EPSG:32636')
+    rows, cols = np.indices((height, width))
+    for i in range(bands):
+        bnd = ds.GetRasterBand(i + 1)
+        bnd.WriteArray(((rows * 7 + cols * 3 + i * 11 + (rows * cols) % 23) % 200).astype(np.int16))
+        bnd.SetNoDataValue(199)
+    ds = None
+    return gdal.Open(str(filename))
+
+
+@pytest.mark.parametrize('compress', ['LZW', 'DEFLATE'])
+@pytest.mark.parametrize('predictor', [1, 2])
+@pytest.mark.parametrize('big_tiff', ['NO', 'YES'])
+@pytest.mark.parametrize('bands, interleave', [(1, 'BAND'), (3, 'PIXEL'), (3, 'BAND')])
+@pytest.mark.parametrize('src_win', [
+    (0, 0, width, height),  # the whole raster, with partial edge tiles
+    (tile, 0, 300, 300),
+    (tile, tile, width - tile, height - tile),  # up to the edges
+])
+def test_tiff_copy_tiles_round_trip(tmp_path, compress, predictor, big_tiff, bands, interleave, src_win):
+    src_ds = make_src(tmp_path / 'src.tif', bands=bands, TILED='YES', BLOCKXSIZE=tile, BLOCKYSIZE=tile,
+                      COMPRESS=compress, PREDICTOR=predictor, BIGTIFF=big_tiff, INTERLEAVE=interleave)
+    out_filename = tmp_path / 'out.tif'
+    assert gdalos_tiff_copy.tiff_copy_tiles(src_ds, out_filename, src_win=src_win, big_tiff=big_tiff)
+    out_ds = gdal.Open(str(out_filename))
+    assert (out_ds.RasterXSize, out_ds.RasterYSize) == tuple(src_win[2:])
+    assert np.array_equal(out_ds.ReadAsArray(), src_ds.ReadAsArray(*src_win))
+    assert out_ds.GetRasterBand(1).GetNoDataValue() == 199
+    gt = src_ds.GetGeoTransform()
+    assert out_ds.GetGeoTransform() == (gt[0] + src_win[0] * gt[1], gt[1], 0, gt[3] + src_win[1] * gt[5], 0, gt[5])
+    image_structure = out_ds.GetMetadata('IMAGE_STRUCTURE')
+    assert image_structure.get('COMPRESSION') == compress
+
+
+def test_tiff_copy_tiles_proj_win(tmp_path):
+    src_ds = make_src(tmp_path / 'src.tif', TILED='YES', COMPRESS='DEFLATE')
+    gt = src_ds.GetGeoTransform()
+    proj_win = [gt[0] + tile * gt[1], gt[3], gt[0] + (tile + 100) * gt[1], gt[3] + 200 * gt[5]]
+    out_filename = tmp_path / 'out.tif'
+    assert gdalos_tiff_copy.tiff_copy_tiles(src_ds, out_filename, proj_win=proj_win)
+    assert np.array_equal(gdal.Open(str(out_filename)).ReadAsArray(), src_ds.ReadAsArray(tile, 0, 100, 200))
+
+
+@pytest.mark.parametrize('creation_options, src_win', [
+    (dict(TILED='NO', COMPRESS='DEFLATE'), (0, 0, 100, 100)),  # strips
+    (dict(TILED='YES', COMPRESS='DEFLATE'), (10, 0, 100, 100)),  # not on the tile grid
+    (dict(TILED='YES', COMPRESS='JPEG'), (0, 0, 100, 100)),  # the tiles share the jpeg tables
+])
+def test_tiff_copy_tiles_not_suitable(tmp_path, creation_options, src_win):
+    data_type = gdal.GDT_Byte if creation_options['COMPRESS'] == 'JPEG' else gdal.GDT_Int16
+    src_ds = make_src(tmp_path / 'src.tif', data_type=data_type, **creation_options)
+    out_filename = tmp_path / 'out.tif'
+    assert not gdalos_tiff_copy.tiff_copy_tiles(src_ds, out_filename, src_win=src_win)
+    assert not os.path.exists(out_filename)
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+np = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+
+from gdalos.gdalos_tiles import gdalos_tiles, web_mercator_bound
+from gdalos.gdalos_types import GdalResamplingAlg, TileFormat
+
+# a raster of 2x2 tiles of zoom 2 of web mercator, which are the tiles x: 1-2, y: 1-2.
+# the left half has data (100 at the top tile, 200 at the bottom one), the right half is nodata
+b = web_mercator_bound
+size = 512
+res = b / size
+
+
+def make_src(filename):
+    ds = gdal.GetDriverByName('GTiff').Create(str(filename), size, size, 1, gdal.GDT_Byte)
+    ds.SetGeoTransform([-b / 2, res, 0, b / 2, 0, -res])
+    ds.SetProjection('EPSG:3857')
+    arr = np.zeros((size, size), dtype=np.uint8)
+    arr[:size // 2, :size // 2] = 100
+    arr[size // 2:, :size // 2] = 200
+    bnd = ds.GetRasterBand(1)
+    bnd.WriteArray(arr)
+    bnd.SetNoDataValue(0)
+    ds = None
+    return filename
+
+
+def make_tiles(tmp_path, tile_format, ext, **kwargs):
+    out_path = tmp_path / f'tiles.{ext}'
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        count = gdalos_tiles(make_src(tmp_path / 'src.tif'), out_path, tile_format=tile_format,
+                             resampling_alg=GdalResamplingAlg.nearest, executor=executor, **kwargs)
+    return out_path, count
+
+
+def decode_tile(data):
+    path = f'/vsimem/gdalos_tiles_test_{uuid.uuid4().hex}.png'
+    gdal.FileFromMemBuffer(path, bytes(data))
+    try:
+        return gdal.Open(path).ReadAsArray()
+    finally:
+        gdal.Unlink(path)
+
+
+def read_sqlite_tiles(out_path, table_name):
+    con = sqlite3.connect(str(out_path))
+    try:
+        return {(z, x, y): data for z, x, y, data in con.execute(
+            f'SELECT zoom_level, tile_column, tile_row, tile_data FROM "{table_name}"')}
+    finally:
+        con.close()
+
+
+def test_xyz(tmp_path):
+    out_path, count = make_tiles(tmp_path, TileFormat.xyz, 'xyz')
+    # the zooms are from the one in which the raster fits a tile to the one of its resolution,
+    # the tiles of the nodata half are skipped
+    files = sorted(os.path.relpath(os.path.join(root, f), out_path).replace(os.sep, '/')
+                   for root, _, filenames in os.walk(out_path) for f in filenames)
+    assert files == ['1/0/0.png', '1/0/1.png', '2/1/1.png', '2/1/2.png']
+    assert count == len(files)
+    arr = gdal.Open(str(out_path / '2' / '1' / '1.png')).ReadAsArray()
+    assert arr.shape == (2, 256, 256)
+    assert (arr[0] == 100).all() and (arr[1] == 255).all()
+    assert (gdal.Open(str(out_path / '2' / '1' / '2.png')).ReadAsArray()[0] == 200).all()
+
+
+def test_mbtiles(tmp_path):
+    out_path, count = make_tiles(tmp_path, TileFormat.mbtiles, 'mbtiles')
+    tiles = read_sqlite_tiles(out_path, 'tiles')
+    # the tms rows are counted from the bottom: row = 2 ** zoom - 1 - y
+    assert sorted(tiles) == [(1, 0, 0), (1, 0, 1), (2, 1, 1), (2, 1, 2)]
+    assert count == len(tiles)
+    assert (decode_tile(tiles[(2, 1, 2)])[0] == 100).all()
+    assert (decode_tile(tiles[(2, 1, 1)])[0] == 200).all()
+    con = sqlite3.connect(str(out_path))
+    try:
+        metadata = dict(con.execute('SELECT name, value FROM metadata'))
+    finally:
+        con.close()
+    assert (metadata['minzoom'], metadata['maxzoom'], metadata['format']) == ('1', '2', 'png')
+
+
+def test_gpkg(tmp_path):
+    out_path, count = make_tiles(tmp_path, TileFormat.gpkg, 'gpkg', table_name='t')
+    tiles = read_sqlite_tiles(out_path, 't')
+    # the gpkg rows are counted from the top, as of xyz
+    assert sorted(tiles) == [(1, 0, 0), (1, 0, 1), (2, 1, 1), (2, 1, 2)]
+    assert count == len(tiles)
+    assert (decode_tile(tiles[(2, 1, 1)])[0] == 100).all()
+    con = sqlite3.connect(str(out_path))
+    try:
+        matrix = list(con.execute(
+            'SELECT zoom_level, matrix_width, matrix_height FROM gpkg_tile_matrix WHERE table_name = ? '
+            'ORDER BY zoom_level', ('t',)))
+    finally:
+        con.close()
+    assert matrix == [(1, 2, 2), (2, 4, 4)]
+
+
+def test_zoom_range(tmp_path):
+    out_path, count = make_tiles(tmp_path, TileFormat.xyz, 'xyz', min_zoom=2, max_zoom=3, metatile=2)
+    assert sorted(os.listdir(out_path)) == ['2', '3']
+    # zoom 3 has 4x4 tiles of which the left 2 columns have data, split between 4 metatiles
+    zoom3 = sorted((int(x), int(os.path.splitext(y)[0]))
+                   for x in os.listdir(out_path / '3') for y in os.listdir(out_path / '3' / x))
+    assert zoom3 == [(x, y) for x in [2, 3] for y in range(2, 6)]
+    assert count == len(zoom3) + 2
@@ -0,0 +1,165 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+
+from gdalos.gdalos_plan import JobKind, JobState, gdalos_execute_plan
+from gdalos.gdalos_temp import TempWorkspace
+from gdalos.gdalos_trans import gdalos_trans, gdalos_trans_plan, gdalos_trans_step
+from gdalos.gdalos_types import OvrType
+from gdalos.rectangle import GeoRectangle
+
+size = 512
+res = 30
+x0, y0 = 600000, 3600000
+
+
+def make_src(filename, overviews=True, **creation_options):
+    creation_options = dict(dict(TILED='YES', COMPRESS='DEFLATE'), **creation_options)
+    ds = gdal.GetDriverByName('GTiff').Create(
+        str(filename), size, size, 1, gdal.GDT_Int16, [f'{k}={v}' for k, v in creation_options.items()])
+    ds.SetGeoTransform([x0, res, 0, y0 + size * res, 0, -res])
+    ds.SetProjection('EPSG:32636')
+    rows, cols = np.indices((size, size))
+    ds.GetRasterBand(1).WriteArray((rows * 3 + cols * 2 + (rows * cols) % 17).astype(np.int16))
+    if overviews:
+        ds.BuildOverviews('AVERAGE', [2, 4, 8])
+    ds = None
+    return filename
+
+
+def get_extent(margin=50):
+    return GeoRectangle.from_min_max(
+        x0 + margin * res, x0 + (size - margin) * res, y0 + margin * res, y0 + (size - margin) * res)
+
+
+def read_levels(filename):
+    ds = gdal.Open(str(filename))
+    bnd = ds.GetRasterBand(1)
+    levels = [bnd] + [bnd.GetOverview(i) for i in range(bnd.GetOverviewCount())]
+    return [(b.XSize, b.YSize, b.ReadRaster()) for b in levels]
+
+
+def test_cog_streaming_vs_2_steps(tmp_path):
+    src = make_src(tmp_path / 'src.tif')
+    outputs = dict()
+    for cog_streaming in [False, True]:
+        out_filename = tmp_path / 'out_{}.tif'.format(cog_streaming)
+        assert gdalos_trans(src, out_filename=out_filename, cog=True, extent=get_extent(), extent_in_4326=False,
+                            cog_streaming=cog_streaming, write_info=False)
+        # the spec is written next to the final output (not next to an in-memory intermediate)
+        assert os.path.isfile(str(out_filename) + '.spec')
+        assert not os.path.exists(str(out_filename.with_suffix('.temp.tif')))
+        outputs[cog_streaming] = read_levels(out_filename)
+    assert len(outputs[True]) > 1
+    assert outputs[True] == outputs[False]
+
+
+@pytest.mark.parametrize('in_memory', [True, False])
+def test_cog_2_steps_in_workspace(tmp_path, in_memory):
+    src = make_src(tmp_path / 'src.tif')
+    out_filename = tmp_path / 'out.tif'
+    scratch_dir = tmp_path / 'scratch'
+    with TempWorkspace(ram_budget=None if in_memory else 0, scratch_dir=scratch_dir) as workspace:
+        assert gdalos_trans(src, out_filename=out_filename, cog=True, extent=get_extent(), extent_in_4326=False,
+                            ovr_type='create_external_auto', workspace=workspace, write_info=True)
+    # the spec and the info belong to the final output, not to the intermediate file in the workspace
+    assert os.path.isfile(str(out_filename) + '.spec')
+    assert os.path.isfile(str(out_filename) + '.info')
+    assert not os.path.exists(str(out_filename.with_suffix('.temp.tif')))
+
+
+def test_report_of_cog_2_steps(tmp_path):
+    src = make_src(tmp_path / 'src.tif')
+    out_filename = tmp_path / 'out.tif'
+    with TempWorkspace() as workspace:
+        assert gdalos_trans(src, out_filename=out_filename, cog=True, extent=get_extent(), extent_in_4326=False,
+                            workspace=workspace, cog_streaming=True, write_report=True)
+    assert os.path.isfile(str(out_filename) + '.report.json')
+
+
+def test_report_phases_closed_on_early_return(tmp_path):
+    src = make_src(tmp_path / 'src.tif')
+    phases = []
+    far_extent = GeoRectangle.from_min_max(0, 1000, 0, 1000)
+    assert gdalos_trans(src, out_filename=tmp_path / 'out.tif', extent=far_extent, extent_in_4326=False,
+                        extent_silent_fail_if_empty=True, report_callback=phases.append) is None
+    assert 'resolve' in [phase['name'] for phase in phases]
+
+
+@pytest.mark.parametrize('tile_copy', [False, True])
+def test_extent_aligned_tile_copy(tmp_path, tile_copy):
+    src = make_src(tmp_path / 'src.tif', overviews=False)
+    out_filename = tmp_path / 'out.tif'
+    assert gdalos_trans(src, out_filename=out_filename, cog=False, of='GTiff', extent=get_extent(),
+                        extent_in_4326=False, extent_aligned=True, ovr_type='no_overviews', tile_copy=tile_copy)
+    ds = gdal.Open(str(out_filename))
+    # only a tile copy snaps the extent (outwards) to the tile grid of the source
+    expected_size = size if tile_copy else size - 100
+    assert (ds.RasterXSize, ds.RasterYSize) == (expected_size, expected_size)
+    xoff = (size - expected_size) // 2
+    src_ds = gdal.Open(str(src))
+    assert np.array_equal(ds.ReadAsArray(), src_ds.ReadAsArray(xoff, xoff, expected_size, expected_size))
+
+
+@pytest.mark.parametrize('tile_copy_margin', [0, 10])
+def test_tile_copy_fallback_extent(tmp_path, tile_copy_margin):
+    src = make_src(tmp_path / 'src.tif', overviews=False)
+    out_filename = tmp_path / 'out.tif'
+    # a window that doesn't start on the tile grid can't be copied, then the crop is of the extent that isn't snapped
+    assert gdalos_trans_step(src, out_filename, translate_options=dict(projWin=get_extent().lurd),
+                             tile_copy=True, tile_copy_proj_win=get_extent(tile_copy_margin).lurd)
+    ds = gdal.Open(str(out_filename))
+    expected_size = size if tile_copy_margin == 0 else size - 100
+    assert (ds.RasterXSize, ds.RasterYSize) == (expected_size, expected_size)
+
+
+def test_plan_auto_ovr_type(tmp_path):
+    src = make_src(tmp_path / 'src.tif')
+    out_filename = tmp_path / 'out.tif'
+    plan = gdalos_trans_plan(src, out_filename=out_filename, cog=True, extent=get_extent(), extent_in_4326=False,
+                             ovr_type='create_external_auto', cog_streaming=False, write_info=False)
+    ovr_jobs = [job for job in plan if job.kind == JobKind.ovr]
+    assert len(ovr_jobs) == 1
+    # the ovr type is decided by the size of the base file once it exists, as it would be without a plan
+    assert ovr_jobs[0].kwargs["ovr_type"] == OvrType.create_external_auto
+    executed = gdalos_execute_plan(plan)
+    assert all(job.state == JobState.done for job in executed)
+    temp_filename = ovr_jobs[0].kwargs["filename"]
+    assert not os.path.exists(temp_filename)
+    assert not os.path.exists(str(temp_filename) + '.ovr')
+    assert len(read_levels(out_filename)) > 1
+
+
+def test_plan_writes_nothing(tmp_path):
+    src = make_src(tmp_path / 'src.tif')
+    out_path = tmp_path / 'new_dir'
+    plan = gdalos_trans_plan(src, out_path=out_path, cog=True, extent=get_extent(), extent_in_4326=False,
+                             write_spec=True, write_info=False)
+    # planning into a folder that doesn't exist yet, the spec is started by a job
+    assert not out_path.exists()
+    assert plan[0].kind == JobKind.spec
+    executed = gdalos_execute_plan(plan)
+    assert all(job.state == JobState.done for job in executed)
+    spec_filename = plan[0].kwargs["spec_filename"]
+    assert os.path.isfile(spec_filename)
+    with open(spec_filename) as f:
+        assert 'gdalos versoin' in f.read()
+
+
+def test_plan_cutline_made_by_job(tmp_path):
+    src = make_src(tmp_path / 'src.tif', overviews=False)
+    out_filename = tmp_path / 'out.tif'
+    # a box around the raster (in either axis order)
+    cutline = ['POLYGON ((31 31, 36 31, 36 36, 31 36, 31 31))']
+    plan = gdalos_trans_plan(src, out_filename=out_filename, cog=False, of='GTiff', cutline=cutline,
+                             ovr_type='no_overviews', write_spec=False, write_info=False)
+    trans_jobs = [job for job in plan if job.kind == JobKind.trans]
+    cutline_filename = trans_jobs[0].kwargs["warp_options"]["cutlineDSName"]
+    assert not os.path.exists(cutline_filename)
+    executed = gdalos_execute_plan(plan)
+    assert all(job.state == JobState.done for job in executed)
+    assert os.path.isfile(out_filename)
+    assert not os.path.exists(cutline_filename)
@@ -0,0 +1,92 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+
+from gdalos.gdalos_types import RasterKind
+from gdalos.gdalos_update import gdalos_update
+from gdalos.rectangle import GeoRectangle
+
+# odd sizes, so the overview ratios are not exactly 2
+width, height = 301, 253
+res = 30
+x0, y0 = 600000, 3600000
+overview_list = [2, 4, 8]
+patch_win = (70, 90, 60, 50)  # (col, row, cols, rows) of the updated region
+
+
+def make_arr(seed):
+    rng = np.random.default_rng(seed)
+    rows, cols = np.indices((height, width))
+    return (100 * np.sin(rows / 13) * np.cos(cols / 19) + rng.integers(0, 50, (height, width))).astype(np.int16)
+
+
+def make_tif(filename, arr, resampling, internal):
+    ds = gdal.GetDriverByName('GTiff').Create(str(filename), width, height, 1, gdal.GDT_Int16,
+                                              ['TILED=YES', 'BLOCKXSIZE=64', 'BLOCKYSIZE=64', 'COMPRESS=DEFLATE'])
+    ds.SetGeoTransform([x0, res, 0, y0, 0, -res])
+    ds.SetProjection('EPSG:32636')
+    ds.GetRasterBand(1).WriteArray(arr)
+    ds = None
+    ds = gdal.Open(str(filename), gdal.GA_Update if internal else gdal.GA_ReadOnly)
+    assert ds.BuildOverviews(resampling.upper(), overview_list) == 0
+    ds = None
+    return filename
+
+
+def make_patch(arr):
+    col, row, cols, rows = patch_win
+    ds = gdal.GetDriverByName('MEM').Create('', cols, rows, 1, gdal.GDT_Int16)
+    ds.SetGeoTransform([x0 + col * res, res, 0, y0 - row * res, 0, -res])
+    ds.SetProjection('EPSG:32636')
+    ds.GetRasterBand(1).WriteArray(arr[row:row + rows, col:col + cols])
+    return ds
+
+
+def get_patch_extent():
+    col, row, cols, rows = patch_win
+    return GeoRectangle.from_min_max(x0 + col * res, x0 + (col + cols) * res, y0 - (row + rows) * res, y0 - row * res)
+
+
+def read_levels(filename):
+    ds = gdal.Open(str(filename))
+    bnd = ds.GetRasterBand(1)
+    return [bnd.ReadAsArray()] + [bnd.GetOverview(i).ReadAsArray() for i in range(bnd.GetOverviewCount())]
+
+
+@pytest.mark.parametrize('resampling', ['nearest', 'average', 'cubic'])
+@pytest.mark.parametrize('internal', [False, True])
+def test_update_vs_rebuild(tmp_path, resampling, internal):
+    old_arr, new_arr = make_arr(0), make_arr(1)
+    col, row, cols, rows = patch_win
+    expected_arr = old_arr.copy()
+    expected_arr[row:row + rows, col:col + cols] = new_arr[row:row + rows, col:col + cols]
+
+    # the output is made from the old raster, then updated by the patch, the reference is built from scratch
+    out_filename = make_tif(tmp_path / 'out.tif', old_arr, resampling, internal)
+    ref_filename = make_tif(tmp_path / 'ref.tif', expected_arr, resampling, internal)
+    window = gdalos_update(out_filename, make_patch(new_arr), get_patch_extent(), extent_in_4326=False,
+                           resampling_alg='near', ovr_resampling_alg=resampling, kind=RasterKind.dtm)
+    assert window is not None
+    out_levels, ref_levels = read_levels(out_filename), read_levels(ref_filename)
+    assert len(out_levels) == len(ref_levels) == len(overview_list) + 1
+    assert np.array_equal(out_levels[0], ref_levels[0])
+    for out_level, ref_level in zip(out_levels[1:], ref_levels[1:]):
+        assert out_level.shape == ref_level.shape
+        assert np.abs(out_level.astype(np.int32) - ref_level).max() <= (0 if resampling == 'nearest' else 1)
+
+
+def test_update_cog_in_place(tmp_path):
+    src_filename = make_tif(tmp_path / 'src.tif', make_arr(0), 'average', internal=True)
+    out_filename = tmp_path / 'out.tif'
+    gdal.Translate(str(out_filename), str(src_filename), format='COG',
+                   creationOptions=['COMPRESS=DEFLATE', 'OVERVIEWS=FORCE_USE_EXISTING'])
+    size = out_filename.stat().st_size
+    assert gdalos_update(out_filename, make_patch(make_arr(1)), get_patch_extent(), extent_in_4326=False,
+                         resampling_alg='near', ovr_resampling_alg='average', kind=RasterKind.dtm)
+    # by default the cog is not rewritten, the changed blocks are appended to it
+    assert out_filename.stat().st_size > size
+    col, row, cols, rows = patch_win
+    ds = gdal.Open(str(out_filename))
+    assert np.array_equal(ds.GetRasterBand(1).ReadAsArray(col, row, cols, rows),
+                          make_arr(1)[row:row + rows, col:col + cols])
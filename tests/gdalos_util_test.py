@@ -0,0 +1,25 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+
+from gdalos import gdalos_util
+
+
+def make_tif(filename, size=64):
+    ds = gdal.GetDriverByName('GTiff').Create(str(filename), size, size, 1, gdal.GDT_Byte)
+    ds.SetGeoTransform([600000, 30, 0, 3600000, 0, -30])
+    ds.SetProjection('EPSG:32636')
+    ds.GetRasterBand(1).WriteArray(np.arange(size * size, dtype=np.uint8).reshape(size, size))
+    assert ds.BuildOverviews('NEAREST', [2, 4]) == 0
+    ds = None
+    return filename
+
+
+def test_open_ds_list_args(tmp_path):
+    filenames = [make_tif(tmp_path / f'{i}.tif') for i in range(2)]
+    # the open arguments apply to each dataset of a list, as of a single one
+    for ds in gdalos_util.open_ds(filenames, ovr_idx=2):
+        assert (ds.RasterXSize, ds.RasterYSize) == (16, 16)
+    for ds in gdalos_util.open_ds(filenames, gdal.GA_Update):
+        assert ds.GetAccess() == gdal.GA_Update
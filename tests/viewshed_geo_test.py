@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+
+from gdalos.gdalos_dtm_cache import ProjectedDtmCache
+from gdalos.gdalos_selector import DataSetSelector
+from gdalos.viewshed.viewshed_calc import viewshed_calc_to_ds, ViewshedBackend, CalcOperation, get_same_dtm_observers
+from gdalos.viewshed.viewshed_params import ViewshedParams, viewshed_visible
+
+
+def make_geo_dtm(filename, lon0=35.0, lat0=32.0, size=200, res=1 / 3600, z=100):
+    ds = gdal.GetDriverByName('GTiff').Create(str(filename), size, size, 1, gdal.GDT_Float32)
+    ds.SetGeoTransform([lon0, res, 0, lat0 + size * res, 0, -res])
+    ds.SetProjection('EPSG:4326')
+    ds.GetRasterBand(1).WriteArray(np.full((size, size), z, dtype=np.float32))
+    ds = None
+    return filename
+
+
+def make_vp(ox, oy, max_r=500):
+    vp = ViewshedParams()
+    vp.ox = ox
+    vp.oy = oy
+    vp.oz = 10
+    vp.tz = 0
+    vp.max_r = max_r
+    return vp
+
+
+def test_geographic_viewshed_numpy(tmp_path):
+    filename = make_geo_dtm(tmp_path / 'dtm.tif')
+    ds = viewshed_calc_to_ds([make_vp(35.027, 32.027)], filename, operation=None,
+                             backend=ViewshedBackend.numpy)
+    assert ds is not None
+    arr = ds.GetRasterBand(1).ReadAsArray()
+    assert (arr == viewshed_visible).any()
+
+
+def test_geographic_viewshed_shared_cache(tmp_path):
+    filename = make_geo_dtm(tmp_path / 'dtm.tif')
+    vp_array = [make_vp(35.027, 32.027), make_vp(35.028, 32.028)]
+    with ProjectedDtmCache() as dtm_cache:
+        ds = viewshed_calc_to_ds(vp_array, filename, operation=CalcOperation.count,
+                                 backend=ViewshedBackend.numpy, dtm_cache=dtm_cache)
+        assert ds is not None
+        # both observers are in the same bucket, so they share a single projected window
+        assert len(dtm_cache.items) == 1
+        arr = ds.GetRasterBand(1).ReadAsArray()
+        assert arr.max() == len(vp_array)
+
+
+def test_same_dtm_observers(tmp_path):
+    filenames = [make_geo_dtm(tmp_path / f'dtm_w84u{zone}.tif') for zone in [35, 36]]
+    selector = DataSetSelector([str(f) for f in filenames])
+    input_filename = Path(filenames[0]).resolve()
+    vp_array = [make_vp(28.01, 32.01), make_vp(34.01, 32.01), make_vp(28.02, 32.02), make_vp(28.2, 32.01)]
+    assert get_same_dtm_observers(vp_array[1:]) == vp_array[1:]
+    # the observers of another file of the selector are not batched with the first one
+    assert get_same_dtm_observers(vp_array[1:], None, selector, input_filename) == [vp_array[2], vp_array[3]]
+    # nor are the observers of another bucket (local projection) of a geographic dtm
+    dtm_cache = ProjectedDtmCache()
+    assert get_same_dtm_observers(vp_array[1:], None, selector, input_filename,
+                                  dtm_cache, dtm_cache.get_center(28.01, 32.01)) == [vp_array[2]]
@@ -0,0 +1,111 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+
+from gdalos.viewshed import viewshed_numpy
+from gdalos.viewshed.viewshed_params import ViewshedParams
+
+size = 101
+res = 10
+center = size // 2
+
+
+def make_dtm(z: np.ndarray) -> gdal.Dataset:
+    ds = gdal.GetDriverByName('MEM').Create('', z.shape[1], z.shape[0], 1, gdal.GDT_Float32)
+    ds.SetGeoTransform([0, res, 0, z.shape[0] * res, 0, -res])
+    ds.GetRasterBand(1).WriteArray(z)
+    return ds
+
+
+def make_vp(col=center, row=center, max_r=400, **kwargs):
+    vp = ViewshedParams()
+    vp.ox = (col + 0.5) * res
+    vp.oy = (size - row - 0.5) * res
+    vp.oz = 10
+    vp.tz = 0
+    vp.max_r = max_r
+    vp.refraction_coeff = 1  # no curvature, to keep the geometry of the tests simple
+    for k, v in kwargs.items():
+        setattr(vp, k, v)
+    return vp
+
+
+def calc(z, vp, cache=None) -> np.ndarray:
+    return viewshed_numpy.viewshed_calc_numpy(make_dtm(z), vp, cache=cache).ReadAsArray()
+
+
+def get_distances(arr: np.ndarray, vp: ViewshedParams) -> np.ndarray:
+    col, row, r, window = viewshed_numpy.get_observer_window(make_dtm(np.zeros((size, size))), vp)
+    rows, cols = np.indices(arr.shape)
+    return np.hypot((cols + window[0] - col) * res, (rows + window[1] - row) * res)
+
+
+def test_flat_terrain_fully_visible():
+    vp = make_vp(max_r_slant=False)
+    arr = calc(np.zeros((size, size), dtype=np.float32), vp)
+    d = get_distances(arr, vp)
+    assert (arr[d <= vp.max_r] == vp.vv).all()
+    assert (arr[d > vp.max_r] == vp.ov).all()
+
+
+def test_occluder_hides_cells_behind_it():
+    z = np.zeros((size, size), dtype=np.float32)
+    wall = center + 10
+    z[:, wall] = 100
+    vp = make_vp()
+    arr = calc(z, vp)
+    col, row, r, window = viewshed_numpy.get_observer_window(make_dtm(z), vp)
+    wall_col = wall - window[0]
+    row0 = row - window[1]
+    assert arr[row0, wall_col] == vp.vv
+    assert (arr[row0 - 5:row0 + 6, wall_col + 1:wall_col + 20] == vp.iv).all()
+    assert (arr[row0 - 5:row0 + 6, wall_col - 20:wall_col] == vp.vv).all()
+
+
+def test_min_r_mask():
+    vp = make_vp(min_r=100, max_r_slant=False)
+    arr = calc(np.zeros((size, size), dtype=np.float32), vp)
+    d = get_distances(arr, vp)
+    assert (arr[(d > 0) & (d < vp.min_r)] == vp.ov).all()
+    assert (arr[(d >= vp.min_r) & (d <= vp.max_r)] == vp.vv).all()
+
+
+def test_h_aperture_mask():
+    vp = make_vp(azimuth=90, h_aperture=90, max_r_slant=False)
+    arr = calc(np.zeros((size, size), dtype=np.float32), vp)
+    col, row, r, window = viewshed_numpy.get_observer_window(make_dtm(np.zeros((size, size))), vp)
+    row0, col0 = row - window[1], col - window[0]
+    assert arr[row0, col0 + 20] == vp.vv  # east
+    assert arr[row0, col0 - 20] == vp.ov  # west
+    assert arr[row0 - 20, col0] == vp.ov  # north
+
+
+def test_v_aperture_mask():
+    # the observer is 10m above the terrain, thus the near cells are below the lower edge of the aperture
+    vp = make_vp(elevation=0, v_aperture=10, max_r_slant=False)
+    arr = calc(np.zeros((size, size), dtype=np.float32), vp)
+    d = get_distances(arr, vp)
+    below = np.degrees(np.arctan2(vp.oz, d)) > vp.v_aperture / 2
+    below[d == 0] = False
+    assert (arr[below] == vp.ov).all()
+    assert (arr[~below & (d <= vp.max_r)] == vp.vv).all()
+
+
+def test_batch_reads_dtm_once():
+    class CountingDtmCache(viewshed_numpy.DtmCache):
+        __slots__ = ['reads']
+
+        def read(self, ds, bi, window):
+            if not self.contains(ds, bi, window):
+                self.reads += 1
+            return super().read(ds, bi, window)
+
+    cache = CountingDtmCache()
+    cache.reads = 0
+    ds = make_dtm(np.zeros((size, size), dtype=np.float32))
+    vp_array = [make_vp(col=center + i * 5) for i in range(4)]
+    batch = viewshed_numpy.viewshed_calc_numpy_batch(ds, vp_array, cache=cache)
+    assert cache.reads == 1
+    for vp, vs_ds in zip(vp_array, batch):
+        assert (vs_ds.ReadAsArray() == viewshed_numpy.viewshed_calc_numpy(ds, vp).ReadAsArray()).all()
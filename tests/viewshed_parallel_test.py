@@ -0,0 +1,74 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+np = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+
+from gdalos.viewshed.viewshed_calc import viewshed_calc_to_ds, ViewshedBackend, CalcOperation
+from gdalos.viewshed.viewshed_params import ViewshedParams
+
+size = 200
+res = 10
+x0, y0 = 600000, 3600000
+# the observers, the first ones are made to complete last
+observers = [(60, 60), (90, 70), (75, 100), (120, 110)]
+
+
+class ReversedExecutor(ThreadPoolExecutor):
+    """ a thread executor whose jobs complete in the reverse order of their submission """
+
+    def __init__(self, count: int):
+        super().__init__(max_workers=count)
+        self.delays = [0.2 * i for i in reversed(range(count))]
+
+    def submit(self, fn, *args, **kwargs):
+        delay = self.delays.pop(0)
+
+        def delayed():
+            time.sleep(delay)
+            return fn(*args, **kwargs)
+
+        return super().submit(delayed)
+
+
+def make_dtm(filename):
+    ds = gdal.GetDriverByName('GTiff').Create(str(filename), size, size, 1, gdal.GDT_Float32)
+    ds.SetGeoTransform([x0, res, 0, y0 + size * res, 0, -res])
+    ds.SetProjection('EPSG:32636')
+    rows, cols = np.indices((size, size))
+    ds.GetRasterBand(1).WriteArray((30 * np.sin(rows / 11) * np.cos(cols / 7)).astype(np.float32))
+    ds = None
+    return filename
+
+
+def make_vp_array():
+    vp_array = []
+    for col, row in observers:
+        vp = ViewshedParams()
+        vp.ox = x0 + (col + 0.5) * res
+        vp.oy = y0 + (size - row - 0.5) * res
+        vp.oz = 10
+        vp.tz = 0
+        vp.max_r = 400
+        vp_array.append(vp)
+    return vp_array
+
+
+@pytest.mark.parametrize('operation', [CalcOperation.count, CalcOperation.max, CalcOperation.unique])
+def test_parallel_vs_serial(tmp_path, operation):
+    filename = make_dtm(tmp_path / 'dtm.tif')
+    results = []
+    for executor in [None, ReversedExecutor(len(observers))]:
+        ds = viewshed_calc_to_ds(make_vp_array(), filename, operation=operation, backend=ViewshedBackend.numpy,
+                                 workers=None if executor is None else len(observers), executor=executor)
+        assert ds is not None
+        results.append((ds.GetGeoTransform(), ds.GetRasterBand(1).ReadAsArray()))
+        if executor is not None:
+            executor.shutdown()
+    assert results[0][0] == results[1][0]
+    assert np.array_equal(results[0][1], results[1][1])
+    if operation == CalcOperation.unique:
+        # the pixels that only one observer sees are labeled by its index in vp_array, not by its completion
+        assert set(range(len(observers))) <= set(np.unique(results[1][1]))
@@ -0,0 +1,43 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+gdal = pytest.importorskip('osgeo.gdal')
+
+from gdalos.viewshed.viewshed_calc import talos_rasters_to_ds
+
+
+def make_dtm():
+    ds = gdal.GetDriverByName('MEM').Create('', 100, 80, 1, gdal.GDT_Int16)
+    ds.SetGeoTransform([600000, 10, 0, 3600000, 0, -10])
+    return ds
+
+
+def make_rasters(shapes):
+    dtypes = [np.uint8, np.float32, np.int16]
+    return [np.arange(h * w, dtype=dt).reshape((h, w)) for (h, w), dt in zip(shapes, dtypes)]
+
+
+@pytest.mark.parametrize('low_nodata', [True, False])
+def test_talos_rasters_to_ds(low_nodata):
+    rasters = make_rasters([(20, 30)] * 3)
+    ds = talos_rasters_to_ds(rasters, make_dtm(), 5, 7, low_nodata=low_nodata)
+    # the arrays start at the given pixel of the dtm
+    assert ds.GetGeoTransform() == (600000 + 5 * 10, 10, 0, 3600000 - 7 * 10, 0, -10)
+    assert (ds.RasterXSize, ds.RasterYSize, ds.RasterCount) == (30, 20, 3)
+    band_types = [ds.GetRasterBand(i + 1).DataType for i in range(ds.RasterCount)]
+    assert band_types == [gdal.GDT_Byte, gdal.GDT_Float32, gdal.GDT_Int16]
+    for i, arr in enumerate(rasters):
+        bnd = ds.GetRasterBand(i + 1)
+        assert np.array_equal(bnd.ReadAsArray(), arr)
+        info = np.iinfo(arr.dtype) if np.issubdtype(arr.dtype, np.integer) else np.finfo(arr.dtype)
+        # every band has the nodata of its type
+        assert bnd.GetNoDataValue() == pytest.approx(float(info.min if low_nodata else info.max))
+
+
+def test_talos_rasters_to_ds_fallback():
+    dtm = make_dtm()
+    # the results are saved as files when they are not arrays of the same shape
+    assert talos_rasters_to_ds(make_rasters([(20, 30), (20, 31)]), dtm, 0, 0) is None
+    assert talos_rasters_to_ds([], dtm, 0, 0) is None
+    ds = talos_rasters_to_ds(make_rasters([(20, 30)]), dtm, 0, 0)
+    assert ds.GetRasterBand(1).GetNoDataValue() is None